@@ -0,0 +1,425 @@
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from datetime import date
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+import data_model as data_model
+from barrier_registry import BARRIER_REGISTRY
+from closure_export import EXPORT_BATCH_SIZE, ClosureExportEncoder
+from data_handler import (BULK_INSERT_CHUNK_SIZE, CLOSURE_EVENT_KEY, CLOSURE_PAGE_SIZE, StormSurgeBarrierDataHandler,
+                          apply_closure_count_deltas, closure_count_key,
+                          barrier_closure_counts_statement, barrier_rows_statement,
+                          barriers_closure_counts_statement, closure_daily_counts_statement, closure_page,
+                          closure_export_statement, closure_rows_statement, encode_json, encode_ndjson, encode_rows,
+                          gate_closure_counts_statement, gate_closure_rows_statement,
+                          gate_reliability_from_counts, gate_rows_statement, ingestion_watermark, lock_barriers,
+                          refresh_ingestion_watermarks, refresh_reliability_snapshots, reliability_batch_from_counts,
+                          reliability_snapshot_response, reliability_snapshot_statement, snapshot_closure_counts,
+                          snapshot_closure_counts_statement, summarize_closure_counts,
+                          windowed_reliability_from_counts)
+from database.session_factory import async_session_scope
+from database.threadpool import run_in_threadpool
+from enums.closure_event_type import ClosureEventType
+from typing import AsyncIterator, List, Optional, Sequence
+import reliability_statistics
+from reliability_cache import RELIABILITY_CACHE
+
+
+async def _barrier_id(session: AsyncSession, abbreviation: str) -> Optional[int]:
+    """Resolve a barrier through the registry, only a registry miss goes to the database."""
+    barrier = BARRIER_REGISTRY.lookup(abbreviation)
+    if barrier is not None:
+        return barrier.ID
+    return await session.run_sync(BARRIER_REGISTRY.barrier_id, abbreviation)
+
+
+@dataclass
+class AsyncStormSurgeBarrierDataHandler:
+    """Non-blocking counterpart of StormSurgeBarrierDataHandler for use on the event loop.
+
+    Queries go through an AsyncSession, encoding of large results runs in the bounded threadpool.
+    The record-by-record insert paths reuse the sync handler on the session's sync facade."""
+    # Session owned by the caller (e.g. one per request), a short-lived session is opened per call if None
+    session: Optional[AsyncSession] = None
+
+    @asynccontextmanager
+    async def _session(self) -> AsyncIterator[AsyncSession]:
+        """Yield the bound session, or a scoped session that is closed after the call."""
+        if self.session is not None:
+            yield self.session
+        else:
+            async with async_session_scope() as session:
+                yield session
+
+    async def upsert_barrier(self, barrier_dict: dict):
+        """Insert a new storm surge barrier or update an existing one."""
+        async with self._session() as session:
+            existing_barrier = (await session.scalars(
+                select(data_model.StormSurgeBarriers).filter_by(
+                    Abbreviation=barrier_dict['Abbreviation']))).first()
+
+            if existing_barrier is not None:
+                for key, value in barrier_dict.items():
+                    setattr(existing_barrier, key, value)
+                barrier = existing_barrier
+            else:
+                barrier = data_model.StormSurgeBarriers(**barrier_dict)
+                session.add(barrier)
+
+            await session.flush()
+            registered = (barrier.ID, barrier.Abbreviation, barrier.Name)
+            await session.commit()
+        BARRIER_REGISTRY.register(*registered)
+        RELIABILITY_CACHE.invalidate_barrier(barrier_dict['Abbreviation'])
+
+    async def put_closure_data(self, closure_dict: dict):
+        """Insert closure data into the database."""
+        async with self._session() as session:
+            new_closure = data_model.StormSurgeBarrierClosureEvents(**closure_dict)
+            await session.run_sync(lock_barriers, [new_closure.BarrierID])
+            session.add(new_closure)
+            await session.flush()
+            await session.run_sync(apply_closure_count_deltas, {closure_count_key(
+                new_closure.BarrierID, new_closure.ClosureEventType, new_closure.ClosureEventResult): 1})
+            await session.run_sync(refresh_ingestion_watermarks, [new_closure.BarrierID])
+            abbreviation = await session.run_sync(BARRIER_REGISTRY.abbreviation, new_closure.BarrierID)
+            await session.commit()
+        RELIABILITY_CACHE.invalidate_barrier(abbreviation)
+
+    async def get_all_barriers(self) -> list[dict]:
+        """Retrieve all storm surge barriers from the database."""
+        async with self._session() as session:
+            rows = (await session.execute(barrier_rows_statement())).all()
+        return await run_in_threadpool(encode_rows, rows)
+
+    async def get_all_closures(self) -> list[dict]:
+        """Retrieve all closures for storm surge barriers from the database."""
+        async with self._session() as session:
+            rows = (await session.execute(closure_rows_statement())).all()
+        return await run_in_threadpool(encode_rows, rows)
+
+    async def get_closures_by_abbreviation(self, abbreviation: str) -> list[dict]:
+        """Retrieve all closures for a specific storm surge barrier based on its abbreviation from the database."""
+        async with self._session() as session:
+            # Identify the barrier ID based on the abbreviation
+            barrier_id = await _barrier_id(session, abbreviation)
+
+            if not barrier_id:
+                return []  # Return empty list if no barrier found with given abbreviation
+
+            # Fetch the closure columns of the identified barrier
+            rows = (await session.execute(closure_rows_statement(barrier_id))).all()
+
+        return await run_in_threadpool(encode_rows, rows)
+
+    async def get_barriers_json(self, columns: Optional[Sequence[str]] = None) -> bytes:
+        """All barriers as a JSON array, encoded straight from the selected columns."""
+        async with self._session() as session:
+            rows = (await session.execute(barrier_rows_statement(columns))).all()
+        return await run_in_threadpool(encode_json, rows)
+
+    async def get_closures_json(self, abbreviation: Optional[str] = None, columns: Optional[Sequence[str]] = None) -> bytes:
+        """Closures of one barrier (all barriers if None) as a JSON array, encoded straight from the selected columns."""
+        async with self._session() as session:
+            barrier_id = None
+            if abbreviation is not None:
+                barrier_id = await _barrier_id(session, abbreviation)
+                if not barrier_id:
+                    return b"[]"
+
+            rows = (await session.execute(closure_rows_statement(barrier_id, columns=columns))).all()
+        return await run_in_threadpool(encode_json, rows)
+
+    async def get_closures_page(self, abbreviation: Optional[str] = None, after_id: Optional[int] = None, limit: int = CLOSURE_PAGE_SIZE) -> dict:
+        """Retrieve one page of closures ordered by ID, optionally for one barrier, starting after the given cursor."""
+        async with self._session() as session:
+            barrier_id = None
+            if abbreviation is not None:
+                barrier_id = await _barrier_id(session, abbreviation)
+                if not barrier_id:
+                    return {"items": [], "next_cursor": None}
+
+            rows = (await session.execute(closure_rows_statement(
+                barrier_id, after_id).limit(limit + 1))).all()
+        return await run_in_threadpool(closure_page, rows, limit)
+
+    async def stream_closures(self, abbreviation: Optional[str] = None, batch_size: int = CLOSURE_PAGE_SIZE) -> AsyncIterator[bytes]:
+        """Yield closures as NDJSON chunks straight from a server-side cursor.
+
+        Uses its own session, the stream outlives the request handler that returns it."""
+        async with async_session_scope() as session:
+            barrier_id = None
+            if abbreviation is not None:
+                barrier_id = await _barrier_id(session, abbreviation)
+                if not barrier_id:
+                    return
+
+            result = await session.stream(
+                closure_rows_statement(barrier_id).execution_options(yield_per=batch_size))
+            async for partition in result.partitions():
+                yield encode_ndjson(partition)
+
+    async def missing_abbreviations(self, abbreviations: Sequence[str]) -> list[str]:
+        """The abbreviations that belong to no barrier."""
+        async with self._session() as session:
+            return [abbreviation for abbreviation in abbreviations if not await _barrier_id(session, abbreviation)]
+
+    async def export_closures(self, export_format: str, abbreviations: Optional[Sequence[str]] = None,
+                              closure_types: Optional[Sequence[ClosureEventType]] = None, start_date: Optional[date] = None,
+                              end_date: Optional[date] = None, batch_size: int = EXPORT_BATCH_SIZE) -> AsyncIterator[bytes]:
+        """Yield the closures as Arrow IPC, Parquet or CSV chunks, encoded per batch from a server-side cursor.
+
+        Uses its own session like stream_closures, the encoding runs in the threadpool."""
+        encoder = ClosureExportEncoder(export_format)
+        async with async_session_scope() as session:
+            barrier_ids = None
+            if abbreviations is not None:
+                barrier_ids = [barrier_id for barrier_id in [await _barrier_id(session, abbreviation)
+                                                             for abbreviation in abbreviations] if barrier_id]
+
+            result = await session.stream(closure_export_statement(
+                barrier_ids, closure_types, start_date, end_date).execution_options(yield_per=batch_size))
+            async for partition in result.partitions():
+                chunk = await run_in_threadpool(encoder.write, partition)
+                if chunk:
+                    yield chunk
+        yield await run_in_threadpool(encoder.finish)
+
+    async def insert_single_closure_event(self, abbreviation: str, event: dict):
+        async with self._session() as session:
+            barrier_id = await _barrier_id(session, abbreviation)
+            if not barrier_id:
+                return {"message": "Barrier not found"}, 404
+
+            event = {**event, "BarrierID": barrier_id}
+            existing_record = (await session.scalars(
+                select(data_model.StormSurgeBarrierClosureEvents).filter_by(
+                    **{column: event[column] for column in CLOSURE_EVENT_KEY}))).first()
+
+            if existing_record:
+                return {"message": "Duplicate entry found. Skipping record."}, 409
+
+            new_event = data_model.StormSurgeBarrierClosureEvents(**event)
+            await session.run_sync(lock_barriers, [barrier_id])
+            session.add(new_event)
+            try:
+                await session.flush()
+            except IntegrityError:
+                # Inserted by a concurrent request after the check
+                await session.rollback()
+                return {"message": "Duplicate entry found. Skipping record."}, 409
+            await session.run_sync(apply_closure_count_deltas, {closure_count_key(
+                barrier_id, new_event.ClosureEventType, new_event.ClosureEventResult): 1})
+            await session.run_sync(refresh_ingestion_watermarks, [barrier_id])
+            await session.commit()
+            RELIABILITY_CACHE.invalidate_barrier(abbreviation)
+            await session.refresh(new_event)
+
+            return {"message": "Insert successful", "inserted_event": new_event.to_dict()}, 201
+
+    async def get_all_abbreviations(self) -> list[str]:
+        """Retrieve all abbreviations for storm surge barriers from the database."""
+        async with self._session() as session:
+            abbreviations = await session.scalars(
+                select(data_model.StormSurgeBarriers.Abbreviation))
+            return list(abbreviations)
+
+    async def insert_closure_events(self, abbreviation: str, closure_data: List[dict], incremental: bool = False) -> dict:
+        async with self._session() as session:
+            return await session.run_sync(
+                lambda sync_session: StormSurgeBarrierDataHandler(session=sync_session).insert_closure_events(
+                    abbreviation, closure_data, incremental=incremental))
+
+    async def get_ingestion_watermark(self, abbreviation: str) -> Optional[tuple]:
+        async with self._session() as session:
+            return await session.run_sync(ingestion_watermark, abbreviation)
+
+    async def bulk_upsert_closure_events(self, abbreviation: str, closure_data: List[dict], chunk_size: int = BULK_INSERT_CHUNK_SIZE, incremental: bool = False) -> dict:
+        async with self._session() as session:
+            return await session.run_sync(
+                lambda sync_session: StormSurgeBarrierDataHandler(session=sync_session).bulk_upsert_closure_events(
+                    abbreviation, closure_data, chunk_size, incremental))
+
+    async def reliability_counts(self, abbreviation: str, closure_type: Optional[str] = None,
+                                 use_snapshot: bool = False) -> Optional[tuple[str, dict[str, int]]]:
+        """Barrier name and closure counts per result, None if the barrier does not exist.
+
+        With use_snapshot the counts come from the reliability snapshot row when there is one, the caller
+        decides whether the snapshot is fresh; otherwise (or without a row) from the closure counts."""
+        async with self._session() as session:
+            if use_snapshot:
+                row = (await session.execute(snapshot_closure_counts_statement(abbreviation, closure_type))).first()
+                if row is not None:
+                    return row.Name, snapshot_closure_counts(row)
+            rows = (await session.execute(
+                barrier_closure_counts_statement(abbreviation))).all()
+        if not rows:
+            return None
+        return rows[0].Name, summarize_closure_counts(rows, closure_type)
+
+    async def calculate_rule_of_three(self, abbreviation: str, closure_type: Optional[str] = None, rule_number: int = 3,
+                                      use_snapshot: bool = False) -> dict:
+        cached, generation = RELIABILITY_CACHE.get(
+            abbreviation, ("rule_of_three", closure_type, rule_number))
+        if cached is not None:
+            return cached
+
+        found = await self.reliability_counts(abbreviation, closure_type, use_snapshot)
+        if found is None:
+            response = {
+                "message": f"No barrier found with abbreviation: {abbreviation}"
+            }
+        else:
+            name, counts = found
+            response = reliability_statistics.rule_of_three_response(
+                name, counts["SUCCESS"], closure_type, rule_number)
+
+        RELIABILITY_CACHE.set(
+            abbreviation, ("rule_of_three", closure_type, rule_number), response, generation)
+        return response
+
+    async def calculate_beta_distribution(self, abbreviation: str, closure_type: Optional[str] = None, prior_failure_rate: Optional[float] = None,
+                                          use_snapshot: bool = False) -> dict:
+        cached, generation = RELIABILITY_CACHE.get(
+            abbreviation, ("beta_distribution", closure_type, prior_failure_rate))
+        if cached is not None:
+            return cached
+
+        found = await self.reliability_counts(abbreviation, closure_type, use_snapshot)
+        if found is None:
+            response = {
+                "message": f"No barrier found with abbreviation: {abbreviation}"
+            }
+        else:
+            name, counts = found
+            response = reliability_statistics.beta_distribution_response(
+                name, counts["SUCCESS"], counts["FAILURE"], closure_type, prior_failure_rate)
+
+        RELIABILITY_CACHE.set(
+            abbreviation, ("beta_distribution", closure_type, prior_failure_rate), response, generation)
+        return response
+
+    async def calculate_failure_rate_distribution(self, abbreviation: str, closure_type: Optional[str] = None,
+                                                  prior_failure_rates: Sequence[Optional[float]] = (None,), samples: int = 100_000,
+                                                  quantiles: Sequence[float] = reliability_statistics.DEFAULT_QUANTILES,
+                                                  method: str = "posterior", seed: Optional[int] = None) -> dict:
+        params = ("failure_rate_distribution", closure_type, tuple(prior_failure_rates),
+                  samples, tuple(quantiles), method, seed)
+        cached, generation = RELIABILITY_CACHE.get(abbreviation, params)
+        if cached is not None:
+            return cached
+
+        async with self._session() as session:
+            rows = (await session.execute(
+                barrier_closure_counts_statement(abbreviation))).all()
+
+        if not rows:
+            return {
+                "message": f"No barrier found with abbreviation: {abbreviation}"
+            }
+
+        counts = summarize_closure_counts(rows, closure_type)
+        # Sampling is CPU bound, keep it off the event loop
+        response = await run_in_threadpool(
+            reliability_statistics.failure_rate_distribution_response,
+            rows[0].Name, counts["SUCCESS"], counts["FAILURE"], closure_type,
+            prior_failure_rates, samples, quantiles, method, seed)
+
+        if seed is not None:
+            RELIABILITY_CACHE.set(abbreviation, params, response, generation)
+        return response
+
+    async def calculate_reliability_batch(self, abbreviations: Optional[Sequence[str]] = None,
+                                          closure_types: Sequence[Optional[str]] = (None,), rule_numbers: Sequence[float] = (3,),
+                                          prior_failure_rates: Sequence[Optional[float]] = (0.5,)) -> dict:
+        async with self._session() as session:
+            rows = (await session.execute(
+                barriers_closure_counts_statement(abbreviations))).all()
+
+        return await run_in_threadpool(
+            reliability_batch_from_counts, rows, abbreviations, closure_types, rule_numbers, prior_failure_rates)
+
+    async def calculate_windowed_reliability(self, abbreviation: str, closure_type: Optional[str] = None, window_years: int = 5,
+                                             since: Optional[date] = None, prior_failure_rate: Optional[float] = 0.5,
+                                             rule_number: int = 3) -> dict:
+        params = ("windowed", closure_type, window_years, since, prior_failure_rate, rule_number)
+        cached, generation = RELIABILITY_CACHE.get(abbreviation, params)
+        if cached is not None:
+            return cached
+
+        async with self._session() as session:
+            rows = (await session.execute(
+                closure_daily_counts_statement(abbreviation, closure_type))).all()
+
+        if not rows:
+            return {
+                "message": f"No barrier found with abbreviation: {abbreviation}"
+            }
+
+        response = await run_in_threadpool(
+            windowed_reliability_from_counts, rows, closure_type, window_years, since, prior_failure_rate, rule_number)
+        RELIABILITY_CACHE.set(abbreviation, params, response, generation)
+        return response
+
+    async def upsert_gate(self, abbreviation: str, name: str) -> dict:
+        async with self._session() as session:
+            return await session.run_sync(
+                lambda sync_session: StormSurgeBarrierDataHandler(session=sync_session).upsert_gate(abbreviation, name))
+
+    async def get_gates(self, abbreviation: str) -> list[dict]:
+        """Retrieve the gates of a barrier."""
+        async with self._session() as session:
+            barrier_id = await _barrier_id(session, abbreviation)
+            if not barrier_id:
+                return []
+            rows = (await session.execute(gate_rows_statement(barrier_id))).all()
+        return encode_rows(rows)
+
+    async def get_gate_closures(self, abbreviation: str) -> list[dict]:
+        """Retrieve the gate closures of all gates of a barrier."""
+        async with self._session() as session:
+            barrier_id = await _barrier_id(session, abbreviation)
+            if not barrier_id:
+                return []
+            rows = (await session.execute(gate_closure_rows_statement(barrier_id))).all()
+        return await run_in_threadpool(encode_rows, rows)
+
+    async def upsert_gate_closures(self, abbreviation: str, gate_closure_data: List[dict], chunk_size: int = BULK_INSERT_CHUNK_SIZE) -> dict:
+        async with self._session() as session:
+            return await session.run_sync(
+                lambda sync_session: StormSurgeBarrierDataHandler(session=sync_session).upsert_gate_closures(
+                    abbreviation, gate_closure_data, chunk_size))
+
+    async def calculate_gate_reliability(self, abbreviation: str, prior_failure_rate: Optional[float] = 0.5,
+                                         rule_number: int = 3, required_gates: Optional[int] = None) -> dict:
+        params = ("gate_reliability", prior_failure_rate, rule_number, required_gates)
+        cached, generation = RELIABILITY_CACHE.get(abbreviation, params)
+        if cached is not None:
+            return cached
+
+        async with self._session() as session:
+            rows = (await session.execute(
+                gate_closure_counts_statement(abbreviation))).all()
+
+        if not rows:
+            return {
+                "message": f"No barrier found with abbreviation: {abbreviation}"
+            }
+
+        response = await run_in_threadpool(
+            gate_reliability_from_counts, rows, prior_failure_rate, rule_number, required_gates)
+        RELIABILITY_CACHE.set(abbreviation, params, response, generation)
+        return response
+
+    async def update_reliability_snapshots(self, abbreviations: Optional[Sequence[str]] = None) -> int:
+        async with self._session() as session:
+            written = await session.run_sync(refresh_reliability_snapshots, abbreviations)
+            await session.commit()
+        return written
+
+    async def get_reliability_snapshot(self, abbreviation: Optional[str] = None) -> dict:
+        async with self._session() as session:
+            rows = (await session.execute(
+                reliability_snapshot_statement(abbreviation))).all()
+        return reliability_snapshot_response(rows)
@@ -0,0 +1,91 @@
+from dataclasses import dataclass, field
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from typing import Optional
+import threading
+
+import data_model as data_model
+
+
+@dataclass(frozen=True)
+class RegisteredBarrier:
+    ID: int
+    Abbreviation: str
+    Name: str
+
+
+@dataclass
+class BarrierRegistry:
+    """In-memory abbreviation -> barrier lookup shared by the sync and async data handlers.
+
+    Loaded with one query on first use (the API loads it at startup) and updated by upsert_barrier, so resolving
+    a barrier costs no query. An abbreviation missing from the registry is looked up once more in the database,
+    which picks up barriers added by another process (e.g. the ingest runner)."""
+    _barriers: Optional[dict] = field(default=None, repr=False)
+    _abbreviations_by_id: dict = field(default_factory=dict, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    @property
+    def loaded(self) -> bool:
+        return self._barriers is not None
+
+    def load(self, session: Session):
+        """(Re)load all barriers from the database."""
+        barriers = data_model.StormSurgeBarriers
+        rows = session.execute(select(barriers.ID, barriers.Abbreviation, barriers.Name)).all()
+        with self._lock:
+            self._barriers = {row.Abbreviation: RegisteredBarrier(*row) for row in rows}
+            self._abbreviations_by_id = {row.ID: row.Abbreviation for row in rows}
+
+    def register(self, barrier_id: int, abbreviation: str, name: str) -> RegisteredBarrier:
+        """Add or update a barrier, called after the barrier was committed."""
+        barrier = RegisteredBarrier(barrier_id, abbreviation, name)
+        with self._lock:
+            if self._barriers is not None:
+                self._barriers[abbreviation] = barrier
+                self._abbreviations_by_id[barrier_id] = abbreviation
+        return barrier
+
+    def lookup(self, abbreviation: str) -> Optional[RegisteredBarrier]:
+        """The registered barrier, None if it is not registered (or the registry is not loaded yet)."""
+        return self._barriers.get(abbreviation) if self._barriers is not None else None
+
+    def get(self, session: Session, abbreviation: str) -> Optional[RegisteredBarrier]:
+        """The barrier with the given abbreviation, None if it does not exist."""
+        if self._barriers is None:
+            self.load(session)
+        barrier = self.lookup(abbreviation)
+        if barrier is None:
+            barriers = data_model.StormSurgeBarriers
+            row = session.execute(select(barriers.ID, barriers.Abbreviation, barriers.Name).where(
+                barriers.Abbreviation == abbreviation)).first()
+            if row is not None:
+                barrier = self.register(*row)
+        return barrier
+
+    def barrier_id(self, session: Session, abbreviation: str) -> Optional[int]:
+        barrier = self.get(session, abbreviation)
+        return barrier.ID if barrier is not None else None
+
+    def abbreviation(self, session: Session, barrier_id: int) -> Optional[str]:
+        """Reverse lookup, for write paths that only know the barrier ID."""
+        if self._barriers is None:
+            self.load(session)
+        abbreviation = self._abbreviations_by_id.get(barrier_id)
+        if abbreviation is None:
+            self.load(session)
+            abbreviation = self._abbreviations_by_id.get(barrier_id)
+        return abbreviation
+
+    def abbreviations(self) -> list[str]:
+        return list(self._barriers or {})
+
+    def clear(self):
+        """Forget all barriers, the next lookup reloads them (e.g. after the database was recreated)."""
+        with self._lock:
+            self._barriers = None
+            self._abbreviations_by_id = {}
+
+
+# Shared by the sync and async data handlers, loaded by the lifespan of the FastAPI app
+BARRIER_REGISTRY = BarrierRegistry()
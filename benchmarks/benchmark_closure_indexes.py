@@ -0,0 +1,168 @@
+"""Benchmark of the closure lookups and the upsert deduplication while the closure table grows.
+
+    python -m benchmarks.benchmark_closure_indexes --sizes 10000 100000 1000000
+    python -m benchmarks.benchmark_closure_indexes --without-indexes --sizes 10000 100000
+
+Runs against a scratch SQLite database by default, pass --url to use another (empty) database.
+With the indexes of data_model the time per lookup and per upserted chunk stays flat as the table
+grows, --without-indexes drops the secondary indexes to compare.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import Session
+
+import data_model
+from data_handler import _prepare_closure_rows, _upsert_closure_rows
+
+FIRST_DAY = date(1958, 1, 1)
+MINUTES_PER_DAY = 24 * 60
+# Failed and aborted closures are rare, like in the real closure records
+RESULT_WEIGHTS = {data_model.ClosureEventResult.SUCCESS: 0.98,
+                  data_model.ClosureEventResult.FAILURE: 0.015,
+                  data_model.ClosureEventResult.ABORTED: 0.005}
+# Upserted chunks per table size, each one is rolled back
+UPSERT_REPEAT = 5
+
+
+def closure_row(barrier_id: int, sequence: int, second: int = 0) -> dict:
+    """The sequence-th closure of a barrier, one per minute so every (BarrierID, StartDate, StartTime) is unique."""
+    day = FIRST_DAY + timedelta(days=sequence // MINUTES_PER_DAY)
+    minute = sequence % MINUTES_PER_DAY
+    return {
+        "BarrierID": barrier_id,
+        "StartDate": day,
+        "StartTime": f"{minute // 60:02d}:{minute % 60:02d}:{second:02d}",
+        "EndDate": day,
+        "EndTime": "23:59:00",
+        "WaterLevel": 2.5,
+        "ClosureEventType": random.choice(list(data_model.ClosureEventType)),
+        "ClosureEventResult": random.choices(list(RESULT_WEIGHTS), weights=list(RESULT_WEIGHTS.values()))[0],
+    }
+
+
+def create_schema(engine, barriers: int, with_indexes: bool):
+    data_model.Base.metadata.drop_all(engine)
+    data_model.Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        if not with_indexes:
+            for index in data_model.StormSurgeBarrierClosureEvents.__table__.indexes:
+                index.drop(connection)
+        connection.execute(data_model.StormSurgeBarriers.__table__.insert(), [
+            {"Name": f"Barrier {i}", "Abbreviation": f"B{i:03d}", "Location": "", "ConstructionYear": 1958,
+             "GateConfiguration": "", "GateType": ""} for i in range(1, barriers + 1)])
+
+
+def grow(engine, start: int, stop: int, barriers: int, batch_size: int = 50_000):
+    """Insert the closures with global sequence numbers start..stop, spread over the barriers."""
+    table = data_model.StormSurgeBarrierClosureEvents.__table__
+    with engine.begin() as connection:
+        for batch_start in range(start, stop, batch_size):
+            connection.execute(table.insert(), [
+                closure_row(i % barriers + 1, i // barriers)
+                for i in range(batch_start, min(batch_start + batch_size, stop))])
+
+
+def time_per_call(func, repeat: int) -> float:
+    """Average milliseconds per call."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def measure(engine, size: int, barriers: int, repeat: int, chunk_size: int) -> dict:
+    barrier_table = data_model.StormSurgeBarriers
+    closures = data_model.StormSurgeBarrierClosureEvents
+    per_barrier = size // barriers
+
+    with Session(engine) as session:
+        def abbreviation_lookup():
+            session.execute(select(barrier_table.ID).filter_by(
+                Abbreviation=f"B{random.randint(1, barriers):03d}")).scalar()
+
+        def duplicate_check():
+            row = closure_row(random.randint(1, barriers),
+                              random.randrange(per_barrier))
+            session.execute(select(closures.ID).filter_by(
+                StartDate=row["StartDate"], StartTime=row["StartTime"], BarrierID=row["BarrierID"]).limit(1)).first()
+
+        def result_type_count():
+            # The rare results are the ones that are counted for the reliability statistics
+            session.execute(select(func.count()).select_from(closures).filter_by(
+                BarrierID=random.randint(1, barriers),
+                ClosureEventResult=random.choice([data_model.ClosureEventResult.FAILURE,
+                                                  data_model.ClosureEventResult.ABORTED]),
+                ClosureEventType=random.choice(list(data_model.ClosureEventType)))).scalar()
+
+        lookups = {
+            "abbreviation_ms": time_per_call(abbreviation_lookup, repeat),
+            "barrier_start_ms": time_per_call(duplicate_check, repeat),
+            "barrier_result_type_count_ms": time_per_call(result_type_count, repeat),
+        }
+
+    def upsert_chunk():
+        # Half of the chunk updates existing events, half inserts new ones (seconds the fill never uses)
+        barrier_id = random.randint(1, barriers)
+        chunk = [closure_row(barrier_id, random.randrange(per_barrier), second=0 if i % 2 else 30)
+                 for i in range(chunk_size)]
+        for row in chunk:
+            row.pop("BarrierID")
+            row["ClosureEventType"] = row["ClosureEventType"].value
+            row["ClosureEventResult"] = row["ClosureEventResult"].value
+        rows, _ = _prepare_closure_rows(barrier_id, chunk)
+
+        with engine.connect() as connection:
+            with Session(bind=connection) as session:
+                _upsert_closure_rows(session, rows)
+                session.flush()
+                session.rollback()
+
+    upsert_ms = time_per_call(upsert_chunk, UPSERT_REPEAT)
+    return {"rows": size, **lookups, f"upsert_{chunk_size}_ms": upsert_ms}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--url", default=None,
+                        help="Database URL, a scratch SQLite database if omitted")
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--barriers", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=500)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--without-indexes", action="store_true")
+    args = parser.parse_args()
+
+    random.seed(0)
+    scratch = None
+    url = args.url
+    if url is None:
+        scratch = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+        url = f"sqlite:///{scratch.name}"
+
+    engine = create_engine(url)
+    try:
+        create_schema(engine, args.barriers, not args.without_indexes)
+        results = []
+        size = 0
+        for target in sorted(args.sizes):
+            grow(engine, size, target, args.barriers)
+            size = target
+            results.append(measure(engine, size, args.barriers,
+                           args.repeat, args.chunk_size))
+            print("  ".join(f"{key}={value:.3f}" if isinstance(value, float) else f"{key}={value}"
+                            for key, value in results[-1].items()), flush=True)
+    finally:
+        engine.dispose()
+        if scratch is not None:
+            os.unlink(scratch.name)
+
+
+if __name__ == "__main__":
+    main()
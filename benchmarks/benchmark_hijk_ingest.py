@@ -0,0 +1,92 @@
+"""Benchmark of the HIJK sheet parsing on a synthetic sheet, checking the vectorized path against the row-wise one.
+
+    python -m benchmarks.benchmark_hijk_ingest --rows 300000 --legacy-rows 20000
+
+The row-wise create_hijk_dict is only timed on the first --legacy-rows rows, both paths must produce
+identical closure records for that part of the sheet.
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from ingest_data.ingest_hijk_data import ingestCSVhijk
+
+TIME_FORMATS = ["{h:02d}:{m:02d}", "{h}h{m:02d}", "{h:02d} h {m:02d}",
+                "{h:02d}:{m:02d}.", "{h:02d}:oo"]
+TYPES = ["stormsluiting", "testsluiting",
+         "functionelesluiting", "onderhoudsluiting"]
+
+
+def synthetic_hijk_sheet(rows: int, seed: int = 0) -> pd.DataFrame:
+    """Generate a sheet in the HIJK dialect: record rows, some closing on a continuation row marked '--'."""
+    rng = np.random.default_rng(seed)
+    records = []
+    day = pd.Timestamp("1958-01-01")
+    number = 0
+
+    def time_text():
+        fmt = TIME_FORMATS[rng.integers(len(TIME_FORMATS))]
+        return fmt.format(h=int(rng.integers(24)), m=int(rng.integers(60)))
+
+    while len(records) < rows:
+        number += 1
+        day += pd.Timedelta(days=int(rng.integers(1, 4)))
+        spans_rows = rng.random() < 0.3
+        records.append({
+            "NUMBER": number,
+            "DATE": f"`{day.date()}" if rng.random() < 0.1 else day,
+            "START": time_text(),
+            "END": "--" if spans_rows else ("24h00" if rng.random() < 0.05 else time_text()),
+            "WATERLEVEL": f"+{rng.integers(1, 4)}, {rng.integers(100):02d}",
+            "TYPE": TYPES[rng.integers(len(TYPES))],
+        })
+        if spans_rows:
+            day += pd.Timedelta(days=1)
+            records.append({"NUMBER": np.nan, "DATE": day, "START": "",
+                            "END": time_text(), "WATERLEVEL": "", "TYPE": ""})
+
+    return pd.DataFrame(records)
+
+
+def time_call(func) -> tuple[float, list]:
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=300_000)
+    parser.add_argument("--legacy-rows", type=int, default=20_000)
+    args = parser.parse_args()
+
+    sheet = synthetic_hijk_sheet(args.rows)
+    # Do not cut a record off from its END row
+    legacy_rows = args.legacy_rows
+    while legacy_rows < len(sheet) and pd.isna(sheet.NUMBER.iloc[legacy_rows]):
+        legacy_rows += 1
+
+    legacy_time, legacy_records = time_call(
+        lambda: ingestCSVhijk(sheet.iloc[:legacy_rows].copy()).create_hijk_dict())
+    subset_time, subset_records = time_call(
+        lambda: ingestCSVhijk(sheet.iloc[:legacy_rows].copy()).create_hijk_records())
+    full_time, full_records = time_call(
+        lambda: ingestCSVhijk(sheet.copy()).create_hijk_records())
+
+    equivalent = legacy_records == subset_records
+    print(f"row-wise   {legacy_rows:>9} rows: {legacy_time:8.3f}s")
+    print(f"vectorized {legacy_rows:>9} rows: {subset_time:8.3f}s "
+          f"({legacy_time / subset_time:.1f}x faster)")
+    print(f"vectorized {len(sheet):>9} rows: {full_time:8.3f}s, "
+          f"{len(full_records)} closure records")
+    print(f"identical closure records: {equivalent}")
+
+    if not equivalent:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Microbenchmark of the closure list serialization paths on a scratch SQLite database.
+
+    python -m benchmarks.benchmark_serialization --closures 200000
+
+orm:     ORM instances -> to_dict (uncached columns) -> jsonable_encoder -> response_model validation -> json
+columns: column rows -> jsonable_encoder -> response_model validation -> json
+orjson:  rows of the response columns -> orjson, as served by the list endpoints
+
+All paths must produce the same JSON document.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+
+import data_model
+from data_handler import closure_rows_statement, encode_json, encode_rows
+from pydantic_model import StormSurgeBarrierClosureEvents
+
+CLOSURE_RESPONSE_FIELDS = tuple(StormSurgeBarrierClosureEvents.__fields__)
+
+
+def seed(engine, closures: int):
+    data_model.Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(data_model.StormSurgeBarriers.__table__.insert(), [
+            {"Name": "Barrier", "Abbreviation": "B001", "Location": "", "ConstructionYear": 1958,
+             "GateConfiguration": "", "GateType": ""}])
+        connection.execute(data_model.StormSurgeBarrierClosureEvents.__table__.insert(), [
+            {"BarrierID": 1, "StartDate": date(1958, 1, 1) + timedelta(days=i // 24), "StartTime": f"{i % 24:02d}:00:00",
+             "EndDate": date(1958, 1, 1) + timedelta(days=i // 24), "EndTime": "23:30:00", "WaterLevel": 2.5,
+             "ClosureEventType": data_model.ClosureEventType.STORM,
+             "ClosureEventResult": data_model.ClosureEventResult.SUCCESS}
+            for i in range(closures)])
+
+
+def validate_and_dump(items: list[dict]) -> bytes:
+    """What FastAPI does with a returned list when the route declares a response_model."""
+    models = [StormSurgeBarrierClosureEvents(**item) for item in items]
+    return json.dumps(jsonable_encoder(models)).encode()
+
+
+def orm_path(session: Session) -> bytes:
+    closures = session.scalars(select(data_model.StormSurgeBarrierClosureEvents).order_by(
+        data_model.StormSurgeBarrierClosureEvents.ID)).all()
+    uncached_columns = data_model.get_columns.__wrapped__
+    items = jsonable_encoder([{c: getattr(closure, c) for c in uncached_columns(closure.__class__)}
+                              for closure in closures])
+    return validate_and_dump(items)
+
+
+def columns_path(session: Session) -> bytes:
+    return validate_and_dump(encode_rows(session.execute(closure_rows_statement()).all()))
+
+
+def orjson_path(session: Session) -> bytes:
+    return encode_json(session.execute(closure_rows_statement(columns=CLOSURE_RESPONSE_FIELDS)).all())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--closures", type=int, default=200_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    scratch = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+    engine = create_engine(f"sqlite:///{scratch.name}")
+    try:
+        seed(engine, args.closures)
+        outputs = {}
+        for name, path in [("orm", orm_path), ("columns", columns_path), ("orjson", orjson_path)]:
+            timings = []
+            for _ in range(args.repeat):
+                with Session(engine) as session:
+                    start = time.perf_counter()
+                    outputs[name] = path(session)
+                    timings.append(time.perf_counter() - start)
+            best = min(timings)
+            print(f"{name:8} {best:8.3f}s  {args.closures / best:>12,.0f} closures/s")
+    finally:
+        engine.dispose()
+        os.unlink(scratch.name)
+
+    documents = {name: json.loads(output) for name, output in outputs.items()}
+    equivalent = documents["orm"] == documents["columns"] == documents["orjson"]
+    print(f"identical output: {equivalent}")
+    sys.exit(0 if equivalent else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Load test showing that database connections stay bounded under concurrent requests.
+
+Runs the FastAPI app in-process on one event loop, against the database configured in the .env
+(DATABASE_URL or the credentials), and samples the connection pool while the requests are in flight:
+
+    python -m benchmarks.load_test_sessions --requests 2000 --concurrency 64
+"""
+import argparse
+import asyncio
+import sys
+import time
+
+import httpx
+
+from database.engine_config import MAX_OVERFLOW, POOL_SIZE, async_engine
+from barrier_registry import BARRIER_REGISTRY
+from fast_api_app import app, lifespan
+
+
+def request_paths() -> list[str]:
+    """The barrier list, plus the closures and rule-of-three bound of every registered barrier."""
+    paths = ["/storm_surge_barrier/all/"]
+    for abbreviation in BARRIER_REGISTRY.abbreviations():
+        paths.append(f"/storm_surge_barrier/closures/{abbreviation}/")
+        paths.append(
+            f"/storm_surge_barrier/closures/rule_of_three/{abbreviation}/")
+    return paths
+
+
+async def run_load(requests: int, concurrency: int) -> tuple[list[int], int]:
+    """Send the requests with at most `concurrency` in flight, returning status codes and peak pool usage."""
+    pool = async_engine.sync_engine.pool
+    semaphore = asyncio.Semaphore(concurrency)
+    peak_checked_out = 0
+    done = asyncio.Event()
+
+    async def sample_pool():
+        nonlocal peak_checked_out
+        while not done.is_set():
+            peak_checked_out = max(peak_checked_out, pool.checkedout())
+            await asyncio.sleep(0)
+
+    async def send(client: httpx.AsyncClient, i: int) -> int:
+        async with semaphore:
+            response = await client.get(paths[i % len(paths)])
+            return response.status_code
+
+    transport = httpx.ASGITransport(app=app)
+    # The transport does not run the lifespan, which loads the barrier registry
+    async with lifespan(app), httpx.AsyncClient(transport=transport, base_url="http://load-test") as client:
+        paths = request_paths()
+        sampler = asyncio.create_task(sample_pool())
+        status_codes = await asyncio.gather(*(send(client, i) for i in range(requests)))
+        done.set()
+        await sampler
+
+    return status_codes, peak_checked_out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    status_codes, peak_checked_out = asyncio.run(
+        run_load(args.requests, args.concurrency))
+    elapsed = time.perf_counter() - start
+
+    checked_out_after = async_engine.sync_engine.pool.checkedout()
+    pool_limit = POOL_SIZE + MAX_OVERFLOW
+    errors = sum(code >= 500 for code in status_codes)
+    print(f"requests: {args.requests}, concurrency: {args.concurrency}, "
+          f"elapsed: {elapsed:.2f}s, server errors: {errors}")
+    print(f"peak checked-out connections: {peak_checked_out} (pool limit {pool_limit}), "
+          f"checked out after run: {checked_out_after}")
+
+    if peak_checked_out > pool_limit or checked_out_after != 0 or errors:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
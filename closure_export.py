@@ -0,0 +1,97 @@
+from enum import Enum
+from typing import Sequence
+
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+# Rows per server-side cursor batch, also the size of the Arrow record batches and Parquet row groups
+EXPORT_BATCH_SIZE = 50_000
+
+# Export format -> (media type, file extension)
+EXPORT_FORMATS = {
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "csv": ("text/csv", "csv"),
+}
+
+# Column order of the export, closure_export_statement selects the columns in this order
+CLOSURE_EXPORT_SCHEMA = pa.schema([
+    ("ID", pa.int64()),
+    ("Abbreviation", pa.string()),
+    ("BarrierID", pa.int64()),
+    ("StartDate", pa.date32()),
+    ("StartTime", pa.string()),
+    ("EndDate", pa.date32()),
+    ("EndTime", pa.string()),
+    ("WaterLevel", pa.float64()),
+    ("ClosureEventType", pa.string()),
+    ("ClosureEventResult", pa.string()),
+])
+
+
+def _column_values(values: Sequence) -> Sequence:
+    if values and isinstance(values[0], Enum):
+        return [value.value for value in values]
+    return values
+
+
+def record_batch(rows: Sequence, schema: pa.Schema = CLOSURE_EXPORT_SCHEMA) -> pa.RecordBatch:
+    """Build a record batch from column rows (in schema order) one column at a time, without dictionaries per row."""
+    columns = list(zip(*rows)) if rows else [()] * len(schema)
+    return pa.RecordBatch.from_arrays(
+        [pa.array(_column_values(values), type=column.type) for values, column in zip(columns, schema)], schema=schema)
+
+
+class _ChunkSink:
+    """Write-only file that collects what a writer produces, so it can be sent on after every batch."""
+
+    def __init__(self):
+        self._chunks = []
+        self.closed = False
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+class ClosureExportEncoder:
+    """Incremental Arrow IPC stream, Parquet or CSV encoder of closure row batches.
+
+    write() encodes one batch and returns the bytes produced so far, finish() returns the rest (e.g. the Parquet
+    footer), so a response can be streamed without holding the whole export in memory."""
+
+    def __init__(self, export_format: str, schema: pa.Schema = CLOSURE_EXPORT_SCHEMA):
+        if export_format not in EXPORT_FORMATS:
+            raise ValueError(f"Unknown export format: {export_format}")
+        self.schema = schema
+        self.rows = 0
+        self._sink = _ChunkSink()
+        file = pa.PythonFile(self._sink, mode="w")
+        if export_format == "arrow":
+            self._writer = pa.ipc.new_stream(file, schema)
+        elif export_format == "parquet":
+            self._writer = pq.ParquetWriter(file, schema)
+        else:
+            self._writer = pa_csv.CSVWriter(file, schema)
+
+    def write(self, rows: Sequence) -> bytes:
+        if rows:
+            self._writer.write_batch(record_batch(rows, self.schema))
+            self.rows += len(rows)
+        return self._sink.drain()
+
+    def finish(self) -> bytes:
+        self._writer.close()
+        return self._sink.drain()
@@ -1,252 +1,1173 @@
+from contextlib import contextmanager
 from dataclasses import dataclass
+from datetime import date, datetime, timezone
+from enum import Enum
+from itertools import islice
+import json
+import re
+import numpy as np
+import orjson
+from sqlalchemy import Select, func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 from sqlalchemy.orm import Session
 from fastapi.encoders import jsonable_encoder
 import data_model as data_model
-from database.session_factory import SessionFactory
-from typing import List, Optional
-import numpy as np
+from barrier_registry import BARRIER_REGISTRY
+from closure_export import CLOSURE_EXPORT_SCHEMA, EXPORT_BATCH_SIZE, ClosureExportEncoder
+from database.session_factory import session_scope
+from enums.closure_event_result import ClosureEventResult
+from enums.closure_event_type import ClosureEventType
+from pydantic_model import TIME_PATTERN, normalize_time
+from typing import Iterable, Iterator, List, Optional, Sequence
+import reliability_statistics
+from reliability_cache import RELIABILITY_CACHE
+
+# Number of closure records sent to the database per set-based upsert statement
+BULK_INSERT_CHUNK_SIZE = 5000
+
+# Default and maximum number of closure records per page or streamed batch
+CLOSURE_PAGE_SIZE = 1000
+MAX_CLOSURE_PAGE_SIZE = 10000
+
+# Columns that identify a closure event (see uq_closure_event_barrier_start)
+CLOSURE_EVENT_KEY = ("BarrierID", "StartDate", "StartTime")
+
+# Columns that identify a gate closure (see uq_gate_closure_gate_event)
+GATE_CLOSURE_KEY = ("GateID", "BarrierClosureID")
+
+# The reliability snapshot holds the statistics at the defaults of the rule_of_three and failure_rate_update
+# endpoints, per event type and for all types together
+SNAPSHOT_ALL_TYPES = "ALL"
+SNAPSHOT_RULE_NUMBER = 3
+SNAPSHOT_PRIOR_FAILURE_RATE = 0.5
+SNAPSHOT_RESPONSE_COLUMNS = ("ClosureEventType", "SuccessfulClosures", "UnsuccessfulClosures", "RuleOfThreeUpperBound",
+                             "PosteriorAlpha", "PosteriorBeta", "PosteriorMeanFailureRate", "ComputedAt")
+
+_DIALECT_INSERTS = {
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert,
+}
+
+
+def _prepare_closure_rows(barrier_id: int, closure_data: List[dict]) -> tuple[list[dict], list[dict]]:
+    """Validate and deduplicate a chunk of closure records before they are sent to the database.
+
+    Returns the rows to upsert and the skipped records. Records sharing a start moment are merged
+    in order, so the last record wins just like the row-by-row path."""
+    columns = set(data_model.get_columns(
+        data_model.StormSurgeBarrierClosureEvents)) - {"ID"}
+    rows = {}
+    skipped_records = []
+
+    for closure in closure_data:
+        closure.setdefault("ClosureEventResult", "SUCCESS")
+        try:
+            unknown = set(closure) - columns
+            if unknown:
+                raise ValueError(
+                    f"Unknown closure field(s): {', '.join(sorted(unknown))}")
+            row = dict(closure, BarrierID=barrier_id)
+            for key in ("StartDate", "EndDate"):
+                if isinstance(row.get(key), str):
+                    row[key] = date.fromisoformat(row[key])
+            if row.get("StartDate") is None or row.get("StartTime") is None:
+                raise ValueError("StartDate and StartTime are required")
+            if "ClosureEventType" in row:
+                row["ClosureEventType"] = ClosureEventType(
+                    row["ClosureEventType"])
+            row["ClosureEventResult"] = ClosureEventResult(
+                row["ClosureEventResult"])
+            if row.get("WaterLevel") is not None:
+                row["WaterLevel"] = float(row["WaterLevel"])
+        except (TypeError, ValueError) as e:
+            skipped_records.append({
+                "record": closure,
+                "error": str(e)
+            })
+            continue
+
+        key = tuple(row[column] for column in CLOSURE_EVENT_KEY)
+        rows[key] = {**rows.get(key, {}), **row}
+
+    return list(rows.values()), skipped_records
+
+
+def _upsert_rows(session: Session, table, key: Sequence[str], rows: List[dict]):
+    """Upsert rows with one INSERT ... ON CONFLICT statement per distinct set of fields, key names the unique columns."""
+    insert = _DIALECT_INSERTS[session.get_bind().dialect.name]
+
+    groups = {}
+    for row in rows:
+        groups.setdefault(tuple(sorted(row)), []).append(row)
+
+    for fields, group in groups.items():
+        statement = insert(table)
+        update_fields = [f for f in fields if f not in key]
+        if update_fields:
+            statement = statement.on_conflict_do_update(
+                index_elements=list(key),
+                set_={f: statement.excluded[f] for f in update_fields})
+        else:
+            statement = statement.on_conflict_do_nothing(
+                index_elements=list(key))
+        session.execute(statement, group)
+
+
+def _upsert_closure_rows(session: Session, rows: List[dict]):
+    _upsert_rows(session, data_model.StormSurgeBarrierClosureEvents.__table__, CLOSURE_EVENT_KEY, rows)
+
+
+def _prepare_gate_closure_rows(session: Session, barrier_id: int, gate_ids: dict[str, int],
+                               gate_closure_data: List[dict]) -> tuple[list[dict], list[dict]]:
+    """Validate a chunk of gate closure records and resolve their gate and barrier closure.
+
+    A record names its gate (GateName) and refers to the barrier closure either by BarrierClosureID
+    or by the closure's StartDate and StartTime; the barrier closures of a chunk are looked up in one query."""
+    closures = data_model.StormSurgeBarrierClosureEvents
+    start_dates = set()
+    supplied_ids = set()
+    for record in gate_closure_data:
+        try:
+            if record.get("BarrierClosureID") is not None:
+                supplied_ids.add(int(record["BarrierClosureID"]))
+            elif isinstance(record.get("StartDate"), (str, date)):
+                start_dates.add(date.fromisoformat(str(record["StartDate"])))
+        except (TypeError, ValueError):
+            pass  # Reported with the record below
+    closure_ids = {}
+    if start_dates:
+        closure_ids = {(row.StartDate, row.StartTime): row.ID for row in session.execute(
+            select(closures.ID, closures.StartDate, closures.StartTime).where(
+                closures.BarrierID == barrier_id, closures.StartDate.in_(start_dates)))}
+    # Supplied closure IDs must belong to the barrier of the gates
+    barrier_closure_ids = set()
+    if supplied_ids:
+        barrier_closure_ids = set(session.scalars(select(closures.ID).where(
+            closures.BarrierID == barrier_id, closures.ID.in_(supplied_ids))))
+
+    rows = {}
+    skipped_records = []
+    for record in gate_closure_data:
+        try:
+            if record.get("GateName") not in gate_ids:
+                raise ValueError(f"Unknown gate: {record.get('GateName')}")
+            start_date = date.fromisoformat(str(record["StartDate"]))
+            end_date = date.fromisoformat(str(record.get("EndDate", record["StartDate"])))
+            if record.get("BarrierClosureID") is not None:
+                closure_id = int(record["BarrierClosureID"])
+                if closure_id not in barrier_closure_ids:
+                    raise ValueError(f"Closure event {closure_id} does not belong to the barrier")
+            else:
+                start_time = record.get("StartTime")
+                if isinstance(start_time, str) and re.fullmatch(TIME_PATTERN, start_time):
+                    start_time = normalize_time(start_time)
+                closure_id = closure_ids.get((start_date, start_time))
+                if closure_id is None:
+                    raise ValueError(
+                        f"No closure event of the barrier starts at {start_date} {record.get('StartTime')}")
+            row = {
+                "GateID": gate_ids[record["GateName"]],
+                "BarrierClosureID": int(closure_id),
+                "StartDate": start_date,
+                "EndDate": end_date,
+                "ClosureResult": ClosureEventResult(record.get("ClosureResult", "SUCCESS")).value,
+            }
+        except (KeyError, TypeError, ValueError) as e:
+            skipped_records.append({
+                "record": jsonable_encoder(record),
+                "error": str(e)
+            })
+            continue
+        rows[tuple(row[column] for column in GATE_CLOSURE_KEY)] = row
+
+    return list(rows.values()), skipped_records
+
+
+def lock_barriers(session: Session, barrier_ids: Iterable[int]):
+    """Lock the barriers until the end of the transaction, so concurrent writes to their closures are serialized."""
+    session.execute(select(data_model.StormSurgeBarriers.ID).where(
+        data_model.StormSurgeBarriers.ID.in_(list(barrier_ids))).with_for_update())
+
+
+def closure_count_key(barrier_id: int, closure_type, closure_result) -> tuple:
+    return barrier_id, ClosureEventType(closure_type), ClosureEventResult(closure_result)
+
+
+def existing_closure_results(session: Session, barrier_id: int, rows: List[dict]) -> dict:
+    """Type and result of the stored closures that the rows will update, keyed by their start moment."""
+    closures = data_model.StormSurgeBarrierClosureEvents
+    start_dates = {row["StartDate"] for row in rows}
+    return {(row.StartDate, row.StartTime): (row.ClosureEventType, row.ClosureEventResult)
+            for row in session.execute(select(
+                closures.StartDate, closures.StartTime, closures.ClosureEventType, closures.ClosureEventResult
+            ).where(closures.BarrierID == barrier_id, closures.StartDate.in_(start_dates)))}
+
+
+def closure_count_deltas(barrier_id: int, rows: List[dict], existing: dict) -> dict:
+    """Changes of the closure counts when the rows are upserted: +1 for the new type and result of every row,
+    -1 for the old ones of the rows that update a stored closure."""
+    deltas = {}
+    for row in rows:
+        old = existing.get((row["StartDate"], row["StartTime"]))
+        new_type = row.get("ClosureEventType", old[0] if old else None)
+        new_key = closure_count_key(barrier_id, new_type, row.get("ClosureEventResult", old[1] if old else None))
+        deltas[new_key] = deltas.get(new_key, 0) + 1
+        if old is not None:
+            old_key = closure_count_key(barrier_id, *old)
+            deltas[old_key] = deltas.get(old_key, 0) - 1
+    return deltas
+
+
+def apply_closure_count_deltas(session: Session, deltas: dict):
+    """Add the deltas to the closure count aggregate (Count = Count + delta) with one upsert statement."""
+    rows = [{"BarrierID": barrier_id, "ClosureEventType": closure_type, "ClosureEventResult": closure_result,
+             "Count": delta}
+            for (barrier_id, closure_type, closure_result), delta in deltas.items() if delta]
+    if not rows:
+        return
+    table = data_model.StormSurgeBarrierClosureCounts.__table__
+    statement = _DIALECT_INSERTS[session.get_bind().dialect.name](table)
+    statement = statement.on_conflict_do_update(
+        index_elements=["BarrierID", "ClosureEventType", "ClosureEventResult"],
+        set_={"Count": table.c.Count + statement.excluded.Count})
+    session.execute(statement, rows)
+
+
+def refresh_closure_counts(session: Session, barrier_ids: Optional[Iterable[int]] = None):
+    """Recompute the closure count aggregate for the given barriers (all barriers if None) in the session's transaction.
+
+    Scans the whole closure history, the write paths apply count deltas instead. Used to fill the aggregate."""
+    closures = data_model.StormSurgeBarrierClosureEvents
+    counts = data_model.StormSurgeBarrierClosureCounts
+
+    grouped_counts = select(
+        closures.BarrierID, closures.ClosureEventType, closures.ClosureEventResult, func.count()
+    ).group_by(closures.BarrierID, closures.ClosureEventType, closures.ClosureEventResult)
+    delete_counts = counts.__table__.delete()
+
+    if barrier_ids is not None:
+        barrier_ids = list(barrier_ids)
+        lock_barriers(session, barrier_ids)
+        grouped_counts = grouped_counts.where(
+            closures.BarrierID.in_(barrier_ids))
+        delete_counts = delete_counts.where(counts.BarrierID.in_(barrier_ids))
+
+    session.execute(delete_counts)
+    session.execute(counts.__table__.insert().from_select(
+        ["BarrierID", "ClosureEventType", "ClosureEventResult", "Count"], grouped_counts))
+
+
+def gate_rows_statement(barrier_id: int) -> Select:
+    """Select the gate columns of a barrier."""
+    gates = data_model.IndividualStormSurgeBarrierGates.__table__
+    return select(gates).where(gates.c.BarrierID == barrier_id).order_by(gates.c.ID)
+
+
+def gate_closure_rows_statement(barrier_id: int) -> Select:
+    """Select the gate closure columns of all gates of a barrier."""
+    gates = data_model.IndividualStormSurgeBarrierGates.__table__
+    gate_closures = data_model.IndividualGateClosures.__table__
+    return select(gate_closures).join(gates, gates.c.ID == gate_closures.c.GateID).where(
+        gates.c.BarrierID == barrier_id).order_by(gate_closures.c.ID)
+
+
+def gate_closure_counts_statement(abbreviation: str) -> Select:
+    """Select the barrier with its gates and their closure counts per result, one row per count.
+
+    Gates without closures give a row with a NULL result, a barrier without gates a row with a NULL gate."""
+    barriers = data_model.StormSurgeBarriers
+    gates = data_model.IndividualStormSurgeBarrierGates
+    gate_closures = data_model.IndividualGateClosures
+    return select(
+        barriers.Name, barriers.GateConfiguration, gates.ID.label("GateID"), gates.Name.label("GateName"),
+        gate_closures.ClosureResult, func.count(gate_closures.ID).label("Count")
+    ).outerjoin(gates, gates.BarrierID == barriers.ID).outerjoin(
+        gate_closures, gate_closures.GateID == gates.ID).where(barriers.Abbreviation == abbreviation).group_by(
+        barriers.Name, barriers.GateConfiguration, gates.ID, gates.Name, gate_closures.ClosureResult).order_by(gates.ID)
+
+
+def gate_reliability_from_counts(rows, prior_failure_rate: Optional[float], rule_number: int,
+                                 required_gates: Optional[int]) -> dict:
+    """Gate reliability response for the rows of gate_closure_counts_statement."""
+    gate_index = {}
+    names = []
+    for row in rows:
+        if row.GateID is not None and row.GateID not in gate_index:
+            gate_index[row.GateID] = len(gate_index)
+            names.append(row.GateName)
+
+    successes = np.zeros(len(gate_index), dtype=np.int64)
+    failures = np.zeros(len(gate_index), dtype=np.int64)
+    for row in rows:
+        if row.ClosureResult == ClosureEventResult.SUCCESS.value:
+            successes[gate_index[row.GateID]] += row.Count
+        elif row.ClosureResult == ClosureEventResult.FAILURE.value:
+            failures[gate_index[row.GateID]] += row.Count
+
+    return reliability_statistics.gate_reliability_response(
+        rows[0].Name, rows[0].GateConfiguration, list(gate_index), names, successes, failures,
+        prior_failure_rate, rule_number, required_gates)
+
+
+def latest_closure_starts_statement(barrier_ids: Optional[Sequence[int]] = None) -> Select:
+    """BarrierID, StartDate and StartTime of the latest closure event of every barrier (the given barriers if not None),
+    the latest start date per barrier and the latest start time on that date in one grouped query."""
+    closures = data_model.StormSurgeBarrierClosureEvents
+    latest_dates = select(closures.BarrierID, func.max(closures.StartDate).label("StartDate")).group_by(closures.BarrierID)
+    if barrier_ids is not None:
+        latest_dates = latest_dates.where(closures.BarrierID.in_(barrier_ids))
+    latest_dates = latest_dates.subquery()
+    return (select(closures.BarrierID, closures.StartDate, func.max(closures.StartTime).label("StartTime"))
+            .join(latest_dates, (closures.BarrierID == latest_dates.c.BarrierID) & (closures.StartDate == latest_dates.c.StartDate))
+            .group_by(closures.BarrierID, closures.StartDate))
+
+
+def refresh_ingestion_watermarks(session: Session, barrier_ids: Optional[Iterable[int]] = None):
+    """Set the watermark of the given barriers (all barriers if None) to the start of their latest closure event."""
+    watermarks = data_model.IngestionWatermarks
+    if barrier_ids is not None:
+        barrier_ids = list(barrier_ids)
+
+    latest = {row.BarrierID: (row.StartDate, row.StartTime)
+              for row in session.execute(latest_closure_starts_statement(barrier_ids))}
+    existing = select(watermarks)
+    if barrier_ids is not None:
+        existing = existing.where(watermarks.BarrierID.in_(barrier_ids))
+    current = {watermark.BarrierID: watermark for watermark in session.scalars(existing)}
+
+    for barrier_id, watermark in current.items():
+        if barrier_id not in latest:
+            session.delete(watermark)
+    updated_at = datetime.now(timezone.utc)
+    for barrier_id, (start_date, start_time) in latest.items():
+        watermark = current.get(barrier_id)
+        if watermark is None:
+            watermark = watermarks(BarrierID=barrier_id)
+            session.add(watermark)
+        watermark.StartDate, watermark.StartTime, watermark.UpdatedAt = start_date, start_time, updated_at
+    session.flush()
+
+
+def at_or_after_watermark(record: dict, watermark: Optional[tuple[date, str]]) -> bool:
+    """Whether a closure record starts at or after the watermark, the watermark event itself is submitted
+    again so a correction of the latest event is still picked up."""
+    if watermark is None:
+        return True
+    start_date = record.get("StartDate")
+    if isinstance(start_date, str):
+        start_date = date.fromisoformat(start_date)
+    start_time = record.get("StartTime")
+    if start_date is None or start_time is None:
+        # Let the regular validation report the record
+        return True
+    return (start_date, str(start_time)) >= watermark
+
+
+def ingestion_watermark(session: Session, abbreviation: str) -> Optional[tuple[date, str]]:
+    barriers = data_model.StormSurgeBarriers
+    watermarks = data_model.IngestionWatermarks
+    row = session.execute(
+        select(watermarks.StartDate, watermarks.StartTime)
+        .join(barriers, barriers.ID == watermarks.BarrierID)
+        .where(barriers.Abbreviation == abbreviation)).first()
+    return tuple(row) if row else None
+
+
+def barrier_closure_counts_statement(abbreviation: str) -> Select:
+    """Select the barrier with its closure counts per event type and result, one row per count."""
+    barriers = data_model.StormSurgeBarriers
+    counts = data_model.StormSurgeBarrierClosureCounts
+    return select(
+        barriers.ID, barriers.Name, counts.ClosureEventType, counts.ClosureEventResult, counts.Count
+    ).outerjoin(counts, counts.BarrierID == barriers.ID).where(barriers.Abbreviation == abbreviation)
+
+
+def barriers_closure_counts_statement(abbreviations: Optional[Sequence[str]] = None) -> Select:
+    """Select all barriers (or the given ones) with their closure counts per event type and result, one row per count."""
+    barriers = data_model.StormSurgeBarriers
+    counts = data_model.StormSurgeBarrierClosureCounts
+    statement = select(
+        barriers.ID, barriers.Abbreviation, barriers.Name, counts.ClosureEventType, counts.ClosureEventResult, counts.Count
+    ).outerjoin(counts, counts.BarrierID == barriers.ID).order_by(barriers.ID)
+    if abbreviations is not None:
+        statement = statement.where(barriers.Abbreviation.in_(abbreviations))
+    return statement
+
+
+def closure_daily_counts_statement(abbreviation: str, closure_type: Optional[str] = None) -> Select:
+    """Select the barrier with its closure counts per start date and result in date order, one row per count.
+
+    A barrier without (matching) closures gives one row with a NULL StartDate."""
+    barriers = data_model.StormSurgeBarriers
+    closures = data_model.StormSurgeBarrierClosureEvents
+    join_condition = closures.BarrierID == barriers.ID
+    if closure_type:
+        join_condition &= closures.ClosureEventType == ClosureEventType(closure_type)
+    return select(
+        barriers.Name, closures.StartDate, closures.ClosureEventResult, func.count(closures.ID)
+    ).outerjoin(closures, join_condition).where(barriers.Abbreviation == abbreviation).group_by(
+        barriers.Name, closures.StartDate, closures.ClosureEventResult).order_by(closures.StartDate)
+
+
+def daily_closure_counts(rows) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Sorted closure dates with the successful and failed closures per date, from closure_daily_counts_statement rows."""
+    rows = [row for row in rows if row.StartDate is not None]
+    dates, index = np.unique(np.array([row.StartDate for row in rows], dtype="datetime64[D]"), return_inverse=True)
+    successes = np.zeros(len(dates), dtype=np.int64)
+    failures = np.zeros(len(dates), dtype=np.int64)
+    counts = np.array([row[3] for row in rows], dtype=np.int64)
+    results = [row.ClosureEventResult for row in rows]
+    is_success = np.array([result == ClosureEventResult.SUCCESS for result in results], dtype=bool)
+    is_failure = np.array([result == ClosureEventResult.FAILURE for result in results], dtype=bool)
+    np.add.at(successes, index[is_success], counts[is_success])
+    np.add.at(failures, index[is_failure], counts[is_failure])
+    return dates, successes, failures
+
+
+def closure_count_matrices(rows, closure_types: Sequence[Optional[str]]) -> tuple[list[str], list[str], np.ndarray, np.ndarray]:
+    """Successful and failed closure counts as (barriers, closure types) arrays, a closure type of None totals all types.
+
+    Returns the abbreviations and names of the barriers in row order with the two count arrays."""
+    barrier_index = {}
+    names = []
+    for row in rows:
+        if row.Abbreviation not in barrier_index:
+            barrier_index[row.Abbreviation] = len(barrier_index)
+            names.append(row.Name)
+
+    event_types = list(ClosureEventType)
+    results = list(ClosureEventResult)
+    # Counts per barrier, event type and result
+    cube = np.zeros((len(barrier_index), len(event_types), len(results)), dtype=np.int64)
+    for row in rows:
+        if row.ClosureEventResult is not None:  # Barrier without closures
+            cube[barrier_index[row.Abbreviation], event_types.index(row.ClosureEventType),
+                 results.index(row.ClosureEventResult)] += row.Count
+
+    # Event types that are totalled for every requested closure type
+    selection = np.array([[closure_type is None or event_type == ClosureEventType(closure_type)
+                           for event_type in event_types] for closure_type in closure_types], dtype=np.int64)
+    per_type = np.einsum("ber,te->btr", cube, selection)
+    return (list(barrier_index), names,
+            per_type[..., results.index(ClosureEventResult.SUCCESS)],
+            per_type[..., results.index(ClosureEventResult.FAILURE)])
+
+
+def summarize_closure_counts(rows, closure_type: Optional[str] = None) -> dict[str, int]:
+    """Total the closure counts per result, for one event type or for all types if None."""
+    closure_type = ClosureEventType(closure_type) if closure_type else None
+    totals = {result.value: 0 for result in ClosureEventResult}
+    for row in rows:
+        if row.ClosureEventResult is None:
+            continue  # Barrier without closures
+        if closure_type is None or row.ClosureEventType == closure_type:
+            totals[row.ClosureEventResult.value] += row.Count
+    return totals
+
+
+def _table_columns(table, columns: Optional[Sequence[str]]) -> list:
+    return list(table.c) if columns is None else [table.c[name] for name in columns]
+
+
+def closure_rows_statement(barrier_id: Optional[int] = None, after_id: Optional[int] = None, columns: Optional[Sequence[str]] = None) -> Select:
+    """Select closure columns only (no ORM instances or relationships) in ID order, for keyset pagination.
+
+    Selects all columns of the table, or only the given ones."""
+    closures = data_model.StormSurgeBarrierClosureEvents.__table__
+    statement = select(*_table_columns(closures, columns)).order_by(closures.c.ID)
+    if barrier_id is not None:
+        statement = statement.where(closures.c.BarrierID == barrier_id)
+    if after_id is not None:
+        statement = statement.where(closures.c.ID > after_id)
+    return statement
+
+
+def closure_export_statement(barrier_ids: Optional[Sequence[int]] = None, closure_types: Optional[Sequence[ClosureEventType]] = None,
+                             start_date: Optional[date] = None, end_date: Optional[date] = None) -> Select:
+    """Select the columns of CLOSURE_EXPORT_SCHEMA in ID order, optionally for some barriers and types and for
+    closures starting between start_date and end_date (both inclusive)."""
+    closures = data_model.StormSurgeBarrierClosureEvents.__table__
+    barriers = data_model.StormSurgeBarriers.__table__
+    columns = [barriers.c.Abbreviation if name == "Abbreviation" else closures.c[name]
+               for name in CLOSURE_EXPORT_SCHEMA.names]
+    statement = select(*columns).join_from(
+        closures, barriers, closures.c.BarrierID == barriers.c.ID).order_by(closures.c.ID)
+    if barrier_ids is not None:
+        statement = statement.where(closures.c.BarrierID.in_(barrier_ids))
+    if closure_types:
+        statement = statement.where(closures.c.ClosureEventType.in_(closure_types))
+    if start_date is not None:
+        statement = statement.where(closures.c.StartDate >= start_date)
+    if end_date is not None:
+        statement = statement.where(closures.c.StartDate <= end_date)
+    return statement
+
+
+def barrier_rows_statement(columns: Optional[Sequence[str]] = None) -> Select:
+    """Select barrier columns only, without the closures relationship."""
+    barriers = data_model.StormSurgeBarriers.__table__
+    return select(*_table_columns(barriers, columns)).order_by(barriers.c.ID)
+
+
+def encode_rows(rows) -> list[dict]:
+    """Convert column rows to JSON compatible dictionaries."""
+    return jsonable_encoder([dict(row._mapping) for row in rows])
+
+
+def encode_json(rows) -> bytes:
+    """Encode column rows as a JSON array in one pass, orjson serializes dates and enums natively."""
+    return orjson.dumps([row._asdict() for row in rows])
+
+
+def closure_page(rows, limit: int) -> dict:
+    """Build a page from up to limit + 1 rows, the extra row only signals that a next page exists."""
+    items = encode_rows(rows[:limit])
+    next_cursor = items[-1]["ID"] if len(rows) > limit else None
+    return {"items": items, "next_cursor": next_cursor}
+
+
+def _json_default(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def encode_ndjson(rows) -> bytes:
+    """Encode rows as newline delimited JSON, one object per line."""
+    return "".join(
+        json.dumps(dict(row._mapping), default=_json_default) + "\n" for row in rows).encode()
+
+
+def reliability_batch_from_counts(rows, abbreviations: Optional[Sequence[str]], closure_types: Sequence[Optional[str]],
+                               rule_numbers: Sequence[float], prior_failure_rates: Sequence[Optional[float]]) -> dict:
+    """Batch statistics response for the rows of barriers_closure_counts_statement, listing unknown abbreviations."""
+    found, names, successes, failures = closure_count_matrices(rows, closure_types)
+    response = reliability_statistics.reliability_batch_response(
+        found, names, [ClosureEventType(t).value if t else None for t in closure_types],
+        successes, failures, rule_numbers, prior_failure_rates)
+    response["missing_abbreviations"] = [
+        abbreviation for abbreviation in abbreviations or [] if abbreviation not in found]
+    return response
+
+
+def windowed_reliability_from_counts(rows, closure_type: Optional[str], window_years: int, since: Optional[date],
+                                     prior_failure_rate: Optional[float], rule_number: int) -> dict:
+    """Windowed statistics response for the rows of closure_daily_counts_statement."""
+    dates, successes, failures = daily_closure_counts(rows)
+    return reliability_statistics.windowed_reliability_response(
+        rows[0].Name, dates, successes, failures, ClosureEventType(closure_type).value if closure_type else None,
+        window_years, np.datetime64(since, "D") if since else None, prior_failure_rate, rule_number)
+
+
+def refresh_reliability_snapshots(session: Session, abbreviations: Optional[Sequence[str]] = None) -> int:
+    """Recompute the reliability snapshot of the given barriers (all barriers if None) from the closure counts
+    in the session's transaction, returns the number of snapshot rows written."""
+    snapshots = data_model.ReliabilitySnapshots
+    closure_types = [None] + [closure_type.value for closure_type in ClosureEventType]
+    rows = session.execute(barriers_closure_counts_statement(abbreviations)).all()
+    found, _, successes, failures = closure_count_matrices(rows, closure_types)
+    ids = {row.Abbreviation: row.ID for row in rows}
+    barrier_ids = [ids[abbreviation] for abbreviation in found]
+
+    bounds = reliability_statistics.rule_of_three_bounds(successes, [SNAPSHOT_RULE_NUMBER])[..., 0]
+    a, b = reliability_statistics.beta_priors([SNAPSHOT_PRIOR_FAILURE_RATE])
+    alphas = a[0] + failures
+    betas = b[0] + successes
+    computed_at = datetime.now(timezone.utc)
+    values = [{
+        "BarrierID": barrier_id,
+        "ClosureEventType": closure_type or SNAPSHOT_ALL_TYPES,
+        "SuccessfulClosures": int(successes[i, j]),
+        "UnsuccessfulClosures": int(failures[i, j]),
+        "RuleOfThreeUpperBound": None if np.isnan(bounds[i, j]) else float(bounds[i, j]),
+        "PosteriorAlpha": float(alphas[i, j]),
+        "PosteriorBeta": float(betas[i, j]),
+        "PosteriorMeanFailureRate": float(alphas[i, j] / (alphas[i, j] + betas[i, j])),
+        "ComputedAt": computed_at,
+    } for i, barrier_id in enumerate(barrier_ids) for j, closure_type in enumerate(closure_types)]
+
+    delete_snapshots = snapshots.__table__.delete()
+    if abbreviations is not None:
+        delete_snapshots = delete_snapshots.where(snapshots.BarrierID.in_(barrier_ids))
+    session.execute(delete_snapshots)
+    if values:
+        session.execute(snapshots.__table__.insert(), values)
+    return len(values)
+
+
+def reliability_snapshot_statement(abbreviation: Optional[str] = None) -> Select:
+    """Select the snapshot rows of all barriers (or one), one row per barrier and event type."""
+    barriers = data_model.StormSurgeBarriers
+    snapshots = data_model.ReliabilitySnapshots
+    statement = select(
+        barriers.Abbreviation, barriers.Name, *_table_columns(snapshots.__table__, SNAPSHOT_RESPONSE_COLUMNS)
+    ).join(snapshots, snapshots.BarrierID == barriers.ID).order_by(barriers.ID, snapshots.ClosureEventType)
+    if abbreviation is not None:
+        statement = statement.where(barriers.Abbreviation == abbreviation)
+    return statement
+
+
+def snapshot_closure_counts_statement(abbreviation: str, closure_type: Optional[str] = None) -> Select:
+    """Select the barrier name and the closure counts of one snapshot row, of one event type or all types if None."""
+    barriers = data_model.StormSurgeBarriers
+    snapshots = data_model.ReliabilitySnapshots
+    return select(barriers.Name, snapshots.SuccessfulClosures, snapshots.UnsuccessfulClosures).join(
+        snapshots, snapshots.BarrierID == barriers.ID).where(
+        barriers.Abbreviation == abbreviation,
+        snapshots.ClosureEventType == (ClosureEventType(closure_type).value if closure_type else SNAPSHOT_ALL_TYPES))
+
+
+def snapshot_closure_counts(row) -> dict[str, int]:
+    """Closure counts per result of a snapshot_closure_counts_statement row, like summarize_closure_counts."""
+    return {ClosureEventResult.SUCCESS.value: row.SuccessfulClosures, ClosureEventResult.FAILURE.value: row.UnsuccessfulClosures}
+
+
+def reliability_snapshot_response(rows) -> dict:
+    """Snapshot rows with the time the oldest of them was computed, the snapshot is at least that fresh."""
+    return {
+        "computed_at": min(row.ComputedAt for row in rows) if rows else None,
+        "items": encode_rows(rows),
+    }
 
 
 @dataclass
 class StormSurgeBarrierDataHandler:
     # Any other handlers can be added here if required
+    # Session owned by the caller (e.g. one per request), a short-lived session is opened per call if None
+    session: Optional[Session] = None
 
     def __post_init__(self):
         pass
 
+    @contextmanager
+    def _session(self) -> Iterator[Session]:
+        """Yield the bound session, or a scoped session that is closed after the call."""
+        if self.session is not None:
+            yield self.session
+        else:
+            with session_scope() as session:
+                yield session
+
     def upsert_barrier(self, barrier_dict: dict):
         """Insert a new storm surge barrier or update an existing one."""
-        session = SessionFactory()
-        existing_barrier = session.query(data_model.StormSurgeBarriers).filter_by(
-            Abbreviation=barrier_dict['Abbreviation']).first()
+        with self._session() as session:
+            existing_barrier = session.query(data_model.StormSurgeBarriers).filter_by(
+                Abbreviation=barrier_dict['Abbreviation']).first()
 
-        if existing_barrier is not None:
-            for key, value in barrier_dict.items():
-                setattr(existing_barrier, key, value)
-        else:
-            new_barrier = data_model.StormSurgeBarriers(**barrier_dict)
-            session.add(new_barrier)
+            if existing_barrier is not None:
+                for key, value in barrier_dict.items():
+                    setattr(existing_barrier, key, value)
+                barrier = existing_barrier
+            else:
+                barrier = data_model.StormSurgeBarriers(**barrier_dict)
+                session.add(barrier)
 
-        session.commit()
+            session.flush()
+            registered = (barrier.ID, barrier.Abbreviation, barrier.Name)
+            session.commit()
+        BARRIER_REGISTRY.register(*registered)
+        RELIABILITY_CACHE.invalidate_barrier(barrier_dict['Abbreviation'])
 
     def put_closure_data(self, closure_dict: dict):
         """Insert closure data into the database."""
-        session = SessionFactory()
-        new_closure = data_model.StormSurgeBarrierClosureEvents(**closure_dict)
-        session.add(new_closure)
-        session.commit()
+        with self._session() as session:
+            new_closure = data_model.StormSurgeBarrierClosureEvents(**closure_dict)
+            lock_barriers(session, [new_closure.BarrierID])
+            session.add(new_closure)
+            session.flush()
+            apply_closure_count_deltas(session, {closure_count_key(
+                new_closure.BarrierID, new_closure.ClosureEventType, new_closure.ClosureEventResult): 1})
+            refresh_ingestion_watermarks(session, [new_closure.BarrierID])
+            abbreviation = BARRIER_REGISTRY.abbreviation(session, new_closure.BarrierID)
+            session.commit()
+        RELIABILITY_CACHE.invalidate_barrier(abbreviation)
 
     def get_all_barriers(self) -> list[dict]:
         """Retrieve all storm surge barriers from the database."""
-        session = SessionFactory()
-        barriers = session.query(data_model.StormSurgeBarriers).all()
-        return jsonable_encoder([barrier.to_dict() for barrier in barriers])
+        with self._session() as session:
+            return encode_rows(session.execute(barrier_rows_statement()).all())
 
     def get_all_closures(self) -> list[dict]:
         """Retrieve all closures for storm surge barriers from the database."""
-        session = SessionFactory()
-        closures = session.query(
-            data_model.StormSurgeBarrierClosureEvents).all()
-        return jsonable_encoder([closure.to_dict() for closure in closures])
+        with self._session() as session:
+            return encode_rows(session.execute(closure_rows_statement()).all())
 
     def get_closures_by_abbreviation(self, abbreviation: str) -> list[dict]:
         """Retrieve all closures for a specific storm surge barrier based on its abbreviation from the database."""
-        session = SessionFactory()
+        with self._session() as session:
+            # Identify the barrier ID based on the abbreviation
+            barrier_id = BARRIER_REGISTRY.barrier_id(session, abbreviation)
+
+            if not barrier_id:
+                return []  # Return empty list if no barrier found with given abbreviation
+
+            # Fetch the closure columns of the identified barrier
+            return encode_rows(session.execute(closure_rows_statement(barrier_id)).all())
+
+    def get_barriers_json(self, columns: Optional[Sequence[str]] = None) -> bytes:
+        """All barriers as a JSON array, encoded straight from the selected columns."""
+        with self._session() as session:
+            return encode_json(session.execute(barrier_rows_statement(columns)).all())
+
+    def get_closures_json(self, abbreviation: Optional[str] = None, columns: Optional[Sequence[str]] = None) -> bytes:
+        """Closures of one barrier (all barriers if None) as a JSON array, encoded straight from the selected columns."""
+        with self._session() as session:
+            barrier_id = None
+            if abbreviation is not None:
+                barrier_id = BARRIER_REGISTRY.barrier_id(session, abbreviation)
+                if not barrier_id:
+                    return b"[]"
 
-        # Identify the barrier ID based on the abbreviation
-        barrier_id = session.query(data_model.StormSurgeBarriers.ID).filter_by(
-            Abbreviation=abbreviation).first()
+            return encode_json(session.execute(closure_rows_statement(barrier_id, columns=columns)).all())
 
-        if not barrier_id:
-            return []  # Return empty list if no barrier found with given abbreviation
+    def get_closures_page(self, abbreviation: Optional[str] = None, after_id: Optional[int] = None, limit: int = CLOSURE_PAGE_SIZE) -> dict:
+        """Retrieve one page of closures ordered by ID, optionally for one barrier, starting after the given cursor."""
+        with self._session() as session:
+            barrier_id = None
+            if abbreviation is not None:
+                barrier_id = BARRIER_REGISTRY.barrier_id(session, abbreviation)
+                if not barrier_id:
+                    return {"items": [], "next_cursor": None}
 
-        # Fetch closures for the identified barrier
-        closures = session.query(data_model.StormSurgeBarrierClosureEvents).filter_by(
-            BarrierID=barrier_id
-        ).all()
+            rows = session.execute(closure_rows_statement(
+                barrier_id, after_id).limit(limit + 1)).all()
+            return closure_page(rows, limit)
 
-        # Convert the ORM objects to dictionaries
-        return jsonable_encoder([closure.to_dict() for closure in closures])
+    def iter_closures(self, abbreviation: Optional[str] = None, batch_size: int = CLOSURE_PAGE_SIZE) -> Iterator[list]:
+        """Yield closures in batches of rows from a server-side cursor, so memory does not grow with the table."""
+        with self._session() as session:
+            barrier_id = None
+            if abbreviation is not None:
+                barrier_id = BARRIER_REGISTRY.barrier_id(session, abbreviation)
+                if not barrier_id:
+                    return
+
+            result = session.execute(
+                closure_rows_statement(barrier_id),
+                execution_options={"stream_results": True, "yield_per": batch_size})
+            for partition in result.partitions():
+                yield partition
+
+    def export_closures(self, export_format: str, abbreviations: Optional[Sequence[str]] = None,
+                        closure_types: Optional[Sequence[ClosureEventType]] = None, start_date: Optional[date] = None,
+                        end_date: Optional[date] = None, batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[bytes]:
+        """Yield the closures as Arrow IPC, Parquet or CSV chunks, encoded per batch from a server-side cursor.
+
+        Unknown abbreviations match no closures, an export without rows still holds the schema."""
+        encoder = ClosureExportEncoder(export_format)
+        with self._session() as session:
+            barrier_ids = None
+            if abbreviations is not None:
+                barrier_ids = [barrier_id for barrier_id in (BARRIER_REGISTRY.barrier_id(session, abbreviation)
+                                                             for abbreviation in abbreviations) if barrier_id]
+
+            result = session.execute(
+                closure_export_statement(barrier_ids, closure_types, start_date, end_date),
+                execution_options={"stream_results": True, "yield_per": batch_size})
+            for partition in result.partitions():
+                chunk = encoder.write(partition)
+                if chunk:
+                    yield chunk
+        yield encoder.finish()
 
     def insert_single_closure_event(self, abbreviation: str, event: dict):
-        session = SessionFactory()
-        barrier_id = session.query(data_model.StormSurgeBarriers.ID).filter_by(
-            Abbreviation=abbreviation).first()
-        if not barrier_id:
-            return {"message": "Barrier not found"}, 404
+        with self._session() as session:
+            barrier_id = BARRIER_REGISTRY.barrier_id(session, abbreviation)
+            if not barrier_id:
+                return {"message": "Barrier not found"}, 404
 
-        existing_record = session.query(data_model.StormSurgeBarrierClosureEvents).filter_by(
-            StartDate=event["StartDate"],
-            EndDate=event["EndDate"],
-            BarrierID=barrier_id
-        ).first()
+            event = {**event, "BarrierID": barrier_id}
+            existing_record = session.query(data_model.StormSurgeBarrierClosureEvents).filter_by(
+                **{column: event[column] for column in CLOSURE_EVENT_KEY}).first()
 
-        if existing_record:
-            return {"message": "Duplicate entry found. Skipping record."}, 409
+            if existing_record:
+                return {"message": "Duplicate entry found. Skipping record."}, 409
 
-        new_event = data_model.StormSurgeBarrierClosureEvents(
-            **event, BarrierID=barrier_id)
-        session.add(new_event)
-        session.commit()
-        session.refresh(new_event)
+            new_event = data_model.StormSurgeBarrierClosureEvents(**event)
+            lock_barriers(session, [barrier_id])
+            session.add(new_event)
+            try:
+                session.flush()
+            except IntegrityError:
+                # Inserted by a concurrent request after the check
+                session.rollback()
+                return {"message": "Duplicate entry found. Skipping record."}, 409
+            apply_closure_count_deltas(session, {closure_count_key(
+                barrier_id, new_event.ClosureEventType, new_event.ClosureEventResult): 1})
+            refresh_ingestion_watermarks(session, [barrier_id])
+            session.commit()
+            RELIABILITY_CACHE.invalidate_barrier(abbreviation)
+            session.refresh(new_event)
 
-        return {"message": "Insert successful", "inserted_event": new_event.to_dict()}, 201
+            return {"message": "Insert successful", "inserted_event": new_event.to_dict()}, 201
 
     def get_all_abbreviations(self) -> list[str]:
         """Retrieve all abbreviations for storm surge barriers from the database."""
-        session = SessionFactory()
-        abbreviations = session.query(
-            data_model.StormSurgeBarriers.Abbreviation).all()
-        return [item[0] for item in abbreviations]
+        with self._session() as session:
+            abbreviations = session.query(
+                data_model.StormSurgeBarriers.Abbreviation).all()
+            return [item[0] for item in abbreviations]
 
-    def insert_closure_events(self, abbreviation: str, closure_data: List[dict]) -> dict:
-        session: Session = SessionFactory()
+    def insert_closure_events(self, abbreviation: str, closure_data: List[dict], incremental: bool = False) -> dict:
+        with self._session() as session:
+            # Identify the barrier ID based on the abbreviation
+            barrier_id = BARRIER_REGISTRY.barrier_id(session, abbreviation)
 
-        # Identify the barrier ID based on the abbreviation
-        barrier_id = session.query(data_model.StormSurgeBarriers.ID).filter_by(
-            Abbreviation=abbreviation).scalar()
+            if not barrier_id:
+                raise ValueError(
+                    f"No barrier found with abbreviation: {abbreviation}")
 
-        if not barrier_id:
-            raise ValueError(
-                f"No barrier found with abbreviation: {abbreviation}")
+            skipped_records = []
+            if incremental:
+                watermark = ingestion_watermark(session, abbreviation)
+                closure_data = [closure for closure in closure_data
+                                if at_or_after_watermark(closure, watermark)]
 
-        skipped_records = []
+            for closure in closure_data:
+                closure.setdefault("ClosureEventResult", "SUCCESS")
+                try:
+                    lock_barriers(session, [barrier_id])
+                    # Check for existing record
+                    existing_record = session.query(data_model.StormSurgeBarrierClosureEvents).filter_by(
+                        StartDate=closure["StartDate"],
+                        StartTime=closure["StartTime"],
+                        BarrierID=barrier_id
+                    ).first()
 
-        for closure in closure_data:
-            closure.setdefault("ClosureEventResult", "SUCCESS")
-            try:
-                # Check for existing record
-                existing_record = session.query(data_model.StormSurgeBarrierClosureEvents).filter_by(
-                    StartDate=closure["StartDate"],
-                    StartTime=closure["StartTime"],
-                    BarrierID=barrier_id
-                ).first()
-
-                if existing_record:
-                    # Update existing record
-                    for key, value in closure.items():
-                        setattr(existing_record, key, value)
-                else:
-                    # Insert new record
-                    new_closure = data_model.StormSurgeBarrierClosureEvents(
-                        BarrierID=barrier_id, **closure)
-                    session.add(new_closure)
+                    deltas = {}
+                    if existing_record:
+                        old_key = closure_count_key(
+                            barrier_id, existing_record.ClosureEventType, existing_record.ClosureEventResult)
+                        deltas[old_key] = -1
+                        # Update existing record
+                        for key, value in closure.items():
+                            setattr(existing_record, key, value)
+                        record = existing_record
+                    else:
+                        # Insert new record
+                        record = data_model.StormSurgeBarrierClosureEvents(
+                            BarrierID=barrier_id, **closure)
+                        session.add(record)
 
-                session.commit()
-            except Exception as e:
-                # Catch any error and skip the record
-                session.rollback()
-                skipped_records.append({
-                    "record": closure,
-                    "error": str(e)
-                })
+                    new_key = closure_count_key(barrier_id, record.ClosureEventType, record.ClosureEventResult)
+                    deltas[new_key] = deltas.get(new_key, 0) + 1
+                    session.flush()
+                    apply_closure_count_deltas(session, deltas)
+                    session.commit()
+                except Exception as e:
+                    # Catch any error and skip the record
+                    session.rollback()
+                    skipped_records.append({
+                        "record": closure,
+                        "error": str(e)
+                    })
 
-        return {"skipped_records": skipped_records}
+            refresh_ingestion_watermarks(session, [barrier_id])
+            session.commit()
+            RELIABILITY_CACHE.invalidate_barrier(abbreviation)
 
-    def calculate_rule_of_three(self, abbreviation: str, closure_type: Optional[str] = None, rule_number: int = 3) -> dict:
-        session: Session = SessionFactory()
-        barrier = session.query(data_model.StormSurgeBarriers).filter_by(
-            Abbreviation=abbreviation).first()
+            return {"skipped_records": skipped_records}
 
-        if not barrier:
-            return {
+    def get_ingestion_watermark(self, abbreviation: str) -> Optional[tuple[date, str]]:
+        """Start date and time of the latest ingested closure event of a barrier, None if it has no closures yet."""
+        with self._session() as session:
+            return ingestion_watermark(session, abbreviation)
+
+    def bulk_upsert_closure_events(self, abbreviation: str, closure_data: Iterable[dict], chunk_size: int = BULK_INSERT_CHUNK_SIZE, incremental: bool = False) -> dict:
+        """Insert or update closure events in set-based chunks instead of one transaction per record.
+
+        The input may be any iterable (e.g. a generator), only one chunk is held in memory at a time.
+        A chunk the database rejects as a whole is retried row by row, so the skipped records report
+        matches the one from `insert_closure_events`. With `incremental` only the records starting at
+        or after the barrier's ingestion watermark are submitted."""
+        with self._session() as session:
+            # Identify the barrier ID based on the abbreviation
+            barrier_id = BARRIER_REGISTRY.barrier_id(session, abbreviation)
+
+            if not barrier_id:
+                raise ValueError(
+                    f"No barrier found with abbreviation: {abbreviation}")
+
+            skipped_records = []
+            closure_iter = iter(closure_data)
+            if incremental:
+                watermark = ingestion_watermark(session, abbreviation)
+                closure_iter = (closure for closure in closure_iter
+                                if at_or_after_watermark(closure, watermark))
+
+            while chunk := list(islice(closure_iter, chunk_size)):
+                rows, invalid_records = _prepare_closure_rows(barrier_id, chunk)
+                skipped_records.extend(invalid_records)
+                if not rows:
+                    continue
+
+                try:
+                    lock_barriers(session, [barrier_id])
+                    existing = existing_closure_results(session, barrier_id, rows)
+                    _upsert_closure_rows(session, rows)
+                    apply_closure_count_deltas(session, closure_count_deltas(barrier_id, rows, existing))
+                    session.commit()
+                except SQLAlchemyError:
+                    session.rollback()
+                    lock_barriers(session, [barrier_id])
+                    existing = existing_closure_results(session, barrier_id, rows)
+                    # Locate the offending records, keeping the valid ones of this chunk
+                    upserted_rows = []
+                    for row in rows:
+                        try:
+                            with session.begin_nested():
+                                _upsert_closure_rows(session, [row])
+                            upserted_rows.append(row)
+                        except SQLAlchemyError as e:
+                            record = {key: value for key, value in row.items()
+                                      if key != "BarrierID"}
+                            skipped_records.append({
+                                "record": jsonable_encoder(record),
+                                "error": str(e)
+                            })
+                    apply_closure_count_deltas(session, closure_count_deltas(barrier_id, upserted_rows, existing))
+                    session.commit()
+
+            refresh_ingestion_watermarks(session, [barrier_id])
+            session.commit()
+            RELIABILITY_CACHE.invalidate_barrier(abbreviation)
+
+            return {"skipped_records": skipped_records}
+
+    def reliability_counts(self, abbreviation: str, closure_type: Optional[str] = None,
+                           use_snapshot: bool = False) -> Optional[tuple[str, dict[str, int]]]:
+        """Barrier name and closure counts per result, None if the barrier does not exist.
+
+        With use_snapshot the counts come from the reliability snapshot row when there is one, the caller
+        decides whether the snapshot is fresh; otherwise (or without a row) from the closure counts."""
+        with self._session() as session:
+            if use_snapshot:
+                row = session.execute(snapshot_closure_counts_statement(abbreviation, closure_type)).first()
+                if row is not None:
+                    return row.Name, snapshot_closure_counts(row)
+            rows = session.execute(
+                barrier_closure_counts_statement(abbreviation)).all()
+        if not rows:
+            return None
+        return rows[0].Name, summarize_closure_counts(rows, closure_type)
+
+    def calculate_rule_of_three(self, abbreviation: str, closure_type: Optional[str] = None, rule_number: int = 3,
+                                use_snapshot: bool = False) -> dict:
+        cached, generation = RELIABILITY_CACHE.get(
+            abbreviation, ("rule_of_three", closure_type, rule_number))
+        if cached is not None:
+            return cached
+
+        found = self.reliability_counts(abbreviation, closure_type, use_snapshot)
+        if found is None:
+            response = {
                 "message": f"No barrier found with abbreviation: {abbreviation}"
             }
+        else:
+            name, counts = found
+            response = reliability_statistics.rule_of_three_response(
+                name, counts["SUCCESS"], closure_type, rule_number)
+
+        RELIABILITY_CACHE.set(
+            abbreviation, ("rule_of_three", closure_type, rule_number), response, generation)
+        return response
 
-        if closure_type:
-            successful_closures = session.query(data_model.StormSurgeBarrierClosureEvents).filter_by(
-                BarrierID=barrier.ID,
-                ClosureEventResult="SUCCESS",
-                ClosureEventType=closure_type
-            ).count()
+    def calculate_beta_distribution(self, abbreviation: str, closure_type: Optional[str] = None, prior_failure_rate: Optional[float] = None,
+                                    use_snapshot: bool = False) -> dict:
+        cached, generation = RELIABILITY_CACHE.get(
+            abbreviation, ("beta_distribution", closure_type, prior_failure_rate))
+        if cached is not None:
+            return cached
+
+        found = self.reliability_counts(abbreviation, closure_type, use_snapshot)
+        if found is None:
+            response = {
+                "message": f"No barrier found with abbreviation: {abbreviation}"
+            }
         else:
-            successful_closures = session.query(data_model.StormSurgeBarrierClosureEvents).filter_by(
-                BarrierID=barrier.ID,
-                ClosureEventResult="SUCCESS"
-            ).count()
+            name, counts = found
+            response = reliability_statistics.beta_distribution_response(
+                name, counts["SUCCESS"], counts["FAILURE"], closure_type, prior_failure_rate)
 
-        # Calculate p from rule_number
-        p = 1 - np.exp(-rule_number)
+        RELIABILITY_CACHE.set(
+            abbreviation, ("beta_distribution", closure_type, prior_failure_rate), response, generation)
+        return response
 
-        # Round p to the nearest decimal ending in .005
-        p_rounded = round(p * 200) / 200
+    def calculate_failure_rate_distribution(self, abbreviation: str, closure_type: Optional[str] = None,
+                                            prior_failure_rates: Sequence[Optional[float]] = (None,), samples: int = 100_000,
+                                            quantiles: Sequence[float] = reliability_statistics.DEFAULT_QUANTILES,
+                                            method: str = "posterior", seed: Optional[int] = None) -> dict:
+        """Sampled failure probability quantiles per prior, only seeded results are cached."""
+        params = ("failure_rate_distribution", closure_type, tuple(prior_failure_rates),
+                  samples, tuple(quantiles), method, seed)
+        cached, generation = RELIABILITY_CACHE.get(abbreviation, params)
+        if cached is not None:
+            return cached
 
-        # Determine confidence level based on rounded p
-        confidence_level = p_rounded * 100
+        with self._session() as session:
+            rows = session.execute(
+                barrier_closure_counts_statement(abbreviation)).all()
 
-        if successful_closures == 0:
+        if not rows:
             return {
-                "message": f"No successful closures found for barrier: {barrier.Name}. Using the rule of {rule_number}, is not applicable in this case.",
-                "failure_rate": "1 in ∞"
+                "message": f"No barrier found with abbreviation: {abbreviation}"
             }
 
-        failure_rate_upper_bound = rule_number / successful_closures
-        response = {
-            "barrier_name": barrier.Name,
-            "confidence_interval": f"{confidence_level:.2f}%",
-            "upper_bound": failure_rate_upper_bound,
-            "message": f"Based on {successful_closures} successful"
-        }
-        if closure_type:
-            response["message"] += f" {closure_type} closures"
-        else:
-            response["message"] += " closures."
-        response[
-            "message"] += f" for barrier: {barrier.Name}, the upper bound for the {confidence_level:.2f}% confidence interval is {failure_rate_upper_bound} (1 in {int(1/failure_rate_upper_bound)}) using the rule of {rule_number}."
+        counts = summarize_closure_counts(rows, closure_type)
+        response = reliability_statistics.failure_rate_distribution_response(
+            rows[0].Name, counts["SUCCESS"], counts["FAILURE"], closure_type,
+            prior_failure_rates, samples, quantiles, method, seed)
+
+        if seed is not None:
+            RELIABILITY_CACHE.set(abbreviation, params, response, generation)
         return response
 
-    def calculate_beta_distribution(self, abbreviation: str, closure_type: Optional[str] = None, prior_failure_rate: Optional[float] = None) -> dict:
-        a = 1
-        b = 1
+    def calculate_reliability_batch(self, abbreviations: Optional[Sequence[str]] = None,
+                                    closure_types: Sequence[Optional[str]] = (None,), rule_numbers: Sequence[float] = (3,),
+                                    prior_failure_rates: Sequence[Optional[float]] = (0.5,)) -> dict:
+        """Rule-of-three bounds and posterior mean failure rates of many barriers from one grouped counts query."""
+        with self._session() as session:
+            rows = session.execute(
+                barriers_closure_counts_statement(abbreviations)).all()
+
+        return reliability_batch_from_counts(rows, abbreviations, closure_types, rule_numbers, prior_failure_rates)
 
-        if prior_failure_rate:
-            total_prior = 1 / prior_failure_rate
-            a = 1
-            b = total_prior - a
+    def calculate_windowed_reliability(self, abbreviation: str, closure_type: Optional[str] = None, window_years: int = 5,
+                                       since: Optional[date] = None, prior_failure_rate: Optional[float] = 0.5,
+                                       rule_number: int = 3) -> dict:
+        """Reliability per year, per rolling window of window_years years and since a date, from one grouped query."""
+        params = ("windowed", closure_type, window_years, since, prior_failure_rate, rule_number)
+        cached, generation = RELIABILITY_CACHE.get(abbreviation, params)
+        if cached is not None:
+            return cached
 
-        session: Session = SessionFactory()
-        barrier = session.query(data_model.StormSurgeBarriers).filter_by(
-            Abbreviation=abbreviation).first()
+        with self._session() as session:
+            rows = session.execute(
+                closure_daily_counts_statement(abbreviation, closure_type)).all()
 
-        if not barrier:
+        if not rows:
             return {
                 "message": f"No barrier found with abbreviation: {abbreviation}"
             }
 
-        if closure_type:
-            successful_closures = session.query(data_model.StormSurgeBarrierClosureEvents).filter_by(
-                BarrierID=barrier.ID,
-                ClosureEventResult="SUCCESS",
-                ClosureEventType=closure_type
-            ).count()
-        else:
-            successful_closures = session.query(data_model.StormSurgeBarrierClosureEvents).filter_by(
-                BarrierID=barrier.ID,
-                ClosureEventResult="SUCCESS"
-            ).count()
-
-        unsuccessful_closures = session.query(data_model.StormSurgeBarrierClosureEvents).filter_by(
-            BarrierID=barrier.ID,
-            ClosureEventResult="FAILURE",
-            ClosureEventType=closure_type if closure_type else None
-        ).count()
-
-        a_posterior = a + unsuccessful_closures
-        b_posterior = b + successful_closures
-
-        # Calculate the expected failure rate
-        expected_failure_rate = a_posterior / (a_posterior + b_posterior)
-
-        response = {
-            "barrier_name": barrier.Name,
-            "prior_failure_rate": prior_failure_rate if prior_failure_rate else None,
-            "posterior_mean_failure_rate": expected_failure_rate,
-            "informative_prior": True if prior_failure_rate else False,
-            "message": f"For barrier: {barrier.Name}, using prior {prior_failure_rate} (1 in {int(1/prior_failure_rate)}) the posterior mean failure rate is approximately {expected_failure_rate:.6f} (1 in {int(1/expected_failure_rate)})"
-        }
-        if closure_type:
-            response["message"] += f" for {closure_type} closures."
-        else:
-            response["message"] += " based on all closures."
+        response = windowed_reliability_from_counts(
+            rows, closure_type, window_years, since, prior_failure_rate, rule_number)
+        RELIABILITY_CACHE.set(abbreviation, params, response, generation)
+        return response
+
+    def upsert_gate(self, abbreviation: str, name: str) -> dict:
+        """Add a gate to a barrier, an existing gate with the same name is returned as is."""
+        with self._session() as session:
+            barrier_id = BARRIER_REGISTRY.barrier_id(session, abbreviation)
+            if not barrier_id:
+                raise ValueError(
+                    f"No barrier found with abbreviation: {abbreviation}")
+
+            gate = session.query(data_model.IndividualStormSurgeBarrierGates).filter_by(
+                BarrierID=barrier_id, Name=name).first()
+            if gate is None:
+                gate = data_model.IndividualStormSurgeBarrierGates(
+                    BarrierID=barrier_id, Name=name)
+                session.add(gate)
+                session.commit()
+                RELIABILITY_CACHE.invalidate_barrier(abbreviation)
+            return gate.to_dict()
+
+    def get_gates(self, abbreviation: str) -> list[dict]:
+        """Retrieve the gates of a barrier."""
+        with self._session() as session:
+            barrier_id = BARRIER_REGISTRY.barrier_id(session, abbreviation)
+            if not barrier_id:
+                return []
+            return encode_rows(session.execute(gate_rows_statement(barrier_id)).all())
+
+    def get_gate_closures(self, abbreviation: str) -> list[dict]:
+        """Retrieve the gate closures of all gates of a barrier."""
+        with self._session() as session:
+            barrier_id = BARRIER_REGISTRY.barrier_id(session, abbreviation)
+            if not barrier_id:
+                return []
+            return encode_rows(session.execute(gate_closure_rows_statement(barrier_id)).all())
+
+    def upsert_gate_closures(self, abbreviation: str, gate_closure_data: Iterable[dict], chunk_size: int = BULK_INSERT_CHUNK_SIZE) -> dict:
+        """Insert or update gate closures in set-based chunks, like bulk_upsert_closure_events.
+
+        Each record names its gate (GateName) and its barrier closure (BarrierClosureID, or the StartDate
+        and StartTime of the barrier closure), with the gate's EndDate and ClosureResult (default SUCCESS)."""
+        with self._session() as session:
+            barrier_id = BARRIER_REGISTRY.barrier_id(session, abbreviation)
+            if not barrier_id:
+                raise ValueError(
+                    f"No barrier found with abbreviation: {abbreviation}")
+
+            gates = data_model.IndividualStormSurgeBarrierGates
+            gate_ids = dict(session.execute(
+                select(gates.Name, gates.ID).where(gates.BarrierID == barrier_id)).all())
+            table = data_model.IndividualGateClosures.__table__
+            skipped_records = []
+            gate_closure_iter = iter(gate_closure_data)
 
+            while chunk := list(islice(gate_closure_iter, chunk_size)):
+                rows, invalid_records = _prepare_gate_closure_rows(
+                    session, barrier_id, gate_ids, chunk)
+                skipped_records.extend(invalid_records)
+                if not rows:
+                    continue
+
+                try:
+                    _upsert_rows(session, table, GATE_CLOSURE_KEY, rows)
+                    session.commit()
+                except SQLAlchemyError:
+                    session.rollback()
+                    for row in rows:
+                        try:
+                            with session.begin_nested():
+                                _upsert_rows(session, table, GATE_CLOSURE_KEY, [row])
+                        except SQLAlchemyError as e:
+                            skipped_records.append({
+                                "record": jsonable_encoder(row),
+                                "error": str(e)
+                            })
+                    session.commit()
+
+            RELIABILITY_CACHE.invalidate_barrier(abbreviation)
+            return {"skipped_records": skipped_records}
+
+    def calculate_gate_reliability(self, abbreviation: str, prior_failure_rate: Optional[float] = 0.5,
+                                   rule_number: int = 3, required_gates: Optional[int] = None) -> dict:
+        """Per-gate failure rates and the k-out-of-n system failure probability, from one grouped counts query."""
+        params = ("gate_reliability", prior_failure_rate, rule_number, required_gates)
+        cached, generation = RELIABILITY_CACHE.get(abbreviation, params)
+        if cached is not None:
+            return cached
+
+        with self._session() as session:
+            rows = session.execute(
+                gate_closure_counts_statement(abbreviation)).all()
+
+        if not rows:
+            return {
+                "message": f"No barrier found with abbreviation: {abbreviation}"
+            }
+
+        response = gate_reliability_from_counts(
+            rows, prior_failure_rate, rule_number, required_gates)
+        RELIABILITY_CACHE.set(abbreviation, params, response, generation)
         return response
+
+    def update_reliability_snapshots(self, abbreviations: Optional[Sequence[str]] = None) -> int:
+        """Recompute and commit the reliability snapshot of the given barriers, all barriers if None."""
+        with self._session() as session:
+            written = refresh_reliability_snapshots(session, abbreviations)
+            session.commit()
+        return written
+
+    def get_reliability_snapshot(self, abbreviation: Optional[str] = None) -> dict:
+        """Precomputed statistics of all barriers (or one) with their computation time, from one indexed query."""
+        with self._session() as session:
+            rows = session.execute(
+                reliability_snapshot_statement(abbreviation)).all()
+        return reliability_snapshot_response(rows)
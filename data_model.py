@@ -1,6 +1,8 @@
-from datetime import date
+from datetime import date, datetime
+from functools import lru_cache
+from typing import Optional
 
-from sqlalchemy import ForeignKey, Integer, Enum
+from sqlalchemy import DateTime, ForeignKey, Index, Integer, Enum, UniqueConstraint
 from enums.closure_event_result import ClosureEventResult
 from enums.closure_event_type import ClosureEventType
 from sqlalchemy.ext.hybrid import HybridExtensionType
@@ -14,8 +16,9 @@ class Base(DeclarativeBase):
         return {c: getattr(self, c) for c in get_columns(self.__class__)}
 
 
-def get_columns(model):
-    """Returns all the columns of the model class."""
+@lru_cache(maxsize=None)
+def get_columns(model) -> tuple[str, ...]:
+    """Returns all the columns of the model class, computed once per class."""
     columns = [c.key for c in class_mapper(model).columns]
     hybrid_columns = [
         c.__name__
@@ -23,11 +26,17 @@ def get_columns(model):
         if c.extension_type == HybridExtensionType.HYBRID_PROPERTY
     ]
 
-    return columns + hybrid_columns
+    return tuple(columns + hybrid_columns)
 
 
+# Relationships load lazily, queries that need related rows ask for them with selectinload.
+# List endpoints select columns only (see data_handler), to_dict does not use relationships.
 class StormSurgeBarriers(Base):
     __tablename__ = 'StormSurgeBarriers'
+    # Every handler looks barriers up by abbreviation
+    __table_args__ = (
+        UniqueConstraint('Abbreviation', name='uq_barrier_abbreviation'),
+    )
     ID: Mapped[int] = mapped_column(primary_key=True)
     Name: Mapped[str]
     Abbreviation: Mapped[str]
@@ -36,12 +45,21 @@ class StormSurgeBarriers(Base):
     GateConfiguration: Mapped[str]
     GateType: Mapped[str]
 
-    closures: Mapped["StormSurgeBarrierClosureEvents"] = relationship(
-        "StormSurgeBarrierClosureEvents", lazy="joined")
+    closures: Mapped[list["StormSurgeBarrierClosureEvents"]] = relationship(
+        back_populates="barrier")
 
 
 class StormSurgeBarrierClosureEvents(Base):
     __tablename__ = 'StormSurgeBarrierClosureEvents'
+    # A closure event is identified by its barrier and start moment; the bulk
+    # upsert path relies on this constraint for ON CONFLICT deduplication.
+    # The constraint's index also serves the duplicate check of single inserts, the index the counts per result and type.
+    __table_args__ = (
+        UniqueConstraint('BarrierID', 'StartDate', 'StartTime',
+                         name='uq_closure_event_barrier_start'),
+        Index('ix_closure_event_barrier_result_type',
+              'BarrierID', 'ClosureEventResult', 'ClosureEventType'),
+    )
     ID: Mapped[int] = mapped_column(primary_key=True)
     BarrierID: Mapped[int] = mapped_column(
         Integer, ForeignKey('StormSurgeBarriers.ID'))
@@ -56,22 +74,69 @@ class StormSurgeBarrierClosureEvents(Base):
         Enum(ClosureEventResult), nullable=False)  # Using the Enum class
 
     barrier: Mapped["StormSurgeBarriers"] = relationship(
-        "StormSurgeBarriers", lazy="joined")
+        back_populates="closures")
+
+
+class StormSurgeBarrierClosureCounts(Base):
+    # Number of closure events per barrier, event type and result, updated by every closure write with the changed counts
+    __tablename__ = 'StormSurgeBarrierClosureCounts'
+    BarrierID: Mapped[int] = mapped_column(
+        Integer, ForeignKey('StormSurgeBarriers.ID'), primary_key=True)
+    ClosureEventType: Mapped[ClosureEventType] = mapped_column(
+        Enum(ClosureEventType), primary_key=True)
+    ClosureEventResult: Mapped[ClosureEventResult] = mapped_column(
+        Enum(ClosureEventResult), primary_key=True)
+    Count: Mapped[int]
+
+
+class IngestionWatermarks(Base):
+    # Start moment of the latest closure event per barrier, incremental ingestion only submits events from here on
+    __tablename__ = 'IngestionWatermarks'
+    BarrierID: Mapped[int] = mapped_column(
+        Integer, ForeignKey('StormSurgeBarriers.ID'), primary_key=True)
+    StartDate: Mapped[date]
+    StartTime: Mapped[str]
+    UpdatedAt: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+
+
+class ReliabilitySnapshots(Base):
+    # Precomputed rule-of-three bound and uniform-prior Beta posterior per barrier and event type ('ALL' totals all types),
+    # recomputed by the snapshot worker after closure writes
+    __tablename__ = 'ReliabilitySnapshots'
+    BarrierID: Mapped[int] = mapped_column(
+        Integer, ForeignKey('StormSurgeBarriers.ID'), primary_key=True)
+    ClosureEventType: Mapped[str] = mapped_column(primary_key=True)
+    SuccessfulClosures: Mapped[int]
+    UnsuccessfulClosures: Mapped[int]
+    RuleOfThreeUpperBound: Mapped[Optional[float]]
+    PosteriorAlpha: Mapped[float]
+    PosteriorBeta: Mapped[float]
+    PosteriorMeanFailureRate: Mapped[float]
+    ComputedAt: Mapped[datetime] = mapped_column(DateTime(timezone=True))
 
 
 class IndividualStormSurgeBarrierGates(Base):
     __tablename__ = 'IndividualStormSurgeBarrierGates'
+    # Gates are identified by their name within a barrier
+    __table_args__ = (
+        UniqueConstraint('BarrierID', 'Name', name='uq_gate_barrier_name'),
+    )
     ID: Mapped[int] = mapped_column(primary_key=True)
     Name: Mapped[str]
     BarrierID: Mapped[int] = mapped_column(
         Integer, ForeignKey('StormSurgeBarriers.ID'))
 
-    gate_closures: Mapped["IndividualGateClosures"] = relationship(
-        "IndividualGateClosures", lazy="joined")
+    gate_closures: Mapped[list["IndividualGateClosures"]] = relationship(
+        back_populates="gate")
 
 
 class IndividualGateClosures(Base):
     __tablename__ = 'IndividualGateClosures'
+    # One record per gate and barrier closure, the gate closure upsert relies on this constraint
+    __table_args__ = (
+        UniqueConstraint('GateID', 'BarrierClosureID',
+                         name='uq_gate_closure_gate_event'),
+    )
     ID: Mapped[int] = mapped_column(primary_key=True)
     GateID: Mapped[int] = mapped_column(Integer, ForeignKey(
         'IndividualStormSurgeBarrierGates.ID'))
@@ -82,4 +147,4 @@ class IndividualGateClosures(Base):
     ClosureResult: Mapped[str]
 
     gate: Mapped["IndividualStormSurgeBarrierGates"] = relationship(
-        "IndividualStormSurgeBarrierGates", lazy="joined")
+        back_populates="gate_closures")
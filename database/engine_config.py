@@ -1,7 +1,9 @@
 # database/engine_config.py
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, make_url
+from sqlalchemy.ext.asyncio import create_async_engine
 from dotenv import load_dotenv
 import os
+from .metrics import TimedAsyncAdaptedQueuePool, TimedQueuePool, instrument_engine
 
 # Load environment variables
 load_dotenv()
@@ -12,6 +14,51 @@ USER = os.getenv("USER")
 PASSWORD = os.getenv("PASSWORD")
 PORT = os.getenv("PORT")
 
-# Create Database connection
-DATABASE_URL = f"postgresql://{USER}:{PASSWORD}@{HOST}:{PORT}/stormSurgeBarrierClosureData"
-engine = create_engine(DATABASE_URL, echo=True)
+# Connection pool settings from .env
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in (
+    "1", "true", "yes")
+# Log every SQL statement (true) and also the result rows (debug), off by default
+_echo = os.getenv("DB_ECHO", "false").lower()
+DB_ECHO = "debug" if _echo == "debug" else _echo in ("1", "true", "yes")
+
+# Create Database connection, DATABASE_URL in the .env takes precedence over the credentials
+DATABASE_URL = os.getenv(
+    "DATABASE_URL",
+    f"postgresql://{USER}:{PASSWORD}@{HOST}:{PORT}/stormSurgeBarrierClosureData")
+engine = create_engine(
+    DATABASE_URL,
+    echo=DB_ECHO,
+    poolclass=TimedQueuePool,
+    pool_size=POOL_SIZE,
+    max_overflow=MAX_OVERFLOW,
+    pool_timeout=POOL_TIMEOUT,
+    pool_recycle=POOL_RECYCLE,
+    pool_pre_ping=POOL_PRE_PING,
+)
+
+# Async drivers used for the non-blocking API path, ASYNC_DATABASE_URL in the .env takes precedence
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+_url = make_url(DATABASE_URL)
+ASYNC_DATABASE_URL = os.getenv(
+    "ASYNC_DATABASE_URL",
+    _url.set(drivername=ASYNC_DRIVERS[_url.get_backend_name()]).render_as_string(hide_password=False))
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    echo=DB_ECHO,
+    poolclass=TimedAsyncAdaptedQueuePool,
+    pool_size=POOL_SIZE,
+    max_overflow=MAX_OVERFLOW,
+    pool_timeout=POOL_TIMEOUT,
+    pool_recycle=POOL_RECYCLE,
+    pool_pre_ping=POOL_PRE_PING,
+)
+# Statement counts, database time and pool waits for the /metrics endpoint of the API
+instrument_engine(engine, "sync")
+instrument_engine(async_engine, "async")
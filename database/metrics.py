@@ -0,0 +1,191 @@
+# database/metrics.py
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Callable, Optional, Sequence
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+# Histogram buckets, in seconds, bytes and statements
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000, 100_000_000)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# Every metric created, in order, rendered by render_metrics
+_REGISTRY: list = []
+
+
+def _label_text(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for value in values)
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(names, escaped)) + "}"
+
+
+@dataclass
+class Counter:
+    """Monotonic counter per label combination."""
+    name: str
+    description: str
+    label_names: tuple = ()
+    _values: dict = field(default_factory=dict, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+    metric_type = "counter"
+
+    def __post_init__(self):
+        _REGISTRY.append(self)
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def samples(self) -> list[tuple[str, tuple, float]]:
+        with self._lock:
+            return [(self.name, labels, value) for labels, value in self._values.items()]
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.metric_type}"]
+        for name, labels, value in self.samples():
+            lines.append(f"{name}{_label_text(self.label_names, labels)} {value}")
+        return lines
+
+
+@dataclass
+class Gauge(Counter):
+    """Value that goes up and down, or is read from a function when the metrics are rendered."""
+    _functions: dict = field(default_factory=dict, repr=False)
+    metric_type = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1.0):
+        self.inc(*labels, amount=-amount)
+
+    def set_function(self, function: Callable[[], float], *labels: str):
+        self._functions[labels] = function
+
+    def samples(self) -> list[tuple[str, tuple, float]]:
+        samples = super().samples()
+        return samples + [(self.name, labels, float(function())) for labels, function in self._functions.items()]
+
+
+@dataclass
+class Histogram(Counter):
+    """Cumulative bucket counts, sum and count of the observed values per label combination."""
+    buckets: tuple = LATENCY_BUCKETS
+    metric_type = "histogram"
+
+    def observe(self, value: float, *labels: str):
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def samples(self) -> list[tuple[str, tuple, float]]:
+        samples = []
+        with self._lock:
+            entries = [(labels, list(counts), total, count) for labels, (counts, total, count) in self._values.items()]
+        for labels, counts, total, count in entries:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                samples.append((f"{self.name}_bucket", labels + (str(float(bound)),), cumulative))
+            samples.append((f"{self.name}_bucket", labels + ("+Inf",), count))
+            samples.append((f"{self.name}_sum", labels, total))
+            samples.append((f"{self.name}_count", labels, count))
+        return samples
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.metric_type}"]
+        for name, labels, value in self.samples():
+            label_names = self.label_names + ("le",) if name.endswith("_bucket") else self.label_names
+            lines.append(f"{name}{_label_text(label_names, labels)} {value}")
+        return lines
+
+
+def render_metrics() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    return "\n".join(line for metric in _REGISTRY for line in metric.render()) + "\n"
+
+
+DB_QUERIES = Counter("db_queries_total", "SQL statements executed.", ("engine",))
+DB_QUERY_SECONDS = Histogram("db_query_duration_seconds", "Execution time of the SQL statements.",
+                             ("engine",), buckets=LATENCY_BUCKETS)
+DB_POOL_CHECKOUT_WAIT = Histogram("db_pool_checkout_wait_seconds",
+                                  "Time to get a connection from the pool, including opening a new one.",
+                                  ("engine",), buckets=LATENCY_BUCKETS)
+DB_POOL_CHECKED_OUT = Gauge("db_pool_checked_out", "Connections currently checked out of the pool.", ("engine",))
+
+
+@dataclass
+class QueryStats:
+    """Statements and database time of one request, collected by the engine hooks."""
+    queries: int = 0
+    seconds: float = 0.0
+
+
+_query_stats: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+def start_query_stats() -> QueryStats:
+    """Collect the statements of the current request (or task) in a new QueryStats."""
+    stats = QueryStats()
+    _query_stats.set(stats)
+    return stats
+
+
+def stop_query_stats():
+    _query_stats.set(None)
+
+
+class _TimedCheckout:
+    """Pool mixin recording how long each checkout waited (the pool has no event before a checkout)."""
+    metrics_label = "sync"
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_CHECKOUT_WAIT.observe(time.perf_counter() - start, self.metrics_label)
+
+
+class TimedQueuePool(_TimedCheckout, QueuePool):
+    pass
+
+
+class TimedAsyncAdaptedQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    metrics_label = "async"
+
+
+def instrument_engine(engine, label: str):
+    """Count the statements and database time of an engine, in total and for the current request."""
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def start_timer(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def record_query(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        DB_QUERIES.inc(label)
+        DB_QUERY_SECONDS.observe(elapsed, label)
+        stats = _query_stats.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.seconds += elapsed
+
+    @event.listens_for(sync_engine, "handle_error")
+    def discard_timer(exception_context):
+        starts = exception_context.connection.info.get("query_start") if exception_context.connection else None
+        if starts:
+            starts.pop()
+
+    DB_POOL_CHECKED_OUT.set_function(lambda: sync_engine.pool.checkedout(), label)
@@ -1,6 +1,49 @@
 # database/session_factory.py
-from sqlalchemy.orm import sessionmaker
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Iterator
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 # Adjust the import based on your folder structure
-from .engine_config import engine
+from .engine_config import async_engine, engine
 
 SessionFactory = sessionmaker(bind=engine)
+AsyncSessionFactory = async_sessionmaker(
+    bind=async_engine, expire_on_commit=False)
+
+
+@contextmanager
+def session_scope() -> Iterator[Session]:
+    """Provide a session that is rolled back on errors and always closed, returning its connection to the pool."""
+    session = SessionFactory()
+    try:
+        yield session
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def get_session() -> Iterator[Session]:
+    """FastAPI dependency yielding one session per request."""
+    with session_scope() as session:
+        yield session
+
+
+@asynccontextmanager
+async def async_session_scope() -> AsyncIterator[AsyncSession]:
+    """Async counterpart of session_scope, for use on the event loop."""
+    session = AsyncSessionFactory()
+    try:
+        yield session
+    except Exception:
+        await session.rollback()
+        raise
+    finally:
+        await session.close()
+
+
+async def get_async_session() -> AsyncIterator[AsyncSession]:
+    """FastAPI dependency yielding one async session per request."""
+    async with async_session_scope() as session:
+        yield session
@@ -0,0 +1,29 @@
+# database/threadpool.py
+from functools import partial
+from typing import Callable, Optional, TypeVar
+from anyio import CapacityLimiter, to_thread
+from dotenv import load_dotenv
+import os
+
+# Load environment variables
+load_dotenv()
+
+T = TypeVar("T")
+
+# Upper bound on the blocking calls the API runs next to the event loop at the same time
+THREADPOOL_SIZE = int(os.getenv("THREADPOOL_SIZE", "8"))
+
+_limiter: Optional[CapacityLimiter] = None
+
+
+def get_threadpool_limiter() -> CapacityLimiter:
+    """Return the shared limiter, created lazily because it has to be created inside the event loop."""
+    global _limiter
+    if _limiter is None:
+        _limiter = CapacityLimiter(THREADPOOL_SIZE)
+    return _limiter
+
+
+async def run_in_threadpool(func: Callable[..., T], *args, **kwargs) -> T:
+    """Run blocking work (CPU-bound encoding, sync-only code) in the bounded threadpool."""
+    return await to_thread.run_sync(partial(func, *args, **kwargs), limiter=get_threadpool_limiter())
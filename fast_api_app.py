@@ -1,28 +1,109 @@
 # main.py
-from fastapi import FastAPI, Request, Path, Query, HTTPException
-from typing import List
-from data_handler import StormSurgeBarrierDataHandler
-from fast_api_logger import log_request, log_response
-from pydantic_model import StormSurgeBarrierClosureEvents, StormSurgeBarriers
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, File, Request, Path, Query, HTTPException, UploadFile
+from fastapi.responses import Response, StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional, Union
+from async_data_handler import AsyncStormSurgeBarrierDataHandler
+from barrier_registry import BARRIER_REGISTRY
+from closure_export import EXPORT_FORMATS
+from data_handler import CLOSURE_PAGE_SIZE, MAX_CLOSURE_PAGE_SIZE
+from database.session_factory import async_session_scope, get_async_session
+from database.metrics import render_metrics
+from database.threadpool import run_in_threadpool
+from fast_api_metrics import MetricsMiddleware
+from fast_api_logger import configure_logging, log_request, log_response, shutdown_logging
+from ingest_data.parser_registry import get_parser
+from ingest_jobs import UPLOAD_JOBS, save_upload
+from reliability_cache import RELIABILITY_CACHE
+from reliability_snapshot_worker import RELIABILITY_SNAPSHOT_WORKER
+import reliability_statistics
+from pydantic_model import (ClosureEventBatch, IndividualGateClosures, IndividualStormSurgeBarrierGates,
+                            StormSurgeBarrierClosureEvents, StormSurgeBarrierClosureEventsPage, StormSurgeBarriers,
+                            TIME_PATTERN, normalize_time)
 from enums.closure_event_result import ClosureEventResult
 from enums.closure_event_type import ClosureEventType
 from datetime import date
 
-app = FastAPI()
-DATA_HANDLER = StormSurgeBarrierDataHandler()
-all_abbreviations = DATA_HANDLER.get_all_abbreviations()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    configure_logging()
+    # Barriers are resolved from memory afterwards, instead of one query per request
+    async with async_session_scope() as session:
+        await session.run_sync(BARRIER_REGISTRY.load)
+    RELIABILITY_SNAPSHOT_WORKER.start()
+    yield
+    await RELIABILITY_SNAPSHOT_WORKER.stop()
+    await run_in_threadpool(UPLOAD_JOBS.shutdown)
+    shutdown_logging()
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
+# Columns of the list responses, the fast JSON path selects exactly these instead of validating the rows
+BARRIER_RESPONSE_FIELDS = tuple(StormSurgeBarriers.__fields__)
+CLOSURE_RESPONSE_FIELDS = tuple(StormSurgeBarrierClosureEvents.__fields__)
+
+
+def get_data_handler(session: AsyncSession = Depends(get_async_session)) -> AsyncStormSurgeBarrierDataHandler:
+    """FastAPI dependency providing a non-blocking data handler bound to the request's session."""
+    return AsyncStormSurgeBarrierDataHandler(session=session)
 
 
 @app.get("/storm_surge_barrier/all/", response_model=list[StormSurgeBarriers])
-async def get_storm_surge_barriers(request: Request):
+async def get_storm_surge_barriers(request: Request, data_handler: AsyncStormSurgeBarrierDataHandler = Depends(get_data_handler)):
     await log_request(request)
-    return log_response(DATA_HANDLER.get_all_barriers())
+    content = await data_handler.get_barriers_json(BARRIER_RESPONSE_FIELDS)
+    return log_response(Response(content, media_type="application/json"))
 
 
 @app.get("/storm_surge_barrier/all/closures/", response_model=list[StormSurgeBarrierClosureEvents])
-async def get_barrier_closures(request: Request):
+async def get_barrier_closures(request: Request, data_handler: AsyncStormSurgeBarrierDataHandler = Depends(get_data_handler)):
     await log_request(request)
-    return log_response(DATA_HANDLER.get_all_closures())
+    content = await data_handler.get_closures_json(None, CLOSURE_RESPONSE_FIELDS)
+    return log_response(Response(content, media_type="application/json"))
+
+
+@app.get("/storm_surge_barrier/all/closures/page/", response_model=StormSurgeBarrierClosureEventsPage)
+async def get_barrier_closures_page(
+    after_id: Optional[int] = Query(
+        None, description="Cursor returned as next_cursor by the previous page"),
+    limit: int = Query(CLOSURE_PAGE_SIZE, ge=1, le=MAX_CLOSURE_PAGE_SIZE,
+                       description="Maximum number of closures on the page"),
+    data_handler: AsyncStormSurgeBarrierDataHandler = Depends(get_data_handler)
+):
+    return await data_handler.get_closures_page(None, after_id, limit)
+
+
+@app.get("/storm_surge_barrier/all/closures/stream/")
+async def stream_barrier_closures(data_handler: AsyncStormSurgeBarrierDataHandler = Depends(get_data_handler)):
+    return StreamingResponse(data_handler.stream_closures(), media_type="application/x-ndjson")
+
+
+@app.get("/storm_surge_barrier/all/closures/export/")
+async def export_barrier_closures(
+    format: str = Query("parquet", regex="^(arrow|parquet|csv)$",
+                        description="arrow (Arrow IPC stream), parquet or csv"),
+    abbreviation: Optional[List[str]] = Query(
+        None, description="Barrier abbreviation(s), all barriers if omitted"),
+    closure_type: Optional[List[ClosureEventType]] = Query(
+        None, description="Closure type(s), all types if omitted"),
+    start_date: Optional[date] = Query(
+        None, description="Only closures starting on or after this date"),
+    end_date: Optional[date] = Query(
+        None, description="Only closures starting on or before this date"),
+    data_handler: AsyncStormSurgeBarrierDataHandler = Depends(get_data_handler)
+):
+    if abbreviation:
+        missing = await data_handler.missing_abbreviations(abbreviation)
+        if missing:
+            raise HTTPException(status_code=404, detail=f"Barrier(s) not found: {', '.join(missing)}")
+    media_type, extension = EXPORT_FORMATS[format]
+    return StreamingResponse(
+        data_handler.export_closures(format, abbreviation, closure_type, start_date, end_date),
+        media_type=media_type, headers={"Content-Disposition": f'attachment; filename="closures.{extension}"'})
 
 
 @app.put("/storm_surge_barrier/add/")
@@ -34,7 +115,8 @@ async def upsert_storm_surge_barrier(
                                   description="Construction year of the barrier"),
     GateConfiguration: str = Query(...,
                                    description="Gate configuration of the barrier"),
-    GateType: str = Query(..., description="Type of the gate")
+    GateType: str = Query(..., description="Type of the gate"),
+    data_handler: AsyncStormSurgeBarrierDataHandler = Depends(get_data_handler)
 ):
     barrier_data = {
         "Name": Name,
@@ -44,13 +126,17 @@ async def upsert_storm_surge_barrier(
         "GateConfiguration": GateConfiguration,
         "GateType": GateType
     }
-    DATA_HANDLER.upsert_barrier(barrier_data)
+    await data_handler.upsert_barrier(barrier_data)
     return barrier_data
 
 
 @app.get("/storm_surge_barrier/closures/{abbreviation}/", response_model=list[StormSurgeBarrierClosureEvents])
-async def get_barrier_closures(abbreviation: str = Path(..., description="The abbreviation of the barrier")):
-    return DATA_HANDLER.get_closures_by_abbreviation(abbreviation)
+async def get_barrier_closures(
+    abbreviation: str = Path(..., description="The abbreviation of the barrier"),
+    data_handler: AsyncStormSurgeBarrierDataHandler = Depends(get_data_handler)
+):
+    content = await data_handler.get_closures_json(abbreviation, CLOSURE_RESPONSE_FIELDS)
+    return Response(content, media_type="application/json")
 
 
 @app.post("/storm_surge_barrier/add/closure/")
@@ -61,14 +147,14 @@ async def insert_single_closure_event(
     EndDate: date = Query(..., description="The end date of the event"),
     StartTime: str = Query(
         ...,
-        description="The start time of the event (in HH:MM format)",
-        regex="^(?:[01]\d|2[0-3]):[0-5]\d$",
+        description="The start time of the event (in HH:MM or HH:MM:SS format)",
+        regex=TIME_PATTERN,
         example="08:00"
     ),
     EndTime: str = Query(
         ...,
-        description="The end time of the event (in HH:MM format)",
-        regex="^(?:[01]\d|2[0-3]):[0-5]\d$",
+        description="The end time of the event (in HH:MM or HH:MM:SS format)",
+        regex=TIME_PATTERN,
         example="18:00"
     ),
     ClosureEventType: ClosureEventType = Query(
@@ -79,20 +165,21 @@ async def insert_single_closure_event(
     WaterLevel: float = Query(...,
                               description="The water level at the time of the event"),
     abbreviation: str = Query(...,
-                              description="The abbreviation of the barrier")
+                              description="The abbreviation of the barrier"),
+    data_handler: AsyncStormSurgeBarrierDataHandler = Depends(get_data_handler)
 ):
     await log_request(request)
     closure = {
         "StartDate": StartDate,
         "EndDate": EndDate,
-        "StartTime": StartTime,
-        "EndTime": EndTime,
+        "StartTime": normalize_time(StartTime),
+        "EndTime": normalize_time(EndTime),
         "ClosureEventType": ClosureEventType,
         "ClosureEventResult": ClosureEventResult,
         "BarrierID": BarrierID,
         "WaterLevel": WaterLevel
     }
-    response = DATA_HANDLER.insert_single_closure_event(abbreviation, closure)
+    response = await data_handler.insert_single_closure_event(abbreviation, closure)
 
     if response[1] != 201:
         raise HTTPException(
@@ -102,16 +189,238 @@ async def insert_single_closure_event(
 
 
 @app.post("/storm_surge_barrier/add/closures/{abbreviation}/")
-async def insert_closure_events_endpoint(abbreviation: str, closure_data: List[dict]):
-    result = DATA_HANDLER.insert_closure_events(abbreviation, closure_data)
+async def insert_closure_events_endpoint(
+    abbreviation: str,
+    closure_data: Union[ClosureEventBatch, List[dict]],
+    bulk: bool = Query(
+        False, description="Upsert the records in set-based chunks instead of one transaction per record"),
+    incremental: bool = Query(
+        False, description="Skip records starting before the barrier's ingestion watermark"),
+    data_handler: AsyncStormSurgeBarrierDataHandler = Depends(get_data_handler)
+):
+    if not isinstance(closure_data, ClosureEventBatch):
+        try:
+            closure_data = ClosureEventBatch(records=closure_data)
+        except ValidationError as e:
+            raise HTTPException(status_code=422, detail=[
+                {**error, "loc": ("body", *error["loc"])} for error in e.errors()])
+    # Invalid records are reported without touching the database
+    rows, invalid_records = await run_in_threadpool(closure_data.validated_rows)
+    if bulk:
+        result = await data_handler.bulk_upsert_closure_events(abbreviation, rows, incremental=incremental)
+    else:
+        result = await data_handler.insert_closure_events(abbreviation, rows, incremental=incremental)
+    result["skipped_records"] = invalid_records + result["skipped_records"]
     return result
 
 
+@app.post("/storm_surge_barrier/upload/closures/{abbreviation}/", status_code=202)
+async def upload_closure_file(
+    abbreviation: str = Path(..., description="The abbreviation of the barrier"),
+    file: UploadFile = File(..., description="Workbook (.xlsx, .xls) or CSV file in the barrier's spreadsheet format"),
+    sheet_name: Optional[List[str]] = Query(
+        None, description="Sheet(s) to read, all sheets of a workbook if omitted"),
+    incremental: bool = Query(
+        False, description="Only submit the closure events starting at or after the barrier's ingestion watermark"),
+    data_handler: AsyncStormSurgeBarrierDataHandler = Depends(get_data_handler)
+):
+    if await data_handler.missing_abbreviations([abbreviation]):
+        raise HTTPException(status_code=404, detail=f"No barrier found with abbreviation: {abbreviation}")
+    try:
+        get_parser(abbreviation)
+        path = await run_in_threadpool(save_upload, file.file, file.filename or "")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    job = UPLOAD_JOBS.submit(abbreviation, file.filename, path, sheet_name, incremental)
+    return job.status()
+
+
+@app.get("/storm_surge_barrier/upload/jobs/{job_id}/")
+async def get_upload_job(job_id: str):
+    job = UPLOAD_JOBS.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"No upload job found with ID: {job_id}")
+    return job.status()
+
+
 @app.get("/storm_surge_barrier/closures/rule_of_three/{abbreviation}/")
-async def get_rule_of_three(abbreviation: str, closure_type: ClosureEventType = None, rule_number: int = 3):
-    return DATA_HANDLER.calculate_rule_of_three(abbreviation, closure_type, rule_number)
+async def get_rule_of_three(abbreviation: str, closure_type: ClosureEventType = None, rule_number: int = 3, data_handler: AsyncStormSurgeBarrierDataHandler = Depends(get_data_handler)):
+    # Served from the reliability snapshot unless a refresh of the barrier is queued or running
+    return await data_handler.calculate_rule_of_three(
+        abbreviation, closure_type, rule_number, use_snapshot=not RELIABILITY_SNAPSHOT_WORKER.is_pending(abbreviation))
 
 
 @app.get("/storm_surge_barrier/closures/failure_rate_update/{abbreviation}/")
-async def get_beta_distribution(abbreviation: str, closure_type: ClosureEventType = None, prior_failure_rate: float = 0.5):
-    return DATA_HANDLER.calculate_beta_distribution(abbreviation, closure_type, prior_failure_rate)
+async def get_beta_distribution(abbreviation: str, closure_type: ClosureEventType = None, prior_failure_rate: float = 0.5, data_handler: AsyncStormSurgeBarrierDataHandler = Depends(get_data_handler)):
+    return await data_handler.calculate_beta_distribution(
+        abbreviation, closure_type, prior_failure_rate, use_snapshot=not RELIABILITY_SNAPSHOT_WORKER.is_pending(abbreviation))
+
+
+@app.get("/storm_surge_barrier/closures/failure_rate_distribution/{abbreviation}/")
+async def get_failure_rate_distribution(
+    abbreviation: str,
+    closure_type: ClosureEventType = None,
+    prior_failure_rate: Optional[List[float]] = Query(
+        None, gt=0, lt=1, description="Prior failure rate(s) below 1, repeat to compare priors, a uniform prior if omitted"),
+    samples: int = Query(100_000, ge=100, le=reliability_statistics.MAX_MONTE_CARLO_SAMPLES,
+                         description="Monte Carlo samples per prior"),
+    quantiles: Optional[List[float]] = Query(
+        None, ge=0, le=1, description="Quantiles to return, by default 0.025, 0.05, 0.5, 0.95 and 0.975"),
+    method: str = Query("posterior", regex="^(posterior|bootstrap)$",
+                        description="Sample the Beta posterior or bootstrap the observed closures"),
+    seed: Optional[int] = Query(
+        None, description="Seed for reproducible (and cached) results"),
+    data_handler: AsyncStormSurgeBarrierDataHandler = Depends(get_data_handler)
+):
+    return await data_handler.calculate_failure_rate_distribution(
+        abbreviation, closure_type, prior_failure_rate or [None], samples,
+        quantiles or reliability_statistics.DEFAULT_QUANTILES, method, seed)
+
+
+@app.get("/storm_surge_barrier/closures/reliability/batch/")
+async def get_reliability_batch(
+    abbreviation: Optional[List[str]] = Query(
+        None, description="Barrier abbreviation(s), all barriers if omitted"),
+    closure_type: Optional[List[ClosureEventType]] = Query(
+        None, description="Closure type(s), all types together if omitted"),
+    rule_number: List[float] = Query(
+        [3], gt=0, description="Rule number(s) for the rule-of-three bound"),
+    prior_failure_rate: List[float] = Query(
+        [0.5], gt=0, le=1, description="Prior failure rate(s) for the posterior mean"),
+    data_handler: AsyncStormSurgeBarrierDataHandler = Depends(get_data_handler)
+):
+    return await data_handler.calculate_reliability_batch(
+        abbreviation, closure_type or [None], rule_number, prior_failure_rate)
+
+
+@app.get("/storm_surge_barrier/closures/reliability/windows/{abbreviation}/")
+async def get_windowed_reliability(
+    abbreviation: str,
+    closure_type: ClosureEventType = None,
+    window_years: int = Query(
+        5, ge=1, le=100, description="Length of the rolling windows in years"),
+    since: Optional[date] = Query(
+        None, description="Also compute the statistics since this date, e.g. the last maintenance"),
+    prior_failure_rate: float = Query(0.5, gt=0, le=1),
+    rule_number: int = Query(3, gt=0),
+    data_handler: AsyncStormSurgeBarrierDataHandler = Depends(get_data_handler)
+):
+    return await data_handler.calculate_windowed_reliability(
+        abbreviation, closure_type, window_years, since, prior_failure_rate, rule_number)
+
+
+# Registered after the fixed-prefix closure routes above, so e.g. rule_of_three/page/ is not read as a page request
+@app.get("/storm_surge_barrier/closures/{abbreviation}/page/", response_model=StormSurgeBarrierClosureEventsPage)
+async def get_barrier_closures_page_by_abbreviation(
+    abbreviation: str = Path(..., description="The abbreviation of the barrier"),
+    after_id: Optional[int] = Query(
+        None, description="Cursor returned as next_cursor by the previous page"),
+    limit: int = Query(CLOSURE_PAGE_SIZE, ge=1, le=MAX_CLOSURE_PAGE_SIZE,
+                       description="Maximum number of closures on the page"),
+    data_handler: AsyncStormSurgeBarrierDataHandler = Depends(get_data_handler)
+):
+    return await data_handler.get_closures_page(abbreviation, after_id, limit)
+
+
+@app.get("/storm_surge_barrier/closures/{abbreviation}/stream/")
+async def stream_barrier_closures_by_abbreviation(
+    abbreviation: str = Path(..., description="The abbreviation of the barrier"),
+    data_handler: AsyncStormSurgeBarrierDataHandler = Depends(get_data_handler)
+):
+    return StreamingResponse(data_handler.stream_closures(abbreviation), media_type="application/x-ndjson")
+
+
+@app.get("/storm_surge_barrier/closures/{abbreviation}/watermark/")
+async def get_ingestion_watermark(abbreviation: str, data_handler: AsyncStormSurgeBarrierDataHandler = Depends(get_data_handler)):
+    watermark = await data_handler.get_ingestion_watermark(abbreviation)
+    if watermark is None:
+        return {"StartDate": None, "StartTime": None}
+    return {"StartDate": watermark[0], "StartTime": watermark[1]}
+
+
+@app.put("/storm_surge_barrier/add/gate/{abbreviation}/", response_model=IndividualStormSurgeBarrierGates)
+async def upsert_gate(
+    abbreviation: str = Path(..., description="The abbreviation of the barrier"),
+    Name: str = Query(..., description="Name of the gate"),
+    data_handler: AsyncStormSurgeBarrierDataHandler = Depends(get_data_handler)
+):
+    try:
+        return await data_handler.upsert_gate(abbreviation, Name)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@app.get("/storm_surge_barrier/gates/{abbreviation}/", response_model=list[IndividualStormSurgeBarrierGates])
+async def get_gates(
+    abbreviation: str = Path(..., description="The abbreviation of the barrier"),
+    data_handler: AsyncStormSurgeBarrierDataHandler = Depends(get_data_handler)
+):
+    return await data_handler.get_gates(abbreviation)
+
+
+@app.post("/storm_surge_barrier/add/gate_closures/{abbreviation}/")
+async def upsert_gate_closures(
+    abbreviation: str,
+    gate_closure_data: List[dict],
+    data_handler: AsyncStormSurgeBarrierDataHandler = Depends(get_data_handler)
+):
+    try:
+        return await data_handler.upsert_gate_closures(abbreviation, gate_closure_data)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@app.get("/storm_surge_barrier/gate_closures/{abbreviation}/", response_model=list[IndividualGateClosures])
+async def get_gate_closures(
+    abbreviation: str = Path(..., description="The abbreviation of the barrier"),
+    data_handler: AsyncStormSurgeBarrierDataHandler = Depends(get_data_handler)
+):
+    return await data_handler.get_gate_closures(abbreviation)
+
+
+@app.get("/storm_surge_barrier/gates/reliability/{abbreviation}/")
+async def get_gate_reliability(
+    abbreviation: str,
+    prior_failure_rate: float = Query(0.5, gt=0, le=1),
+    rule_number: int = Query(3, gt=0),
+    required_gates: Optional[int] = Query(
+        None, ge=1, description="Gates that must close (k of k-out-of-n), taken from the barrier's GateConfiguration if omitted"),
+    data_handler: AsyncStormSurgeBarrierDataHandler = Depends(get_data_handler)
+):
+    try:
+        return await data_handler.calculate_gate_reliability(abbreviation, prior_failure_rate, rule_number, required_gates)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+
+@app.get("/storm_surge_barrier/reliability/snapshot/")
+async def get_reliability_snapshot(data_handler: AsyncStormSurgeBarrierDataHandler = Depends(get_data_handler)):
+    snapshot = await data_handler.get_reliability_snapshot()
+    snapshot["refresh_pending"] = RELIABILITY_SNAPSHOT_WORKER.is_pending()
+    return snapshot
+
+
+@app.get("/storm_surge_barrier/reliability/snapshot/{abbreviation}/")
+async def get_barrier_reliability_snapshot(
+    abbreviation: str = Path(..., description="The abbreviation of the barrier"),
+    data_handler: AsyncStormSurgeBarrierDataHandler = Depends(get_data_handler)
+):
+    snapshot = await data_handler.get_reliability_snapshot(abbreviation)
+    snapshot["refresh_pending"] = RELIABILITY_SNAPSHOT_WORKER.is_pending(abbreviation)
+    return snapshot
+
+
+@app.get("/storm_surge_barrier/reliability/snapshot/worker/stats/")
+async def get_reliability_snapshot_worker_stats():
+    return RELIABILITY_SNAPSHOT_WORKER.stats()
+
+
+@app.get("/storm_surge_barrier/cache/stats/")
+async def get_reliability_cache_stats():
+    return RELIABILITY_CACHE.stats()
+
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Request, database and pool metrics in the Prometheus text format."""
+    return Response(render_metrics(), media_type="text/plain; version=0.0.4")
@@ -1,16 +1,138 @@
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
 import logging
+import os
+import queue
+import random
 
+import orjson
 from fastapi import Request
 
+from database.metrics import Counter
+
+# Load environment variables
+load_dotenv()
+
+# Share of requests that are logged, between 0 (none) and 1 (all)
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1"))
+# Bytes of the request body included in a request record
+LOG_BODY_PREVIEW_BYTES = int(os.getenv("LOG_BODY_PREVIEW_BYTES", "256"))
+# Records waiting for the writer thread, further records are dropped (and counted) instead of blocking a request
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# Request headers included in a request record, the others are left out
+LOGGED_HEADERS = ("content-type", "content-length", "user-agent")
+
+logger = logging.getLogger("storm_surge_barrier.api")
+# Whether the current request was sampled, so its request and response records are logged together
+_sampled: ContextVar[Optional[bool]] = ContextVar("log_sampled", default=None)
+_listener: Optional[QueueListener] = None
+
+LOG_RECORDS_DROPPED = Counter("log_records_dropped_total", "Log records dropped because the log queue was full.")
+
+
+class StructuredFormatter(logging.Formatter):
+    """One JSON object per record with the message and the record's `fields` (passed through `extra`)."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            **getattr(record, "fields", {}),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return orjson.dumps(entry, default=str).decode()
+
+
+class DroppingQueueHandler(QueueHandler):
+    """Queue handler that never blocks or formats on the calling thread.
+
+    Records are enqueued as they are and formatted by the listener thread. When the queue is full the record
+    is dropped and counted in LOG_RECORDS_DROPPED, logging must not slow down or fail a request."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
+
+
+def configure_logging(handler: Optional[logging.Handler] = None):
+    """Send the API log records through a bounded queue to a writer thread, called from the FastAPI lifespan.
+
+    The records are written by `handler`, a structured stream handler on stderr by default."""
+    global _listener
+    if _listener is not None:
+        return
+    if handler is None:
+        handler = logging.StreamHandler()
+        handler.setFormatter(StructuredFormatter())
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    logger.handlers = [DroppingQueueHandler(log_queue)]
+    logger.setLevel(LOG_LEVEL)
+    logger.propagate = False
+    _listener = QueueListener(log_queue, handler, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown_logging():
+    """Write the queued records and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def _sample() -> bool:
+    sampled = random.random() < LOG_SAMPLE_RATE
+    _sampled.set(sampled)
+    return sampled
+
+
+def _is_sampled() -> bool:
+    sampled = _sampled.get()
+    return _sample() if sampled is None else sampled
+
+
+def _body_preview(body: bytes) -> str:
+    return body[:LOG_BODY_PREVIEW_BYTES].decode("utf-8", errors="replace")
+
 
 async def log_request(request: Request):
-    """Function for logging incoming requests"""
-    logging.info("Request: %s - %s", request.method, request.url)
-    logging.info("Request headers: %s", request.headers)
-    logging.info("Request content: %s", await request.body())
+    """Log a sampled request with a few headers and a size-capped preview of the body."""
+    if not _sample() or not logger.isEnabledFor(logging.INFO):
+        return
+    body = await request.body()
+    logger.info("Request: %s %s", request.method, request.url.path, extra={"fields": {
+        "method": request.method,
+        "path": request.url.path,
+        "query": request.url.query,
+        "headers": {name: request.headers[name] for name in LOGGED_HEADERS if name in request.headers},
+        "body_bytes": len(body),
+        "body_preview": _body_preview(body),
+    }})
 
 
 def log_response(response):
-    """Function for logging responses (JSON serializable python objects)."""
-    logging.info("Response: %s", response)
+    """Log a summary of the response of a sampled request (status, type and size, never the content) and return it."""
+    if logger.isEnabledFor(logging.INFO) and _is_sampled():
+        fields = {
+            "status_code": getattr(response, "status_code", 200),
+            "type": getattr(response, "media_type", None) or type(response).__name__,
+        }
+        body = getattr(response, "body", None)
+        if body is not None:
+            fields["body_bytes"] = len(body)
+        elif hasattr(response, "__len__"):
+            fields["items"] = len(response)
+        logger.info("Response: %s", fields["status_code"], extra={"fields": fields})
     return response
@@ -0,0 +1,82 @@
+from dotenv import load_dotenv
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+import os
+import time
+
+from database.metrics import (COUNT_BUCKETS, LATENCY_BUCKETS, SIZE_BUCKETS, Gauge, Histogram, start_query_stats,
+                              stop_query_stats)
+
+# Load environment variables
+load_dotenv()
+
+# Add a Server-Timing header with the handler and database time to every response
+METRICS_TIMING_HEADER = os.getenv("METRICS_TIMING_HEADER", "false").lower() in (
+    "1", "true", "yes")
+# Route label of requests that match no route, so unknown paths do not create new series
+UNMATCHED_ROUTE = "unmatched"
+
+REQUEST_SECONDS = Histogram("http_request_duration_seconds", "Time from receiving a request to the end of its response.",
+                            ("method", "route", "status"), buckets=LATENCY_BUCKETS)
+RESPONSE_BYTES = Histogram("http_response_size_bytes", "Size of the response bodies.",
+                           ("method", "route"), buckets=SIZE_BUCKETS)
+REQUEST_QUERIES = Histogram("http_request_db_queries", "SQL statements executed per request.",
+                            ("method", "route"), buckets=COUNT_BUCKETS)
+REQUEST_DB_SECONDS = Histogram("http_request_db_duration_seconds", "Time spent executing SQL statements per request.",
+                               ("method", "route"), buckets=LATENCY_BUCKETS)
+REQUESTS_IN_FLIGHT = Gauge("http_requests_in_flight", "Requests being handled.")
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency, response size and database use per route template.
+
+    Plain ASGI instead of BaseHTTPMiddleware, so streamed responses are neither buffered nor cut off."""
+
+    def __init__(self, app: ASGIApp, timing_header: bool = METRICS_TIMING_HEADER):
+        self.app = app
+        self.timing_header = timing_header
+        self._routes = None
+
+    def _route(self, scope: Scope) -> str:
+        """Path template of the matched route, the router leaves the endpoint in the scope."""
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return UNMATCHED_ROUTE
+        if self._routes is None:
+            self._routes = {route.endpoint: route.path for route in scope["app"].routes if hasattr(route, "endpoint")}
+        return self._routes.get(endpoint, UNMATCHED_ROUTE)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        stats = start_query_stats()
+        status = 500
+        size = 0
+
+        async def send_with_metrics(message: Message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.timing_header:
+                    MutableHeaders(scope=message).append("Server-Timing", (
+                        f"app;dur={(time.perf_counter() - start) * 1000:.1f}, "
+                        f'db;dur={stats.seconds * 1000:.1f};desc="{stats.queries} queries"'))
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+            stop_query_stats()
+            method = scope["method"]
+            route = self._route(scope)
+            REQUEST_SECONDS.observe(time.perf_counter() - start, method, route, str(status))
+            RESPONSE_BYTES.observe(size, method, route)
+            REQUEST_QUERIES.observe(stats.queries, method, route)
+            REQUEST_DB_SECONDS.observe(stats.seconds, method, route)
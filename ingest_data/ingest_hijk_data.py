@@ -1,21 +1,39 @@
 import numpy as np
 import math
 import pandas as pd
-from datetime import datetime
+from datetime import date, datetime
+from typing import Optional
 from ingest_data.io_operations import read_excel_data, write_to_json
+from ingest_data.parser_registry import ClosureSheetParser, register_parser
 
 
-class ingestCSVhijk:
-    def __init__(self, sheet: str):
-        self.sheet = sheet
+def replace_in_strings(column: pd.Series, old: str, new: str) -> pd.Series:
+    """Vectorized literal replacement on the string values of a column, other values (dates, numbers, NaN) are kept."""
+    if pd.api.types.infer_dtype(column, skipna=True) == 'string':
+        return column.str.replace(old, new, regex=False)
+    is_string = np.fromiter((isinstance(value, str)
+                            for value in column), dtype=bool, count=len(column))
+    if not is_string.any():
+        return column
+    column = column.copy()
+    column[is_string] = column[is_string].str.replace(old, new, regex=False)
+    return column
+
+
+@register_parser("HIJK")
+class ingestCSVhijk(ClosureSheetParser):
+    def __init__(self, sheet: pd.DataFrame):
+        super().__init__(sheet)
         self.barrier_abbreviation = "HIJK"  # Set the abbreviation directly
-        self.closure_record = []
+
+    def create_records(self, watermark: Optional[tuple[date, str]] = None):
+        return self.create_hijk_records(watermark)
 
     def prepare_time_string(self):
-        self.sheet.START = self.sheet['START'].replace(" ", "", regex=True)
-        self.sheet.START = self.sheet['START'].replace("h", ":", regex=True)
-        self.sheet.END = self.sheet['END'].replace(" ", "", regex=True)
-        self.sheet.END = self.sheet['END'].replace("h", ":", regex=True)
+        self.sheet.START = replace_in_strings(self.sheet['START'], " ", "")
+        self.sheet.START = replace_in_strings(self.sheet['START'], "h", ":")
+        self.sheet.END = replace_in_strings(self.sheet['END'], " ", "")
+        self.sheet.END = replace_in_strings(self.sheet['END'], "h", ":")
 
     def handle_time_inputs(self, timestr):
         if timestr == '24:00':
@@ -37,13 +55,13 @@ class ingestCSVhijk:
             return str(time)
 
     def prepare_date_string(self):
-        self.sheet.DATE = self.sheet['DATE'].replace("`", "", regex=True)
+        self.sheet.DATE = replace_in_strings(self.sheet['DATE'], "`", "")
 
     def prepare_waterlevel_string(self):
-        self.sheet.WATERLEVEL = self.sheet['WATERLEVEL'].replace(
-            " ", "", regex=True)
-        self.sheet.WATERLEVEL = self.sheet['WATERLEVEL'].replace(
-            ",", ".", regex=True)
+        self.sheet.WATERLEVEL = replace_in_strings(
+            self.sheet['WATERLEVEL'], " ", "")
+        self.sheet.WATERLEVEL = replace_in_strings(
+            self.sheet['WATERLEVEL'], ",", ".")
 
     def set_type(self):
         TYPE = self.sheet['TYPE']
@@ -64,6 +82,74 @@ class ingestCSVhijk:
         self.set_type()
         return
 
+    def clean_time_column(self, times: pd.Series) -> pd.Series:
+        """Vectorized version of handle_time_inputs for a whole column."""
+        text = times.astype(str)
+        text = text.mask(text == '24:00', '00:00')
+        has_oo = text.str.contains('oo', regex=False)
+        text = text.where(has_oo, text.str.replace('.', '', regex=False))
+        text = text.str.replace('oo', '00', regex=False)
+
+        has_colon = text.str.contains(':', regex=False).to_numpy()
+        parsed = pd.to_datetime(text[has_colon], format='%H:%M').to_numpy()
+        times = np.full(len(text), None, dtype=object)
+        # 'YYYY-MM-DDTHH:MM:SS' -> 'HH:MM:SS'
+        times[has_colon] = [value[11:]
+                            for value in np.datetime_as_string(parsed, unit='s')]
+        # Object dtype, a string dtype would turn the missing times into NaN
+        return pd.Series(times, index=text.index, dtype=object)
+
+    def clean_date_column(self, dates: pd.Series) -> pd.Series:
+        """Vectorized date parsing, each value is parsed on its own like pd.to_datetime on a single value."""
+        if not pd.api.types.is_datetime64_any_dtype(dates):
+            dates = pd.to_datetime(dates, format='mixed')
+        return pd.Series(np.datetime_as_string(dates.to_numpy(), unit='D'), index=dates.index)
+
+    def create_hijk_records(self, watermark: Optional[tuple[date, str]] = None):
+        """Vectorized equivalent of create_hijk_dict.
+
+        Every record row (NUMBER filled in) is paired with the first row at or after it with an END time,
+        found by back-filling the positions of the END rows instead of scanning forward per record.
+        With a watermark only the records starting at or after it are built."""
+        self.prepare_dataframe()
+        df = self.sheet.reset_index(drop=True)
+
+        is_record = df['NUMBER'].notna().to_numpy()
+        has_end = ~df['END'].isin(['--', '']).to_numpy()
+        end_positions = pd.Series(
+            np.where(has_end, np.arange(len(df)), np.nan)).bfill().to_numpy()[is_record]
+        if np.isnan(end_positions).any():
+            raise IndexError(
+                "Closure record without a row containing its END time")
+
+        records = df[is_record]
+        ends = df.iloc[end_positions.astype(int)]
+        start_dates = self.clean_date_column(records['DATE'])
+        start_times = self.clean_time_column(records['START'])
+
+        if watermark is not None:
+            # 'YYYY-MM-DD' and 'HH:MM:SS' strings compare in chronological order
+            watermark_date, watermark_time = str(watermark[0]), str(watermark[1])
+            new = ((start_dates > watermark_date) | (
+                (start_dates == watermark_date) & (start_times.fillna('') >= watermark_time))).to_numpy()
+            records, ends = records[new], ends[new]
+            start_dates, start_times = start_dates[new], start_times[new]
+
+        columns = {
+            'StartDate': start_dates,
+            'StartTime': start_times,
+            'EndDate': self.clean_date_column(ends['DATE']),
+            'EndTime': self.clean_time_column(ends['END']),
+            'WaterLevel': records['WATERLEVEL'],
+            'ClosureEventType': records['TYPE'],
+        }
+        # Convert each column to Python objects at once, then zip the columns into records
+        values = [column.to_numpy(dtype=object).tolist()
+                  for column in columns.values()]
+        self.closure_record = [dict(zip(columns, record))
+                               for record in zip(*values)]
+        return self.closure_record
+
     def create_hijk_dict(self):
         self.prepare_dataframe()
         df = self.sheet
@@ -0,0 +1,131 @@
+"""Parse closure spreadsheets of any registered barrier in a process pool and load them into the database.
+
+    python -m ingest_data.ingest_runner --workbook HIJK data/hijk.xlsx --workbook HIJK data/hijk_old.xlsx Blad1
+
+Add --incremental to only submit the closure events since the last run.
+"""
+import argparse
+import json
+import logging
+from concurrent.futures import Executor, ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from datetime import date
+from typing import Callable, Iterable, Iterator, Optional
+
+from data_handler import BULK_INSERT_CHUNK_SIZE, StormSurgeBarrierDataHandler
+from ingest_data.io_operations import SHEET_CACHE_DIR, list_sheet_names, read_sheet
+from ingest_data.parser_registry import get_parser
+# Parser modules register themselves on import
+import ingest_data.ingest_hijk_data  # noqa: F401
+
+
+@dataclass(frozen=True)
+class IngestJob:
+    abbreviation: str
+    filename: str
+    sheet_name: str
+    cache: bool = True  # Read the sheet through the Feather cache
+
+
+def jobs_for_workbook(abbreviation: str, filename: str, sheet_names: Optional[Iterable[str]] = None,
+                      cache: bool = True) -> list[IngestJob]:
+    """One job per sheet, all sheets of the workbook (or the one of a CSV file) if none are given."""
+    if not sheet_names:
+        sheet_names = list_sheet_names(filename)
+    return [IngestJob(abbreviation, filename, sheet_name, cache) for sheet_name in sheet_names]
+
+
+def parse_job(job: IngestJob, watermark: Optional[tuple[date, str]] = None) -> tuple[IngestJob, list[dict]]:
+    """Read and parse one sheet, runs in a worker process."""
+    sheet = read_sheet(job.filename, job.sheet_name, SHEET_CACHE_DIR if job.cache else None)
+    parser = get_parser(job.abbreviation)(sheet)
+    return job, parser.create_records(watermark)
+
+
+def ingestion_watermarks(jobs: Iterable[IngestJob], data_handler: StormSurgeBarrierDataHandler) -> dict:
+    """Watermark of every barrier of the jobs, read once up front."""
+    return {abbreviation: data_handler.get_ingestion_watermark(abbreviation)
+            for abbreviation in {job.abbreviation for job in jobs}}
+
+
+def ingest_sheets(executor: Executor, jobs: Iterable[IngestJob], data_handler: StormSurgeBarrierDataHandler,
+                  chunk_size: int = BULK_INSERT_CHUNK_SIZE, watermarks: Optional[dict] = None,
+                  submit: Optional[Callable[[IngestJob, list[dict]], Iterable[dict]]] = None) -> Iterator[dict]:
+    """Parse the sheets in the executor and bulk upsert each sheet's records as soon as it is parsed.
+
+    Yields one report per sheet in the order they are parsed, with the skipped records, or the error if the sheet
+    could not be parsed or loaded, so one failing sheet does not lose the others. Only the records starting at or
+    after the barrier's watermark are parsed if watermarks are given. submit can wrap the parsed records of a
+    sheet before they are loaded, e.g. to count them."""
+    futures = {executor.submit(parse_job, job, watermarks.get(job.abbreviation) if watermarks is not None else None): job
+               for job in jobs}
+    for future in as_completed(futures):
+        job = futures[future]
+        report = {"abbreviation": job.abbreviation,
+                  "filename": job.filename, "sheet_name": job.sheet_name}
+        if watermarks is not None:
+            report["watermark"] = watermarks[job.abbreviation]
+        try:
+            _, records = future.result()
+        except Exception as e:
+            logging.exception("Parsing %s [%s] failed",
+                              job.filename, job.sheet_name)
+            yield {**report, "error": str(e)}
+            continue
+
+        try:
+            result = data_handler.bulk_upsert_closure_events(
+                job.abbreviation, submit(job, records) if submit is not None else records, chunk_size)
+        except Exception as e:
+            logging.exception("Loading %s [%s] failed",
+                              job.filename, job.sheet_name)
+            yield {**report, "records": len(records), "error": str(e)}
+            continue
+        yield {**report, "records": len(records), **result}
+
+
+def run_ingestion(jobs: Iterable[IngestJob], max_workers: Optional[int] = None, chunk_size: int = BULK_INSERT_CHUNK_SIZE,
+                  data_handler: Optional[StormSurgeBarrierDataHandler] = None, incremental: bool = False) -> list[dict]:
+    """Parse the sheets in parallel and bulk upsert each sheet's records as soon as it is parsed.
+
+    In incremental mode the watermark of every barrier is read once up front and only the records
+    starting at or after it are parsed and submitted.
+    Returns one report per job with the skipped records, or the error if the sheet could not be parsed or loaded
+    (e.g. an unknown barrier), so one failing sheet does not lose the reports of the others."""
+    data_handler = data_handler or StormSurgeBarrierDataHandler()
+    jobs = list(jobs)
+    for job in jobs:
+        get_parser(job.abbreviation)  # Fail before starting any work
+
+    watermarks = ingestion_watermarks(jobs, data_handler) if incremental else None
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return list(ingest_sheets(executor, jobs, data_handler, chunk_size, watermarks))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workbook", nargs="+", action="append", required=True,
+                        metavar=("ABBREVIATION FILENAME", "SHEET"),
+                        help="Barrier abbreviation, workbook path and optionally the sheets to read (default all)")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunk-size", type=int,
+                        default=BULK_INSERT_CHUNK_SIZE)
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only submit the closure events starting at or after each barrier's ingestion watermark")
+    args = parser.parse_args()
+
+    jobs = []
+    for workbook in args.workbook:
+        if len(workbook) < 2:
+            parser.error("--workbook needs a barrier abbreviation and a filename")
+        abbreviation, filename, *sheet_names = workbook
+        jobs.extend(jobs_for_workbook(
+            abbreviation, filename, sheet_names))
+
+    reports = run_ingestion(jobs, args.workers, args.chunk_size,
+                            incremental=args.incremental)
+    print(json.dumps(reports, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
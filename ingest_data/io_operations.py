@@ -1,9 +1,152 @@
+import datetime
+import hashlib
 import json
+import logging
+import os
+from pathlib import Path
+from typing import Optional
+
 import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Directory for the Feather copies of parsed sheets, set SHEET_CACHE_DIR to an empty value to disable the cache
+SHEET_CACHE_DIR = os.getenv("SHEET_CACHE_DIR", ".sheet_cache") or None
+# Sheet name of a CSV file, which holds a single sheet
+CSV_SHEET_NAME = "csv"
+
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def _file_hash(filename: str) -> str:
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def sheet_cache_path(filename: str, sheet_name: str, cache_dir: str, hash_contents: bool = False) -> Path:
+    """Cache file of a sheet, named after the workbook path and sheet plus the workbook version
+    (modification time and size, or the content hash), so a changed workbook misses the cache."""
+    path = os.path.abspath(filename)
+    if hash_contents:
+        version = _file_hash(path)
+    else:
+        stat = os.stat(path)
+        version = f"{stat.st_mtime_ns}-{stat.st_size}"
+    return Path(cache_dir) / f"{_sha256(f'{path}|{sheet_name}')[:32]}-{_sha256(version)[:16]}.feather"
+
+
+# Excel columns often mix text with dates, times or numbers, Arrow cannot store those as one type, so
+# such columns are stored as text next to a column with the original type of every cell
+MIXED_COLUMN_PREFIX = '__type__'
+_CELL_ENCODERS = [
+    ('none', type(None), lambda v: None),
+    ('timestamp', pd.Timestamp, pd.Timestamp.isoformat),
+    ('datetime', datetime.datetime, datetime.datetime.isoformat),
+    ('date', datetime.date, datetime.date.isoformat),
+    ('time', datetime.time, datetime.time.isoformat),
+    ('bool', bool, str),
+    ('int', int, str),
+    ('float', float, repr),
+    ('str', str, str),
+]
+_CELL_DECODERS = {
+    'none': lambda v: None,
+    'timestamp': pd.Timestamp,
+    'datetime': datetime.datetime.fromisoformat,
+    'date': datetime.date.fromisoformat,
+    'time': datetime.time.fromisoformat,
+    'bool': lambda v: v == 'True',
+    'int': int,
+    'float': float,
+    'str': str,
+}
+
+
+def _encode_cell(value) -> tuple[str, Optional[str]]:
+    for tag, cell_type, encode in _CELL_ENCODERS:
+        if isinstance(value, cell_type):
+            return tag, encode(value)
+    raise TypeError(f"Cannot cache cell of type {type(value).__name__}")
+
+
+def _encode_mixed_columns(df: pd.DataFrame) -> pd.DataFrame:
+    encoded = {}
+    for name, column in df.items():
+        if column.dtype == object and pd.api.types.infer_dtype(column, skipna=True).startswith('mixed'):
+            tags, texts = zip(*map(_encode_cell, column)) if len(column) else ((), ())
+            encoded[f"{MIXED_COLUMN_PREFIX}{name}"] = pd.Series(tags, dtype=object)
+            encoded[name] = pd.Series(texts, dtype=object)
+        else:
+            encoded[name] = column.reset_index(drop=True)
+    return pd.DataFrame(encoded)
+
+
+def _decode_mixed_columns(df: pd.DataFrame) -> pd.DataFrame:
+    for tag_column in [c for c in df.columns if c.startswith(MIXED_COLUMN_PREFIX)]:
+        name = tag_column[len(MIXED_COLUMN_PREFIX):]
+        df[name] = pd.Series([_CELL_DECODERS[tag](text) for tag, text in zip(df[tag_column], df[name])], dtype=object)
+        df = df.drop(columns=tag_column)
+    return df
+
+
+def _write_sheet_cache(df: pd.DataFrame, cache_path: Path):
+    """Store a sheet uncompressed so it can be memory-mapped, replacing older versions of the same sheet."""
+    if not all(isinstance(name, str) and not name.startswith(MIXED_COLUMN_PREFIX) for name in df.columns):
+        logging.info("Sheet not cached, column names are not plain text")
+        return
+    try:
+        table = pa.Table.from_pandas(_encode_mixed_columns(df), preserve_index=False)
+    except (TypeError, pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError) as e:
+        logging.info("Sheet not cached, not representable in Arrow: %s", e)
+        return
+
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    sheet_key = cache_path.name.split('-')[0]
+    for stale in cache_path.parent.glob(f"{sheet_key}-*.feather"):
+        stale.unlink(missing_ok=True)
+
+    # Write to a temporary file first, parallel readers never see a partial file
+    tmp_path = cache_path.with_suffix(f".{os.getpid()}.tmp")
+    feather.write_feather(table, tmp_path, compression='uncompressed')
+    os.replace(tmp_path, cache_path)
+
+
+def read_excel_data(filename: str, sheet_name: str, cache_dir: Optional[str] = SHEET_CACHE_DIR, hash_contents: bool = False) -> pd.DataFrame:
+    """Read a sheet, from the Feather cache if the workbook did not change since it was last parsed."""
+    if cache_dir is None:
+        return pd.read_excel(filename, sheet_name=sheet_name)
+
+    cache_path = sheet_cache_path(
+        filename, sheet_name, cache_dir, hash_contents)
+    if cache_path.exists():
+        return _decode_mixed_columns(feather.read_table(cache_path, memory_map=True).to_pandas())
+
+    df = pd.read_excel(filename, sheet_name=sheet_name)
+    _write_sheet_cache(df, cache_path)
+    return df
+
+
+def read_sheet(filename: str, sheet_name: str, cache_dir: Optional[str] = SHEET_CACHE_DIR) -> pd.DataFrame:
+    """Read a sheet of a workbook, or the only sheet of a CSV file."""
+    if filename.lower().endswith(".csv"):
+        return pd.read_csv(filename)
+    return read_excel_data(filename, sheet_name, cache_dir)
 
 
-def read_excel_data(filename: str, sheet_name: str) -> pd.DataFrame:
-    return pd.read_excel(filename, sheet_name=sheet_name)
+def list_sheet_names(filename: str) -> list[str]:
+    if filename.lower().endswith(".csv"):
+        return [CSV_SHEET_NAME]
+    with pd.ExcelFile(filename) as workbook:
+        return workbook.sheet_names
 
 
 def write_to_json(data: dict, filename: str):
@@ -0,0 +1,43 @@
+from abc import ABC, abstractmethod
+from datetime import date
+from typing import Optional
+
+import pandas as pd
+
+# Spreadsheet parser class per barrier abbreviation, filled by the register_parser decorator
+BARRIER_PARSERS: dict[str, type["ClosureSheetParser"]] = {}
+
+
+class ClosureSheetParser(ABC):
+    """Base class for per-barrier spreadsheet parsers, following the ingestCSVhijk pattern:
+    constructed with one sheet, create_records returns the closure records of that sheet.
+
+    When a watermark (start date and time of the latest ingested event) is given, create_records
+    only returns the records starting at or after it."""
+    barrier_abbreviation: str
+
+    def __init__(self, sheet: pd.DataFrame):
+        self.sheet = sheet
+        self.closure_record = []
+
+    @abstractmethod
+    def create_records(self, watermark: Optional[tuple[date, str]] = None) -> list[dict]:
+        """The closure records of the sheet, only those starting at or after the watermark if one is given."""
+
+
+def register_parser(abbreviation: str):
+    """Class decorator registering a parser for the barrier with the given abbreviation."""
+    def decorator(parser_class: type[ClosureSheetParser]) -> type[ClosureSheetParser]:
+        parser_class.barrier_abbreviation = abbreviation
+        BARRIER_PARSERS[abbreviation] = parser_class
+        return parser_class
+    return decorator
+
+
+def get_parser(abbreviation: str) -> type[ClosureSheetParser]:
+    """Return the parser class registered for a barrier."""
+    try:
+        return BARRIER_PARSERS[abbreviation]
+    except KeyError:
+        raise ValueError(
+            f"No spreadsheet parser registered for barrier: {abbreviation}") from None
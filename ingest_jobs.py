@@ -0,0 +1,181 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from dotenv import load_dotenv
+from typing import BinaryIO, Iterator, Optional
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+
+from data_handler import BULK_INSERT_CHUNK_SIZE, StormSurgeBarrierDataHandler
+from ingest_data.ingest_runner import ingest_sheets, ingestion_watermarks, jobs_for_workbook
+
+# Load environment variables
+load_dotenv()
+
+# Upload jobs processed at the same time, each parses its sheets in the parse processes
+INGEST_JOB_WORKERS = int(os.getenv("INGEST_JOB_WORKERS", "1"))
+# Processes parsing uploaded sheets, parsing is CPU-bound and must not hold the GIL of the API process
+INGEST_PARSE_PROCESSES = int(os.getenv("INGEST_PARSE_PROCESSES", "2"))
+# Finished jobs kept for the status endpoint, the oldest are forgotten first
+INGEST_JOB_HISTORY = int(os.getenv("INGEST_JOB_HISTORY", "100"))
+# Directory for uploaded files waiting to be parsed, the system temporary directory if not set
+UPLOAD_DIR = os.getenv("UPLOAD_DIR") or None
+UPLOAD_EXTENSIONS = (".xlsx", ".xls", ".csv")
+
+
+def save_upload(file: BinaryIO, filename: str) -> str:
+    """Copy an uploaded file to disk, keeping its extension so the parse process knows how to read it."""
+    extension = os.path.splitext(filename)[1].lower()
+    if extension not in UPLOAD_EXTENSIONS:
+        raise ValueError(f"Unsupported file type {extension or filename!r}, expected one of {', '.join(UPLOAD_EXTENSIONS)}")
+    descriptor, path = tempfile.mkstemp(suffix=extension, prefix="upload-", dir=UPLOAD_DIR)
+    with os.fdopen(descriptor, "wb") as target:
+        shutil.copyfileobj(file, target, 1 << 20)
+    return path
+
+
+@dataclass
+class UploadJob:
+    """Progress and outcome of one uploaded file."""
+    id: str
+    abbreviation: str
+    filename: str
+    path: str = field(repr=False)
+    sheet_names: Optional[list[str]] = None
+    incremental: bool = False
+    chunk_size: int = BULK_INSERT_CHUNK_SIZE
+    state: str = "queued"  # queued, running, succeeded or failed
+    created_at: datetime = field(default_factory=datetime.now)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    sheets_total: Optional[int] = None
+    records_parsed: int = 0
+    records_submitted: int = 0
+    # One report per finished sheet, the same as the ingestion runner's: skipped records or the error
+    sheets: list = field(default_factory=list, repr=False)
+    error: Optional[str] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.state in ("succeeded", "failed")
+
+    def status(self) -> dict:
+        return {
+            "job_id": self.id,
+            "abbreviation": self.abbreviation,
+            "filename": self.filename,
+            "state": self.state,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "sheets_total": self.sheets_total,
+            "sheets_done": len(self.sheets),
+            "records_parsed": self.records_parsed,
+            "records_submitted": self.records_submitted,
+            "sheets": list(self.sheets),
+            "error": self.error,
+        }
+
+
+@dataclass
+class UploadJobStore:
+    """In-memory store of upload jobs, run one by one (or workers at a time) on background threads.
+
+    A job parses its sheets in separate processes and bulk upserts every sheet in chunks with the sync data
+    handler as soon as it is parsed, like the ingestion runner, so neither the parsing nor the database work runs
+    on the event loop or its connections."""
+    workers: int = INGEST_JOB_WORKERS
+    parse_processes: int = INGEST_PARSE_PROCESSES
+    history: int = INGEST_JOB_HISTORY
+    _jobs: dict = field(default_factory=dict, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+    _executor: Optional[ThreadPoolExecutor] = field(default=None, repr=False)
+    _parse_pool: Optional[ProcessPoolExecutor] = field(default=None, repr=False)
+
+    def submit(self, abbreviation: str, filename: str, path: str, sheet_names: Optional[list[str]] = None,
+               incremental: bool = False, chunk_size: int = BULK_INSERT_CHUNK_SIZE) -> UploadJob:
+        """Queue a saved upload, the job owns the file and removes it when it is done."""
+        job = UploadJob(uuid.uuid4().hex, abbreviation, filename, path, sheet_names, incremental, chunk_size)
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="upload-job")
+                # Spawned, not forked: the API process runs threads whose locks a fork could copy while held
+                self._parse_pool = ProcessPoolExecutor(
+                    self.parse_processes, mp_context=multiprocessing.get_context("spawn"))
+            self._jobs[job.id] = job
+            self._forget_finished()
+            self._executor.submit(self._run, job, self._parse_pool)
+        return job
+
+    def get(self, job_id: str) -> Optional[UploadJob]:
+        return self._jobs.get(job_id)
+
+    def jobs(self) -> list[UploadJob]:
+        with self._lock:
+            return list(self._jobs.values())
+
+    def shutdown(self):
+        """Finish the running jobs and drop the queued ones, called from the FastAPI lifespan."""
+        with self._lock:
+            executor, parse_pool = self._executor, self._parse_pool
+            self._executor = self._parse_pool = None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+            parse_pool.shutdown(wait=True)
+        for job in self.jobs():
+            if job.state == "queued":
+                job.state, job.error, job.finished_at = "failed", "Cancelled at shutdown", datetime.now()
+                _remove_file(job.path)
+
+    def _forget_finished(self):
+        finished = [job.id for job in self._jobs.values() if job.finished]
+        for job_id in finished[:max(len(finished) - self.history, 0)]:
+            del self._jobs[job_id]
+
+    @staticmethod
+    def _counted(job: UploadJob, records: list[dict]) -> Iterator[dict]:
+        job.records_parsed += len(records)
+        for record in records:
+            job.records_submitted += 1
+            yield record
+
+    def _run(self, job: UploadJob, parse_pool: ProcessPoolExecutor):
+        job.state, job.started_at = "running", datetime.now()
+        try:
+            data_handler = StormSurgeBarrierDataHandler()
+            # Uploaded files are read once, the Feather cache would only fill up
+            sheets = jobs_for_workbook(job.abbreviation, job.path, job.sheet_names, cache=False)
+            job.sheets_total = len(sheets)
+            watermarks = ingestion_watermarks(sheets, data_handler) if job.incremental else None
+            for report in ingest_sheets(parse_pool, sheets, data_handler, job.chunk_size, watermarks,
+                                        lambda sheet, records: self._counted(job, records)):
+                # The sheets are reported by name, the saved file is removed after the job
+                report.pop("filename")
+                job.sheets.append(report)
+            failed = [report["sheet_name"] for report in job.sheets if "error" in report]
+            if failed:
+                job.state, job.error = "failed", f"{len(failed)} of {len(job.sheets)} sheets failed: {', '.join(map(str, failed))}"
+            else:
+                job.state = "succeeded"
+        except Exception as e:
+            logging.exception("Upload job %s (%s) failed", job.id, job.filename)
+            job.state, job.error = "failed", str(e)
+        finally:
+            job.finished_at = datetime.now()
+            _remove_file(job.path)
+
+
+def _remove_file(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+# Shared by the upload endpoints, shut down by the lifespan of the FastAPI app
+UPLOAD_JOBS = UploadJobStore()
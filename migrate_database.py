@@ -0,0 +1,122 @@
+from data_model import (IndividualGateClosures, IndividualStormSurgeBarrierGates, IngestionWatermarks,
+                        ReliabilitySnapshots, StormSurgeBarrierClosureCounts, StormSurgeBarrierClosureEvents, StormSurgeBarriers)
+from data_handler import refresh_closure_counts, refresh_ingestion_watermarks, refresh_reliability_snapshots
+from database.engine_config import engine
+from sqlalchemy import inspect, text
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import AddConstraint
+
+# Brings a database created by an earlier version of create_database.py up to date.
+# New databases get the constraints and tables from create_database.py directly.
+closure_table = StormSurgeBarrierClosureEvents.__table__
+unique_constraint = next(
+    c for c in closure_table.constraints if c.name == 'uq_closure_event_barrier_start')
+barrier_table = StormSurgeBarriers.__table__
+abbreviation_constraint = next(
+    c for c in barrier_table.constraints if c.name == 'uq_barrier_abbreviation')
+
+with engine.begin() as connection:
+    existing = {c['name'] for c in inspect(
+        connection).get_unique_constraints(closure_table.name)}
+
+    if unique_constraint.name not in existing:
+        # Closure events with the same start moment and the most recently inserted one, which is kept
+        kept_closures = (
+            'WITH kept AS (SELECT "ID", MAX("ID") OVER (PARTITION BY "BarrierID", "StartDate", "StartTime") AS "KeptID" '
+            'FROM "StormSurgeBarrierClosureEvents") ')
+        # Gate closures of duplicates move to the kept closure event, of a gate closing in several duplicates
+        # only the most recently inserted gate closure is kept
+        connection.execute(text(
+            kept_closures +
+            'DELETE FROM "IndividualGateClosures" a '
+            'USING "IndividualGateClosures" b, kept ka, kept kb '
+            'WHERE a."BarrierClosureID" = ka."ID" '
+            'AND b."BarrierClosureID" = kb."ID" '
+            'AND ka."KeptID" = kb."KeptID" '
+            'AND a."GateID" = b."GateID" '
+            'AND a."ID" < b."ID"'
+        ))
+        connection.execute(text(
+            kept_closures +
+            'UPDATE "IndividualGateClosures" g '
+            'SET "BarrierClosureID" = kept."KeptID" '
+            'FROM kept '
+            'WHERE g."BarrierClosureID" = kept."ID" '
+            'AND kept."ID" <> kept."KeptID"'
+        ))
+        # Remove duplicate closure events, keeping the most recently inserted record
+        connection.execute(text(
+            'DELETE FROM "StormSurgeBarrierClosureEvents" a '
+            'USING "StormSurgeBarrierClosureEvents" b '
+            'WHERE a."BarrierID" = b."BarrierID" '
+            'AND a."StartDate" = b."StartDate" '
+            'AND a."StartTime" = b."StartTime" '
+            'AND a."ID" < b."ID"'
+        ))
+        connection.execute(AddConstraint(unique_constraint))
+
+    existing = {c['name'] for c in inspect(
+        connection).get_unique_constraints(barrier_table.name)}
+
+    if abbreviation_constraint.name not in existing:
+        # Barriers are referenced by closures, duplicates have to be merged by hand
+        duplicates = connection.execute(text(
+            'SELECT "Abbreviation" FROM "StormSurgeBarriers" '
+            'GROUP BY "Abbreviation" HAVING COUNT(*) > 1'
+        )).scalars().all()
+        if duplicates:
+            raise RuntimeError(
+                f"Duplicate barrier abbreviations, resolve these first: {', '.join(duplicates)}")
+        connection.execute(AddConstraint(abbreviation_constraint))
+
+    gate_table = IndividualStormSurgeBarrierGates.__table__
+    gate_name_constraint = next(
+        c for c in gate_table.constraints if c.name == 'uq_gate_barrier_name')
+    existing = {c['name'] for c in inspect(
+        connection).get_unique_constraints(gate_table.name)}
+
+    if gate_name_constraint.name not in existing:
+        # Gates are referenced by gate closures, duplicates have to be merged by hand
+        duplicates = connection.execute(text(
+            'SELECT "BarrierID", "Name" FROM "IndividualStormSurgeBarrierGates" '
+            'GROUP BY "BarrierID", "Name" HAVING COUNT(*) > 1'
+        )).all()
+        if duplicates:
+            raise RuntimeError(
+                f"Duplicate gate names per barrier, resolve these first: {duplicates}")
+        connection.execute(AddConstraint(gate_name_constraint))
+
+    gate_closure_table = IndividualGateClosures.__table__
+    gate_closure_constraint = next(
+        c for c in gate_closure_table.constraints if c.name == 'uq_gate_closure_gate_event')
+    existing = {c['name'] for c in inspect(
+        connection).get_unique_constraints(gate_closure_table.name)}
+
+    if gate_closure_constraint.name not in existing:
+        # Remove duplicate gate closures, keeping the most recently inserted record
+        connection.execute(text(
+            'DELETE FROM "IndividualGateClosures" a '
+            'USING "IndividualGateClosures" b '
+            'WHERE a."GateID" = b."GateID" '
+            'AND a."BarrierClosureID" = b."BarrierClosureID" '
+            'AND a."ID" < b."ID"'
+        ))
+        connection.execute(AddConstraint(gate_closure_constraint))
+
+    # The duplicate check of single inserts uses the unique constraint, its former (BarrierID, StartDate, EndDate) index is unused
+    connection.execute(text('DROP INDEX IF EXISTS ix_closure_event_barrier_start_end'))
+    # Indexes for the closure lookups, existing indexes are left as they are
+    for index in closure_table.indexes:
+        index.create(connection, checkfirst=True)
+
+    # Closure count aggregate used by the reliability statistics, filled from the existing closures
+    StormSurgeBarrierClosureCounts.__table__.create(connection, checkfirst=True)
+    # Per-barrier ingestion watermarks, set to the latest existing closure event
+    IngestionWatermarks.__table__.create(connection, checkfirst=True)
+    # Precomputed reliability statistics served to dashboards, filled from the closure counts
+    ReliabilitySnapshots.__table__.create(connection, checkfirst=True)
+    with Session(bind=connection) as session:
+        refresh_closure_counts(session)
+        refresh_ingestion_watermarks(session)
+        refresh_reliability_snapshots(session)
+        session.flush()
@@ -1,7 +1,11 @@
 from datetime import date
-from typing import Optional
+from typing import Dict, List, Optional
 from enum import Enum
-from pydantic import BaseModel, Field
+import numpy as np
+import pandas as pd
+from pydantic import BaseModel, Field, root_validator, validator
+from enums.closure_event_result import ClosureEventResult
+from enums.closure_event_type import ClosureEventType
 
 
 class StormSurgeBarrierClosureEvents(BaseModel):
@@ -15,6 +19,12 @@ class StormSurgeBarrierClosureEvents(BaseModel):
     EndTime: Optional[str]
 
 
+class StormSurgeBarrierClosureEventsPage(BaseModel):
+    items: list[StormSurgeBarrierClosureEvents]
+    next_cursor: Optional[int] = Field(
+        None, description="Pass as after_id to fetch the next page, None on the last page")
+
+
 class StormSurgeBarriers(BaseModel):
     Name: str
     Abbreviation: str
@@ -39,15 +49,21 @@ class IndividualGateClosures(BaseModel):
     ClosureResult: str
 
 
-class ClosureEventTypeEnum(str, Enum):
-    STORM = 'STORM'
-    OPS = 'OPS'
-    TEST = 'TEST'
+# String enums of the API schema, built from the database enums so both accept the same values
+ClosureEventTypeEnum = Enum(
+    "ClosureEventTypeEnum", {member.name: member.value for member in ClosureEventType}, type=str)
+ClosureEventResultEnum = Enum(
+    "ClosureEventResultEnum", {member.name: member.value for member in ClosureEventResult}, type=str)
+
 
+# Closure times are sent as HH:MM or HH:MM:SS and stored as HH:MM:SS, like the spreadsheet parsers store them,
+# so the same start moment always has the same key
+TIME_PATTERN = r"^(?:[01]\d|2[0-3]):[0-5]\d(?::[0-5]\d)?$"
 
-class ClosureEventResultEnum(str, Enum):
-    SUCCESS = 'SUCCESS'
-    FAILURE = 'FAILURE'
+
+def normalize_time(value: str) -> str:
+    """HH:MM:SS of a time matching TIME_PATTERN."""
+    return f"{value}:00" if len(value) == 5 else value
 
 
 class SingleClosureEvent(BaseModel):
@@ -57,14 +73,14 @@ class SingleClosureEvent(BaseModel):
                           example="2023-09-29")
     StartTime: str = Field(
         ...,
-        description="The start time of the event (in HH:MM format)",
-        regex="^(?:[01]\d|2[0-3]):[0-5]\d$",
+        description="The start time of the event (in HH:MM or HH:MM:SS format)",
+        regex=TIME_PATTERN,
         example="08:00"
     )
     EndTime: str = Field(
         ...,
-        description="The end time of the event (in HH:MM format)",
-        regex="^(?:[01]\d|2[0-3]):[0-5]\d$",
+        description="The end time of the event (in HH:MM or HH:MM:SS format)",
+        regex=TIME_PATTERN,
         example="18:00"
     )
     ClosureEventType: ClosureEventTypeEnum = Field(
@@ -76,6 +92,119 @@ class SingleClosureEvent(BaseModel):
                               description="The water level at the time of the event",
                               example=1.5)
 
+    @validator("StartTime", "EndTime")
+    def normalize_times(cls, value: str) -> str:
+        return normalize_time(value)
+
+
+# Fields of the records of a closure batch, BarrierID is accepted but the barrier comes from the path
+CLOSURE_BATCH_FIELDS = tuple(name for name in SingleClosureEvent.__fields__ if name != "BarrierID")
+# Value of a batch field that is missing or null
+CLOSURE_BATCH_DEFAULTS = {"ClosureEventResult": ClosureEventResultEnum.SUCCESS.value}
+
+
+def _all_strings(values: pd.Series) -> np.ndarray:
+    if pd.api.types.infer_dtype(values, skipna=True) == "string":
+        return values.notna().to_numpy()
+    return np.fromiter((isinstance(value, str) for value in values), dtype=bool, count=len(values))
+
+
+def _parse_column(name: str, values: pd.Series) -> tuple[np.ndarray, np.ndarray]:
+    """Check a whole column against its SingleClosureEvent field, returns the parsed values and the invalid mask."""
+    field = SingleClosureEvent.__fields__[name]
+    if issubclass(field.type_, Enum):
+        invalid = ~values.isin([member.value for member in field.type_]).to_numpy()
+        parsed = values.to_numpy(dtype=object)
+    elif field.type_ is date:
+        is_string = _all_strings(values)
+        dates = pd.to_datetime(values.where(is_string), format="%Y-%m-%d", errors="coerce")
+        invalid = dates.isna().to_numpy()
+        parsed = np.array(dates.dt.date, dtype=object)
+    elif field.type_ is float:
+        numbers = pd.to_numeric(values.where(values.map(type) != bool), errors="coerce")
+        invalid = numbers.isna().to_numpy()
+        parsed = numbers.astype(float).to_numpy(dtype=object)
+    else:
+        is_string = _all_strings(values)
+        invalid = ~is_string
+        if field.field_info.regex is not None:
+            invalid |= ~values.where(is_string, "").astype(str).str.fullmatch(field.field_info.regex).to_numpy(dtype=bool)
+        parsed = values.to_numpy(dtype=object)
+        if field.field_info.regex == TIME_PATTERN:
+            parsed = np.array([normalize_time(value) if not bad else value for value, bad in zip(parsed, invalid)],
+                              dtype=object)
+    return parsed, invalid
+
+
+class ClosureEventBatch(BaseModel):
+    """Closure events of one barrier, as a list of records or as one array per field (columnar form).
+
+    The records follow SingleClosureEvent, with ClosureEventResult defaulting to SUCCESS. Pydantic only checks the
+    shape of the batch, validated_rows checks the values a column at a time and reports the invalid rows."""
+    records: Optional[List[dict]] = Field(
+        None, description="One object per closure event")
+    columns: Optional[Dict[str, list]] = Field(
+        None, description="One array per field, all of the same length",
+        example={"StartDate": ["2023-09-28"], "StartTime": ["08:00"], "EndDate": ["2023-09-29"], "EndTime": ["18:00"],
+                 "WaterLevel": [3.1], "ClosureEventType": ["STORM"], "ClosureEventResult": ["SUCCESS"]})
+
+    @root_validator(skip_on_failure=True)
+    def check_shape(cls, values):
+        records, columns = values.get("records"), values.get("columns")
+        if (records is None) == (columns is None):
+            raise ValueError("Pass either records or columns")
+        names = set(columns) if columns is not None else set().union(*records)
+        unknown = names - set(SingleClosureEvent.__fields__)
+        if unknown:
+            raise ValueError(f"Unknown closure field(s): {', '.join(sorted(unknown))}")
+        if columns is not None and len({len(column) for column in columns.values()}) > 1:
+            raise ValueError("All columns must have the same length")
+        return values
+
+    def __len__(self) -> int:
+        if self.records is not None:
+            return len(self.records)
+        return len(next(iter(self.columns.values()), []))
+
+    def record(self, index: int) -> dict:
+        """The record at index as it was sent."""
+        if self.records is not None:
+            return self.records[index]
+        return {name: column[index] for name, column in self.columns.items()}
+
+    def validated_rows(self) -> tuple[list[dict], list[dict]]:
+        """Validate all values column by column.
+
+        Returns the valid records with parsed values (dates, floats, HH:MM:SS times) and the skipped records with their index and
+        errors, so invalid records never reach the database."""
+        if self.records is not None:
+            frame = pd.DataFrame(self.records, columns=list(CLOSURE_BATCH_FIELDS), dtype=object)
+        else:
+            frame = pd.DataFrame({name: pd.Series(self.columns.get(name, [None] * len(self)), dtype=object)
+                                  for name in CLOSURE_BATCH_FIELDS})
+
+        parsed, errors = {}, {}
+        for name in CLOSURE_BATCH_FIELDS:
+            values = frame[name]
+            if name in CLOSURE_BATCH_DEFAULTS:
+                values = values.fillna(CLOSURE_BATCH_DEFAULTS[name])
+            missing = values.isna().to_numpy()
+            parsed[name], invalid = _parse_column(name, values)
+            errors[f"{name}: field required"] = missing
+            errors[f"{name}: invalid value"] = invalid & ~missing
+
+        invalid_rows = np.logical_or.reduce(list(errors.values())) if len(frame) else np.zeros(0, dtype=bool)
+        skipped_records = [{
+            "index": int(index),
+            "record": self.record(index),
+            "error": "; ".join(message for message, mask in errors.items() if mask[index]),
+        } for index in np.flatnonzero(invalid_rows)]
+
+        valid = ~invalid_rows
+        values = [parsed[name][valid].tolist() for name in CLOSURE_BATCH_FIELDS]
+        rows = [dict(zip(CLOSURE_BATCH_FIELDS, row)) for row in zip(*values)]
+        return rows, skipped_records
+
 
 class BetaDistributionInput(BaseModel):
     abbreviation: str
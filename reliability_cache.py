@@ -0,0 +1,110 @@
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from dotenv import load_dotenv
+from typing import Callable, Hashable, Optional
+import os
+import threading
+import time
+
+# Load environment variables
+load_dotenv()
+
+RELIABILITY_CACHE_SIZE = int(os.getenv("RELIABILITY_CACHE_SIZE", "1024"))
+RELIABILITY_CACHE_TTL = float(os.getenv("RELIABILITY_CACHE_TTL", "300"))
+
+
+@dataclass
+class ReliabilityCache:
+    """Bounded in-process cache for reliability statistics with TTL and LRU eviction.
+
+    Entries are grouped per barrier abbreviation so writes to a barrier invalidate only its entries.
+    A per-barrier generation counter keeps a result computed before an invalidation from being stored after it."""
+    max_entries: int = RELIABILITY_CACHE_SIZE
+    ttl_seconds: float = RELIABILITY_CACHE_TTL
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    invalidations: int = 0
+    _entries: OrderedDict = field(default_factory=OrderedDict, repr=False)
+    _keys_by_barrier: dict = field(default_factory=dict, repr=False)
+    _generations: dict = field(default_factory=dict, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+    _listeners: list = field(default_factory=list, repr=False)
+
+    def get(self, abbreviation: str, params: tuple[Hashable, ...]) -> tuple[Optional[dict], int]:
+        """Return the cached value (None on a miss) and the barrier generation to pass to `set`."""
+        key = (abbreviation, params)
+        with self._lock:
+            generation = self._generations.get(abbreviation, 0)
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1], generation
+            if entry is not None:
+                self._remove(key)
+            self.misses += 1
+            return None, generation
+
+    def set(self, abbreviation: str, params: tuple[Hashable, ...], value: dict, generation: int):
+        """Store a value unless the barrier was invalidated since the matching `get`."""
+        key = (abbreviation, params)
+        with self._lock:
+            if self._generations.get(abbreviation, 0) != generation:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            self._keys_by_barrier.setdefault(abbreviation, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate_barrier(self, abbreviation: str):
+        """Drop all entries of a barrier, called after its closures or details were written."""
+        with self._lock:
+            self._generations[abbreviation] = self._generations.get(
+                abbreviation, 0) + 1
+            for key in self._keys_by_barrier.pop(abbreviation, set()):
+                self._entries.pop(key, None)
+            self.invalidations += 1
+        for listener in list(self._listeners):
+            listener(abbreviation)
+
+    def add_invalidation_listener(self, listener: Callable[[str], None]):
+        """Call listener with the abbreviation of every invalidated barrier, e.g. to refresh derived data."""
+        self._listeners.append(listener)
+
+    def remove_invalidation_listener(self, listener: Callable[[str], None]):
+        self._listeners.remove(listener)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_barrier.clear()
+
+    def stats(self) -> dict:
+        """Hit/miss counters and current size of the cache."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else None,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+    def _remove(self, key: tuple):
+        self._entries.pop(key, None)
+        keys = self._keys_by_barrier.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_barrier[key[0]]
+
+
+# Shared by the sync and async data handlers
+RELIABILITY_CACHE = ReliabilityCache()
@@ -0,0 +1,126 @@
+import asyncio
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+from typing import Optional
+import logging
+import os
+
+from async_data_handler import AsyncStormSurgeBarrierDataHandler
+from reliability_cache import RELIABILITY_CACHE
+
+# Load environment variables
+load_dotenv()
+
+# Seconds to wait after a write for further writes, a burst of writes results in one refresh
+RELIABILITY_SNAPSHOT_DEBOUNCE = float(os.getenv("RELIABILITY_SNAPSHOT_DEBOUNCE", "2"))
+# Seconds between full refreshes, these pick up writes made outside the API (e.g. by the ingest runner)
+RELIABILITY_SNAPSHOT_INTERVAL = float(os.getenv("RELIABILITY_SNAPSHOT_INTERVAL", "900"))
+
+
+@dataclass
+class ReliabilitySnapshotWorker:
+    """Background task recomputing the reliability snapshot of barriers after their closures were written.
+
+    Writes are signalled through the reliability cache invalidations. Signals are debounced and coalesced:
+    the barriers written during the debounce delay (or during a running refresh) are refreshed together.
+    The whole snapshot is refreshed at startup and every interval seconds."""
+    debounce_seconds: float = RELIABILITY_SNAPSHOT_DEBOUNCE
+    interval_seconds: float = RELIABILITY_SNAPSHOT_INTERVAL
+    refreshes: int = 0
+    failures: int = 0
+    last_refresh: Optional[datetime] = None
+    _pending: set = field(default_factory=set, repr=False)
+    _refreshing: set = field(default_factory=set, repr=False)
+    _full_refresh_pending: bool = field(default=True, repr=False)
+    _full_refresh_running: bool = field(default=False, repr=False)
+    _loop: Optional[asyncio.AbstractEventLoop] = field(default=None, repr=False)
+    _wakeup: Optional[asyncio.Event] = field(default=None, repr=False)
+    _task: Optional[asyncio.Task] = field(default=None, repr=False)
+
+    def start(self):
+        """Start the worker on the running event loop, called from the FastAPI lifespan."""
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._full_refresh_pending = True
+        self._wakeup.set()
+        RELIABILITY_CACHE.add_invalidation_listener(self.notify)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        RELIABILITY_CACHE.remove_invalidation_listener(self.notify)
+        self._loop = None
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def notify(self, abbreviation: Optional[str] = None):
+        """Mark a barrier (all barriers if None) for refresh, safe to call from any thread."""
+        loop = self._loop
+        if loop is not None:
+            loop.call_soon_threadsafe(self._mark, abbreviation)
+
+    def is_pending(self, abbreviation: Optional[str] = None) -> bool:
+        """Whether a refresh of the barrier (any barrier if None) is waiting or running."""
+        if self._full_refresh_pending or self._full_refresh_running:
+            return True
+        if abbreviation is None:
+            return bool(self._pending or self._refreshing)
+        return abbreviation in self._pending or abbreviation in self._refreshing
+
+    def stats(self) -> dict:
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "debounce_seconds": self.debounce_seconds,
+            "interval_seconds": self.interval_seconds,
+            "refreshes": self.refreshes,
+            "failures": self.failures,
+            "last_refresh": self.last_refresh,
+            "pending_barriers": sorted(self._pending),
+            "full_refresh_pending": self._full_refresh_pending,
+        }
+
+    def _mark(self, abbreviation: Optional[str]):
+        if abbreviation is None:
+            self._full_refresh_pending = True
+        else:
+            self._pending.add(abbreviation)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.interval_seconds)
+            except asyncio.TimeoutError:
+                self._full_refresh_pending = True
+            # Coalesce the writes of the debounce delay into one refresh
+            await asyncio.sleep(self.debounce_seconds)
+            self._wakeup.clear()
+
+            full_refresh = self._full_refresh_pending
+            self._full_refresh_pending = False
+            self._full_refresh_running = full_refresh
+            self._refreshing, self._pending = self._pending, set()
+            try:
+                await AsyncStormSurgeBarrierDataHandler().update_reliability_snapshots(
+                    None if full_refresh else sorted(self._refreshing))
+                self.refreshes += 1
+                self.last_refresh = datetime.now(timezone.utc)
+            except Exception:
+                # Retried with the next signal or interval, the previous snapshot is served meanwhile
+                logging.exception("Refreshing the reliability snapshot failed")
+                self.failures += 1
+                self._full_refresh_pending |= full_refresh
+                self._pending |= self._refreshing
+            finally:
+                self._full_refresh_running = False
+                self._refreshing = set()
+
+
+# Started and stopped by the lifespan of the FastAPI app
+RELIABILITY_SNAPSHOT_WORKER = ReliabilitySnapshotWorker()
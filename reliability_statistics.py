@@ -0,0 +1,371 @@
+import re
+from typing import Optional, Sequence
+import numpy as np
+
+
+def rule_of_three_response(barrier_name: str, successful_closures: int, closure_type: Optional[str] = None, rule_number: int = 3) -> dict:
+    """Upper bound of the failure rate for a number of successful closures without failures, using the rule of three."""
+    # Calculate p from rule_number
+    p = 1 - np.exp(-rule_number)
+
+    # Round p to the nearest decimal ending in .005
+    p_rounded = round(p * 200) / 200
+
+    # Determine confidence level based on rounded p
+    confidence_level = p_rounded * 100
+
+    if successful_closures == 0:
+        return {
+            "message": f"No successful closures found for barrier: {barrier_name}. Using the rule of {rule_number}, is not applicable in this case.",
+            "failure_rate": "1 in ∞"
+        }
+
+    failure_rate_upper_bound = rule_number / successful_closures
+    response = {
+        "barrier_name": barrier_name,
+        "confidence_interval": f"{confidence_level:.2f}%",
+        "upper_bound": failure_rate_upper_bound,
+        "message": f"Based on {successful_closures} successful"
+    }
+    if closure_type:
+        response["message"] += f" {closure_type} closures"
+    else:
+        response["message"] += " closures."
+    response[
+        "message"] += f" for barrier: {barrier_name}, the upper bound for the {confidence_level:.2f}% confidence interval is {failure_rate_upper_bound} (1 in {int(1/failure_rate_upper_bound)}) using the rule of {rule_number}."
+    return response
+
+
+def beta_prior(prior_failure_rate: Optional[float] = None) -> tuple[float, float]:
+    """Beta prior parameters (a, b), uniform unless a prior failure rate is given."""
+    a = 1
+    b = 1
+
+    if prior_failure_rate:
+        total_prior = 1 / prior_failure_rate
+        a = 1
+        b = total_prior - a
+
+    return a, b
+
+
+def beta_distribution_response(barrier_name: str, successful_closures: int, unsuccessful_closures: int, closure_type: Optional[str] = None, prior_failure_rate: Optional[float] = None) -> dict:
+    """Posterior mean failure rate of the Beta distribution updated with the observed closures."""
+    a, b = beta_prior(prior_failure_rate)
+
+    a_posterior = a + unsuccessful_closures
+    b_posterior = b + successful_closures
+
+    # Calculate the expected failure rate
+    expected_failure_rate = a_posterior / (a_posterior + b_posterior)
+
+    response = {
+        "barrier_name": barrier_name,
+        "prior_failure_rate": prior_failure_rate if prior_failure_rate else None,
+        "posterior_mean_failure_rate": expected_failure_rate,
+        "informative_prior": True if prior_failure_rate else False,
+        "message": f"For barrier: {barrier_name}, using prior {prior_failure_rate} (1 in {int(1/prior_failure_rate)}) the posterior mean failure rate is approximately {expected_failure_rate:.6f} (1 in {int(1/expected_failure_rate)})"
+    }
+    if closure_type:
+        response["message"] += f" for {closure_type} closures."
+    else:
+        response["message"] += " based on all closures."
+
+    return response
+
+
+# Sampled values held in memory at once (cells x samples) by the Monte Carlo engine
+MONTE_CARLO_CHUNK_SIZE = 10_000_000
+# Samples per cell accepted by the API, a single cell is never split over chunks
+MAX_MONTE_CARLO_SAMPLES = 1_000_000
+DEFAULT_QUANTILES = (0.025, 0.05, 0.5, 0.95, 0.975)
+SAMPLING_METHODS = ("posterior", "bootstrap")
+
+
+def beta_priors(prior_failure_rates: Sequence[Optional[float]]) -> tuple[np.ndarray, np.ndarray]:
+    """Vectorized beta_prior, one (a, b) pair per prior failure rate."""
+    a, b = zip(*(beta_prior(rate) for rate in prior_failure_rates))
+    return np.asarray(a, dtype=float), np.asarray(b, dtype=float)
+
+
+def sample_failure_probability(rng: np.random.Generator, successes: np.ndarray, failures: np.ndarray,
+                               a: np.ndarray, b: np.ndarray, samples: int, method: str = "posterior") -> np.ndarray:
+    """Draw failure probability samples for a batch of cells, returns an array of shape (cells, samples).
+
+    posterior: the Beta posterior of the failure probability on demand given the prior (a, b).
+    bootstrap: the failure fraction of the observed closures resampled with replacement, which for
+    pass/fail outcomes is a binomial draw around the observed fraction (the prior is not used)."""
+    if method == "posterior":
+        if np.any(b + successes <= 0):
+            raise ValueError("The Beta posterior needs a prior failure rate below 1 or at least one successful closure")
+        return rng.beta((a + failures)[:, None], (b + successes)[:, None], size=(len(a), samples))
+    if method == "bootstrap":
+        demands = successes + failures
+        observed = np.divide(failures, demands, out=np.zeros(len(demands)), where=demands > 0)
+        resampled = rng.binomial(demands[:, None].astype(np.int64), observed[:, None], size=(len(demands), samples))
+        return np.divide(resampled, demands[:, None], out=np.zeros(resampled.shape), where=demands[:, None] > 0)
+    raise ValueError(f"Unknown sampling method: {method}, expected one of {', '.join(SAMPLING_METHODS)}")
+
+
+def failure_probability_distribution(successes: Sequence[int], failures: Sequence[int],
+                                     prior_failure_rates: Sequence[Optional[float]], samples: int = 100_000,
+                                     quantiles: Sequence[float] = DEFAULT_QUANTILES, method: str = "posterior",
+                                     seed: Optional[int] = None, chunk_size: int = MONTE_CARLO_CHUNK_SIZE) -> dict[str, np.ndarray]:
+    """Mean, standard deviation and quantiles of the failure probability for many cells (e.g. barriers,
+    event types or priors) at once.
+
+    The cells are sampled in chunks of at most chunk_size values (at least one cell per chunk), so
+    memory does not grow with the number of cells. The same seed and chunk size give the same result."""
+    successes = np.asarray(successes, dtype=float)
+    failures = np.asarray(failures, dtype=float)
+    a, b = beta_priors(prior_failure_rates)
+    rng = np.random.default_rng(seed)
+    cells_per_chunk = max(1, chunk_size // samples)
+
+    mean = np.empty(len(a))
+    std = np.empty(len(a))
+    quantile_values = np.empty((len(a), len(quantiles)))
+    for start in range(0, len(a), cells_per_chunk):
+        chunk = slice(start, start + cells_per_chunk)
+        drawn = sample_failure_probability(
+            rng, successes[chunk], failures[chunk], a[chunk], b[chunk], samples, method)
+        mean[chunk] = drawn.mean(axis=1)
+        std[chunk] = drawn.std(axis=1)
+        quantile_values[chunk] = np.quantile(drawn, quantiles, axis=1).T
+
+    return {"mean": mean, "std": std, "quantiles": quantile_values}
+
+
+def failure_rate_distribution_response(barrier_name: str, successful_closures: int, unsuccessful_closures: int,
+                                       closure_type: Optional[str] = None, prior_failure_rates: Sequence[Optional[float]] = (None,),
+                                       samples: int = 100_000, quantiles: Sequence[float] = DEFAULT_QUANTILES,
+                                       method: str = "posterior", seed: Optional[int] = None) -> dict:
+    """Sampled failure probability distribution of a barrier, one result per prior to show the sensitivity to the prior."""
+    if method == "bootstrap":
+        prior_failure_rates = [None]  # The bootstrap only uses the observed closures
+    distribution = failure_probability_distribution(
+        [successful_closures] * len(prior_failure_rates), [unsuccessful_closures] * len(prior_failure_rates),
+        prior_failure_rates, samples, quantiles, method, seed)
+
+    results = []
+    for i, prior_failure_rate in enumerate(prior_failure_rates):
+        results.append({
+            "prior_failure_rate": prior_failure_rate,
+            "informative_prior": True if prior_failure_rate else False,
+            "mean_failure_rate": float(distribution["mean"][i]),
+            "std_failure_rate": float(distribution["std"][i]),
+            "quantiles": {f"{q:g}": float(value) for q, value in zip(quantiles, distribution["quantiles"][i])},
+        })
+
+    return {
+        "barrier_name": barrier_name,
+        "closure_type": closure_type,
+        "successful_closures": successful_closures,
+        "unsuccessful_closures": unsuccessful_closures,
+        "method": method,
+        "samples": samples,
+        "seed": seed,
+        "results": results,
+    }
+
+
+def rule_of_three_confidence_levels(rule_numbers: Sequence[float]) -> np.ndarray:
+    """Confidence level in percent per rule number, rounded like rule_of_three_response."""
+    return np.round((1 - np.exp(-np.asarray(rule_numbers, dtype=float))) * 200) / 200 * 100
+
+
+def rule_of_three_bounds(successes: np.ndarray, rule_numbers: Sequence[float]) -> np.ndarray:
+    """Upper bounds rule_number / successes, with a trailing axis over the rule numbers; NaN without successes."""
+    successes = np.asarray(successes, dtype=float)[..., None]
+    rules = np.asarray(rule_numbers, dtype=float)
+    return np.divide(rules, successes, out=np.full(np.broadcast_shapes(successes.shape, rules.shape), np.nan),
+                     where=successes > 0)
+
+
+def beta_posterior_means(successes: np.ndarray, failures: np.ndarray, prior_failure_rates: Sequence[Optional[float]]) -> np.ndarray:
+    """Posterior mean failure rates like beta_distribution_response, with a trailing axis over the priors."""
+    a, b = beta_priors(prior_failure_rates)
+    a_posterior = a + np.asarray(failures, dtype=float)[..., None]
+    b_posterior = b + np.asarray(successes, dtype=float)[..., None]
+    return a_posterior / (a_posterior + b_posterior)
+
+
+def _nested_list(values: np.ndarray) -> list:
+    """Array as nested lists with None for NaN, so it can be encoded as JSON."""
+    return np.where(np.isnan(values), None, values).tolist()
+
+
+def reliability_batch_response(abbreviations: Sequence[str], barrier_names: Sequence[str],
+                               closure_types: Sequence[Optional[str]], successes: np.ndarray, failures: np.ndarray,
+                               rule_numbers: Sequence[float], prior_failure_rates: Sequence[Optional[float]]) -> dict:
+    """Rule-of-three bounds and Beta posterior means for every barrier, event type, rule number and prior.
+
+    successes and failures have shape (barriers, closure types), the result matrices add an axis
+    over the rule numbers or the priors. Bounds without successful closures are None."""
+    return {
+        "abbreviations": list(abbreviations),
+        "barrier_names": list(barrier_names),
+        "closure_types": list(closure_types),
+        "rule_numbers": list(rule_numbers),
+        "confidence_levels": rule_of_three_confidence_levels(rule_numbers).tolist(),
+        "prior_failure_rates": list(prior_failure_rates),
+        "successful_closures": np.asarray(successes).tolist(),
+        "unsuccessful_closures": np.asarray(failures).tolist(),
+        "rule_of_three_upper_bound": _nested_list(rule_of_three_bounds(successes, rule_numbers)),
+        "posterior_mean_failure_rate": _nested_list(beta_posterior_means(successes, failures, prior_failure_rates)),
+    }
+
+
+def window_counts(dates: np.ndarray, successes: np.ndarray, failures: np.ndarray,
+                  starts: np.ndarray, ends: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Closure counts of any number of [start, end) date windows in one pass.
+
+    dates must be sorted; the counts per date are accumulated once, each window is then the
+    difference of the cumulative counts at its bounds."""
+    cumulative_successes = np.concatenate([[0], np.cumsum(successes)])
+    cumulative_failures = np.concatenate([[0], np.cumsum(failures)])
+    first = np.searchsorted(dates, starts, side="left")
+    last = np.searchsorted(dates, ends, side="left")
+    return (cumulative_successes[last] - cumulative_successes[first],
+            cumulative_failures[last] - cumulative_failures[first])
+
+
+def _year_start(years: np.ndarray) -> np.ndarray:
+    return (np.asarray(years) - 1970).astype("datetime64[Y]").astype("datetime64[D]")
+
+
+def windowed_reliability_response(barrier_name: str, dates: np.ndarray, successes: np.ndarray, failures: np.ndarray,
+                                  closure_type: Optional[str] = None, window_years: int = 5, since: Optional[np.datetime64] = None,
+                                  prior_failure_rate: Optional[float] = None, rule_number: int = 3) -> dict:
+    """Beta posterior and rule-of-three bound per calendar year, per rolling window of window_years
+    years (ending with each year) and since a date (e.g. the last maintenance).
+
+    dates are the sorted closure start dates (datetime64[D]) with the successful and failed closures on each date."""
+    if len(dates):
+        years = np.arange(dates[0].astype("datetime64[Y]").astype(int),
+                          dates[-1].astype("datetime64[Y]").astype(int) + 1) + 1970
+        rolling_years = years[window_years - 1:]
+        starts = [_year_start(years), _year_start(rolling_years - window_years + 1)]
+        ends = [_year_start(years + 1), _year_start(rolling_years + 1)]
+    else:
+        starts = [np.array([], dtype="datetime64[D]")] * 2
+        ends = [np.array([], dtype="datetime64[D]")] * 2
+    if since is not None:
+        starts.append(np.array([since], dtype="datetime64[D]"))
+        ends.append(np.array([np.datetime64("9999-12-31")], dtype="datetime64[D]"))
+
+    # All windows in one vectorized pass, split per kind afterwards
+    window_successes, window_failures = window_counts(
+        dates, successes, failures, np.concatenate(starts), np.concatenate(ends))
+    a, b = beta_prior(prior_failure_rate)
+    a_posterior = a + window_failures
+    b_posterior = b + window_successes
+    posterior_means = a_posterior / (a_posterior + b_posterior)
+    bounds = rule_of_three_bounds(window_successes, [rule_number])[:, 0]
+
+    windows = []
+    for i, (start, end) in enumerate(zip(np.concatenate(starts), np.concatenate(ends))):
+        windows.append({
+            "start": str(start),
+            "end": None if since is not None and i == len(bounds) - 1 else str(end - 1),
+            "successful_closures": int(window_successes[i]),
+            "unsuccessful_closures": int(window_failures[i]),
+            "beta_a": float(a_posterior[i]),
+            "beta_b": float(b_posterior[i]),
+            "posterior_mean_failure_rate": float(posterior_means[i]),
+            "rule_of_three_upper_bound": None if np.isnan(bounds[i]) else float(bounds[i]),
+        })
+
+    yearly, rolling = len(starts[0]), len(starts[1])
+    return {
+        "barrier_name": barrier_name,
+        "closure_type": closure_type,
+        "prior_failure_rate": prior_failure_rate,
+        "rule_number": rule_number,
+        "window_years": window_years,
+        "yearly": windows[:yearly],
+        "rolling": windows[yearly:yearly + rolling],
+        "since": windows[yearly + rolling] if since is not None else None,
+    }
+
+
+def parse_gate_configuration(gate_configuration: Optional[str], gates: int) -> int:
+    """Number of gates that must close for the barrier to close, from a 'k-out-of-n', 'k/n' or 'kOOn'
+    configuration. Any other configuration requires all gates (a series system)."""
+    match = re.fullmatch(r"\s*(\d+)\s*(?:-?\s*out\s*-?\s*of\s*-?|/|oo)\s*(\d+)\s*",
+                         gate_configuration or "", flags=re.IGNORECASE)
+    if match:
+        return int(match.group(1))
+    return gates
+
+
+def working_gates_distribution(gate_failure_probabilities: np.ndarray) -> np.ndarray:
+    """Probability of exactly 0..n working gates for independent gates (Poisson binomial distribution).
+
+    The trailing axis holds the gates, leading axes (e.g. priors) are computed at once; each gate is
+    folded in with one vectorized step over all counts."""
+    failure = np.asarray(gate_failure_probabilities, dtype=float)
+    gates = failure.shape[-1]
+    distribution = np.zeros(failure.shape[:-1] + (gates + 1,))
+    distribution[..., 0] = 1
+    for gate in range(gates):
+        p_fail = failure[..., gate, None]
+        shifted = np.zeros_like(distribution)
+        shifted[..., 1:] = distribution[..., :-1]
+        distribution = distribution * p_fail + shifted * (1 - p_fail)
+    return distribution
+
+
+def k_out_of_n_failure_probability(distribution: np.ndarray, required_gates: int) -> np.ndarray:
+    """Probability that fewer than required_gates of the gates work, from working_gates_distribution."""
+    gates = distribution.shape[-1] - 1
+    if not 1 <= required_gates <= gates:
+        raise ValueError(f"required_gates must be between 1 and the {gates} gates of the barrier, got {required_gates}")
+    return distribution[..., :required_gates].sum(axis=-1)
+
+
+def gate_reliability_response(barrier_name: str, gate_configuration: Optional[str], gate_ids: Sequence[int],
+                              gate_names: Sequence[str], successes: np.ndarray, failures: np.ndarray,
+                              prior_failure_rate: Optional[float] = None, rule_number: int = 3,
+                              required_gates: Optional[int] = None) -> dict:
+    """Beta posterior failure rate and rule-of-three bound per gate, and the failure probability of the
+    barrier as a k-out-of-n system of its gates, with the posterior means as gate failure probabilities.
+    Raises a ValueError if more gates are required than the barrier has."""
+    if not len(gate_ids):
+        return {
+            "barrier_name": barrier_name,
+            "gate_configuration": gate_configuration,
+            "required_gates": None,
+            "prior_failure_rate": prior_failure_rate,
+            "gates": [],
+            "working_gates_distribution": None,
+            "system_failure_probability": None,
+            "message": f"No gates found for barrier: {barrier_name}, add its gates to compute the k-out-of-n reliability",
+        }
+    if required_gates is None:
+        required_gates = parse_gate_configuration(gate_configuration, len(gate_ids))
+    posterior_means = beta_posterior_means(successes, failures, [prior_failure_rate])[:, 0]
+    bounds = rule_of_three_bounds(successes, [rule_number])[:, 0]
+    distribution = working_gates_distribution(posterior_means)
+    system_failure_probability = k_out_of_n_failure_probability(distribution, required_gates)
+
+    gates = []
+    for i, (gate_id, name) in enumerate(zip(gate_ids, gate_names)):
+        gates.append({
+            "gate_id": gate_id,
+            "name": name,
+            "successful_closures": int(successes[i]),
+            "unsuccessful_closures": int(failures[i]),
+            "posterior_mean_failure_rate": float(posterior_means[i]),
+            "rule_of_three_upper_bound": None if np.isnan(bounds[i]) else float(bounds[i]),
+        })
+
+    return {
+        "barrier_name": barrier_name,
+        "gate_configuration": gate_configuration,
+        "required_gates": required_gates,
+        "prior_failure_rate": prior_failure_rate,
+        "gates": gates,
+        "working_gates_distribution": distribution.tolist(),
+        "system_failure_probability": float(system_failure_probability),
+    }
@@ -0,0 +1,120 @@
+import asyncio
+import os
+import tempfile
+
+# The engines are created on import, so the scratch database has to be configured first
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'closures.db')}"
+os.environ["LOG_SAMPLE_RATE"] = "0"
+
+import httpx  # noqa: E402
+import pytest  # noqa: E402
+from starlette.routing import Match  # noqa: E402
+
+import data_model  # noqa: E402
+import fast_api_app  # noqa: E402
+from barrier_registry import BARRIER_REGISTRY  # noqa: E402
+from database.engine_config import engine  # noqa: E402
+from pydantic_model import ClosureEventBatch  # noqa: E402
+
+ABORTED_RECORD = {"StartDate": "2021-01-01", "StartTime": "01:00:00", "EndDate": "2021-01-01", "EndTime": "09:00:00",
+                  "WaterLevel": 1.5, "ClosureEventType": "STORM", "ClosureEventResult": "ABORTED"}
+
+
+@pytest.fixture(autouse=True)
+def database():
+    data_model.Base.metadata.drop_all(engine)
+    data_model.Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(data_model.StormSurgeBarriers.__table__.insert(), [{
+            "Name": "Hollandse IJssel", "Abbreviation": "HIJK", "Location": "Krimpen aan den IJssel",
+            "ConstructionYear": 1958, "GateConfiguration": "2", "GateType": "vertical lift"}])
+    BARRIER_REGISTRY.clear()
+    yield
+
+
+async def _post(path: str, payload) -> tuple[dict, list]:
+    app = fast_api_app.app
+    async with fast_api_app.lifespan(app):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.post(path, json=payload)
+            assert response.status_code == 200, response.text
+            closures = (await client.get("/storm_surge_barrier/closures/HIJK/")).json()
+    return response.json(), closures
+
+
+async def _post_single_then_batch(start_time: str, batch_start_time: str) -> tuple[int, list]:
+    app = fast_api_app.app
+    params = {"StartDate": "2021-01-01", "StartTime": start_time, "EndDate": "2021-01-01", "EndTime": "09:00",
+              "ClosureEventType": "STORM", "ClosureEventResult": "SUCCESS", "BarrierID": 1, "WaterLevel": 1.5,
+              "abbreviation": "HIJK"}
+    async with fast_api_app.lifespan(app):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.post("/storm_surge_barrier/add/closure/", params=params)
+            assert response.status_code == 200, response.text
+            response = await client.post("/storm_surge_barrier/add/closures/HIJK/?bulk=true",
+                                         json=[{**ABORTED_RECORD, "StartTime": batch_start_time}])
+            closures = (await client.get("/storm_surge_barrier/closures/HIJK/")).json()
+    return response.status_code, closures
+
+
+def test_batch_normalizes_times_and_water_levels():
+    rows, skipped_records = ClosureEventBatch(columns={name: [value] for name, value in {
+        **ABORTED_RECORD, "StartTime": "01:00", "WaterLevel": 2}.items()}).validated_rows()
+    assert skipped_records == []
+    assert rows[0]["StartTime"] == "01:00:00" and rows[0]["EndTime"] == "09:00:00"
+    assert isinstance(rows[0]["WaterLevel"], float)
+
+
+def test_times_with_and_without_seconds_are_one_closure():
+    status, closures = asyncio.run(_post_single_then_batch("01:00", "01:00:00"))
+    assert status == 200
+    assert [(closure["StartTime"], closure["ClosureEventResult"]) for closure in closures] == [("01:00:00", "ABORTED")]
+
+
+def test_batch_accepts_every_database_result():
+    rows, skipped_records = ClosureEventBatch(records=[ABORTED_RECORD]).validated_rows()
+    assert skipped_records == []
+    assert rows[0]["ClosureEventResult"] == "ABORTED"
+
+
+@pytest.mark.parametrize("bulk", [False, True])
+def test_post_aborted_closure(bulk: bool):
+    result, closures = asyncio.run(
+        _post(f"/storm_surge_barrier/add/closures/HIJK/?bulk={str(bulk).lower()}", [ABORTED_RECORD]))
+    assert result["skipped_records"] == []
+    assert [closure["ClosureEventResult"] for closure in closures] == ["ABORTED"]
+
+
+async def _post_twice(first: list, path: str, second: list) -> list:
+    app = fast_api_app.app
+    async with fast_api_app.lifespan(app):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.post("/storm_surge_barrier/add/closures/HIJK/", json=first)
+            assert response.status_code == 200, response.text
+            response = await client.post(path, json=second)
+            assert response.status_code == 200, response.text
+            closures = (await client.get("/storm_surge_barrier/closures/HIJK/")).json()
+    return closures
+
+
+@pytest.mark.parametrize("bulk", [False, True])
+def test_incremental_post_skips_records_before_the_watermark(bulk: bool):
+    older = {**ABORTED_RECORD, "StartDate": "2020-12-01", "EndDate": "2020-12-01"}
+    newer = {**ABORTED_RECORD, "StartDate": "2021-02-01", "EndDate": "2021-02-01"}
+    closures = asyncio.run(_post_twice(
+        [ABORTED_RECORD], f"/storm_surge_barrier/add/closures/HIJK/?bulk={str(bulk).lower()}&incremental=true",
+        [older, newer]))
+    assert sorted(closure["StartDate"] for closure in closures) == ["2021-01-01", "2021-02-01"]
+
+
+@pytest.mark.parametrize("path, endpoint", [
+    ("/storm_surge_barrier/closures/rule_of_three/page/", fast_api_app.get_rule_of_three),
+    ("/storm_surge_barrier/closures/failure_rate_update/stream/", fast_api_app.get_beta_distribution),
+    ("/storm_surge_barrier/closures/failure_rate_distribution/watermark/", fast_api_app.get_failure_rate_distribution),
+    ("/storm_surge_barrier/closures/HIJK/page/", fast_api_app.get_barrier_closures_page_by_abbreviation),
+])
+def test_fixed_prefix_closure_routes_take_precedence(path: str, endpoint):
+    scope = {"type": "http", "method": "GET", "path": path}
+    route = next(route for route in fast_api_app.app.router.routes
+                 if route.matches(scope)[0] == Match.FULL)
+    assert route.endpoint is endpoint
@@ -0,0 +1,66 @@
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ingest_data.ingest_hijk_data import ingestCSVhijk
+
+
+def _sheet() -> pd.DataFrame:
+    """HIJK sheet with the dialect's edge cases: missing times, closures ending on a later row, NaN water levels,
+    24h00, 'oo' and trailing dots in the times and backquoted dates."""
+    return pd.DataFrame([
+        {"NUMBER": 1, "DATE": pd.Timestamp("1958-01-02"), "START": "08:00", "END": "10h30",
+         "WATERLEVEL": "+2, 10", "TYPE": "stormsluiting"},
+        # Overnight closure, its END time is on the continuation row
+        {"NUMBER": 2, "DATE": pd.Timestamp("1958-01-05"), "START": "22 h 15", "END": "--",
+         "WATERLEVEL": "+3, 05", "TYPE": "testsluiting"},
+        {"NUMBER": np.nan, "DATE": pd.Timestamp("1958-01-06"), "START": "", "END": "04:oo",
+         "WATERLEVEL": "", "TYPE": ""},
+        # Missing start time and water level
+        {"NUMBER": 3, "DATE": "`1958-01-09", "START": "", "END": "24h00",
+         "WATERLEVEL": np.nan, "TYPE": "functionelesluiting"},
+        {"NUMBER": 4, "DATE": pd.Timestamp("1958-01-10"), "START": np.nan, "END": "13:45.",
+         "WATERLEVEL": np.nan, "TYPE": "onderhoudsluiting"},
+        # Closure spanning two continuation rows
+        {"NUMBER": 5, "DATE": pd.Timestamp("1958-01-12"), "START": "23:59", "END": "--",
+         "WATERLEVEL": "+1, 99", "TYPE": "stormsluiting"},
+        {"NUMBER": np.nan, "DATE": pd.Timestamp("1958-01-13"), "START": "", "END": "",
+         "WATERLEVEL": "", "TYPE": ""},
+        {"NUMBER": np.nan, "DATE": pd.Timestamp("1958-01-14"), "START": "", "END": "00h05",
+         "WATERLEVEL": "", "TYPE": ""},
+    ])
+
+
+def _comparable(records: list[dict]) -> list[dict]:
+    # NaN never equals itself, compare missing water levels as None
+    return [{**record, "WaterLevel": None if isinstance(record["WaterLevel"], float) and math.isnan(record["WaterLevel"])
+             else record["WaterLevel"]} for record in records]
+
+
+def test_vectorized_parser_matches_row_wise_parser():
+    row_wise = ingestCSVhijk(_sheet()).create_hijk_dict()
+    vectorized = ingestCSVhijk(_sheet()).create_hijk_records()
+    assert len(vectorized) == 5
+    assert _comparable(vectorized) == _comparable(row_wise)
+
+
+def test_edge_cases_are_parsed():
+    records = ingestCSVhijk(_sheet()).create_hijk_records()
+    assert records[1]["StartTime"] == "22:15:00"
+    assert (records[1]["EndDate"], records[1]["EndTime"]) == ("1958-01-06", "04:00:00")
+    assert records[2]["StartDate"] == "1958-01-09"
+    assert records[2]["StartTime"] is None and records[2]["EndTime"] == "00:00:00"
+    assert records[3]["StartTime"] is None and records[3]["EndTime"] == "13:45:00"
+    assert math.isnan(records[3]["WaterLevel"])
+    assert (records[4]["EndDate"], records[4]["EndTime"]) == ("1958-01-14", "00:05:00")
+    assert [record["ClosureEventType"] for record in records] == ["STORM", "TEST", "OPS", "OPS", "STORM"]
+
+
+@pytest.mark.parametrize("watermark", [("1958-01-09", "00:00:00"), ("1958-01-10", "")])
+def test_watermark_keeps_later_records(watermark):
+    records = ingestCSVhijk(_sheet()).create_hijk_records(watermark)
+    all_records = ingestCSVhijk(_sheet()).create_hijk_records()
+    assert _comparable(records) == _comparable([record for record in all_records
+                                                if (record["StartDate"], record["StartTime"] or "") >= watermark])
@@ -0,0 +1,131 @@
+"""Regression test of the number of SQL statements and rows per data handler call.
+
+Seeds scratch SQLite databases with their own engines, loads the barrier registry like the API does at startup,
+runs every read path of StormSurgeBarrierDataHandler and fails when a call issues more statements than allowed,
+the statement count grows with the data, or a list query joins in related tables (eager loading multiplies
+the fetched rows).
+"""
+import os
+import tempfile
+from datetime import date, timedelta
+
+# The handler modules create the API engines on import, which need a database URL but are not used here
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'unused.db')}")
+
+import pytest  # noqa: E402
+from sqlalchemy import create_engine, event  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+import data_model  # noqa: E402
+from barrier_registry import BARRIER_REGISTRY  # noqa: E402
+from data_handler import (StormSurgeBarrierDataHandler, refresh_closure_counts,  # noqa: E402
+                          refresh_reliability_snapshots)
+from reliability_cache import RELIABILITY_CACHE  # noqa: E402
+
+# Maximum number of statements per call, independent of the number of barriers and closures
+MAX_STATEMENTS = {
+    "get_all_barriers": 1,
+    "get_all_closures": 1,
+    "get_closures_by_abbreviation": 1,
+    "get_closures_page": 1,
+    "iter_closures": 1,
+    "get_all_abbreviations": 1,
+    "calculate_rule_of_three": 1,
+    "calculate_beta_distribution": 1,
+    "calculate_rule_of_three_from_snapshot": 1,
+    "calculate_beta_distribution_from_snapshot": 1,
+}
+
+
+def seed(engine, barriers: int, closures: int):
+    data_model.Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        for b in range(1, barriers + 1):
+            session.add(data_model.StormSurgeBarriers(
+                ID=b, Name=f"Barrier {b}", Abbreviation=f"B{b:03d}", Location="", ConstructionYear=1958,
+                GateConfiguration="", GateType=""))
+        session.flush()
+        session.execute(data_model.StormSurgeBarrierClosureEvents.__table__.insert(), [
+            {"BarrierID": i % barriers + 1, "StartDate": date(1958, 1, 1) + timedelta(days=i), "StartTime": "12:00:00",
+             "EndDate": date(1958, 1, 1) + timedelta(days=i), "EndTime": "18:00:00", "WaterLevel": 2.5,
+             "ClosureEventType": data_model.ClosureEventType.STORM,
+             "ClosureEventResult": data_model.ClosureEventResult.SUCCESS}
+            for i in range(closures)])
+        refresh_closure_counts(session)
+        refresh_reliability_snapshots(session)
+        session.commit()
+
+
+def calls(barriers: int) -> dict:
+    """Handler calls with the number of records each one should return."""
+    return {
+        "get_all_barriers": (lambda h: h.get_all_barriers(), barriers),
+        "get_all_closures": (lambda h: h.get_all_closures(), None),
+        "get_closures_by_abbreviation": (lambda h: h.get_closures_by_abbreviation("B001"), None),
+        "get_closures_page": (lambda h: h.get_closures_page("B001", limit=100)["items"], None),
+        "iter_closures": (lambda h: [row for batch in h.iter_closures("B001") for row in batch], None),
+        "get_all_abbreviations": (lambda h: h.get_all_abbreviations(), barriers),
+        "calculate_rule_of_three": (lambda h: [h.calculate_rule_of_three("B001")], 1),
+        "calculate_beta_distribution": (lambda h: [h.calculate_beta_distribution("B001", prior_failure_rate=0.5)], 1),
+        "calculate_rule_of_three_from_snapshot": (
+            lambda h: [h.calculate_rule_of_three("B001", use_snapshot=True)], 1),
+        "calculate_beta_distribution_from_snapshot": (
+            lambda h: [h.calculate_beta_distribution("B001", prior_failure_rate=0.5, use_snapshot=True)], 1),
+    }
+
+
+def profile(barriers: int, closures: int) -> dict:
+    """Statements and result sizes per call on a database of the given size."""
+    scratch = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+    engine = create_engine(f"sqlite:///{scratch.name}")
+    statements = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def record_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    try:
+        seed(engine, barriers, closures)
+        with Session(engine) as session:
+            BARRIER_REGISTRY.load(session)
+        results = {}
+        for name, (call, expected) in calls(barriers).items():
+            RELIABILITY_CACHE.clear()
+            with Session(engine) as session:
+                statements.clear()
+                records = call(StormSurgeBarrierDataHandler(session=session))
+                results[name] = {"statements": list(statements), "records": len(records), "expected": expected,
+                                 "result": records}
+        return results
+    finally:
+        BARRIER_REGISTRY.clear()
+        RELIABILITY_CACHE.clear()
+        engine.dispose()
+        os.unlink(scratch.name)
+
+
+@pytest.fixture(scope="module")
+def profiles() -> tuple[dict, dict]:
+    return profile(2, 20), profile(5, 2000)
+
+
+@pytest.mark.parametrize("name", list(MAX_STATEMENTS))
+def test_statements_per_call(profiles, name: str):
+    small, large = profiles
+    result = large[name]
+    count = len(result["statements"])
+    assert count <= MAX_STATEMENTS[name], f"{count} statements, at most {MAX_STATEMENTS[name]} allowed"
+    assert count == len(small[name]["statements"]), "statement count grows with the data"
+    if name.startswith("get_"):
+        assert not any(" JOIN " in statement.upper() for statement in result["statements"]), \
+            "list query joins related tables"
+    if result["expected"] is not None:
+        assert result["records"] == result["expected"]
+
+
+@pytest.mark.parametrize("name", ["calculate_rule_of_three", "calculate_beta_distribution"])
+def test_snapshot_serves_the_same_response(profiles, name: str):
+    _, large = profiles
+    snapshot = large[f"{name}_from_snapshot"]
+    assert any("ReliabilitySnapshots" in statement for statement in snapshot["statements"])
+    assert snapshot["result"] == large[name]["result"]